@@ -7,79 +7,128 @@ from the React frontend, and establishes the Supabase database connection.
 This file is the starting point of the admin backend. It:
   1. Loads environment variables from a .env file
   2. Creates a Flask app with CORS enabled (allows frontend at any origin)
-  3. Connects to Supabase (hosted PostgreSQL) using URL + anon key
-  4. Imports all API route modules from routes.py
-  5. Starts the development server on port 5000
+  3. Connects to Supabase (hosted PostgreSQL) via supabase_client.py
+  4. Registers the API blueprints listed in routes.py
+  5. Starts the development server on port 5000 (local dev only)
+
+In production the app is served by gunicorn with gevent workers via
+wsgi.py (see gunicorn.conf.py).
 
 Environment Variables Required (in .env):
   SUPABASE_URL - Your Supabase project URL (e.g. https://xyz.supabase.co)
   SUPABASE_KEY - Your Supabase anon/public API key
 """
 
-from flask import Flask, request, make_response
+import time
+
+from flask import Flask, g
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import os
-import sys
-
-# Load environment variables from .env file in the same directory
-load_dotenv()
-
-# Fix the __main__ / app double-import problem:
-# When run via `python app.py`, this module is loaded as "__main__".
-# Route files do `from app import app, supabase`, which would re-import
-# this file as a *separate* module named "app", creating a second Flask
-# instance.  All @app.route() decorators would register on that second
-# instance while app.run() serves the first one → every route returns 404.
-# The line below makes both names point to the same module object.
-if __name__ == "__main__":
-    sys.modules.setdefault("app", sys.modules["__main__"])
+import orjson
+
+# Importing supabase_client also loads the .env file
+from supabase_client import supabase, SUPABASE_URL
+from routes_common import ORJSON_OPTIONS
 
 # ==========================================
 # Flask App Initialization
 # ==========================================
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson (a compiled encoder, several times
+    faster than the stdlib `json` module on large list responses).
+    Every jsonify() / request.get_json() call goes through it.
+    Types orjson can't encode natively (e.g. Decimal) fall back to Flask's
+    default handler.
+    """
+
+    sort_keys = False
+    _options = ORJSON_OPTIONS
+
+    def _encode(self, obj, indent=False, sort_keys=False):
+        option = self._options
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys or self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj, kwargs.get("indent"), kwargs.get("sort_keys")).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            self._encode(obj, indent) + b"\n", mimetype=self.mimetype
+        )
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Enable CORS for all origins so the React frontend (port 5173) can call the API.
 # In production, restrict this to your actual frontend domain.
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# flask-cors answers OPTIONS preflights itself; max_age lets browsers cache
+# the preflight result for 24h instead of re-sending it before every call.
+CORS(
+    app,
+    resources={r"/api/*": {"origins": "*"}},
+    supports_credentials=False,
+    methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    max_age=86400,
+)
+
+# Compress JSON bodies (brotli when the client accepts it, else gzip).
+# List endpoints repeat the same keys on every row and shrink several-fold;
+# small bodies and non-JSON content (images, uploads) are sent as-is.
+app.config.update(
+    COMPRESS_MIMETYPES=["application/json"],
+    COMPRESS_ALGORITHM=["br", "gzip"],
+    COMPRESS_LEVEL=6,
+    COMPRESS_MIN_SIZE=1024,
+)
+Compress(app)
+
+
+# Wall-clock time spent in each handler, so slow endpoints can be spotted from
+# the browser's network tab or the access log without running a profiler.
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
 
 
-@app.before_request
-def handle_preflight():
-    """
-    Catch all OPTIONS preflight requests early and return 200.
-    The flask-cors after_request hook will add the CORS headers.
-    """
-    if request.method == "OPTIONS":
-        return make_response(), 200
+@app.after_request
+def _add_process_time(response):
+    started = g.pop("started", None)
+    if started is not None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        response.headers["X-Process-Time-Ms"] = f"{elapsed_ms:.1f}"
+    return response
 
 
 # ==========================================
 # Supabase Database Configuration
 # ==========================================
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Fail fast if credentials are missing - no point starting without a database
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError(
-        "Missing required environment variables: SUPABASE_URL and SUPABASE_KEY must be set in .env file"
-    )
-
-# Create the Supabase client used by all route handlers in routes_*.py
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Client lives in supabase_client.py; route handlers import it from there.
+app.extensions["supabase"] = supabase
 
 # ==========================================
-# Import Routes
+# Register Routes
 # ==========================================
 
-# All API endpoints are defined in routes_*.py and registered by routes.py.
-# Importing routes registers them with the Flask app instance above.
-import routes  # noqa: E402, F401
+# All API endpoints are defined as blueprints in routes_*.py; routes.py
+# registers them on the app.
+from routes import register_routes  # noqa: E402
+
+register_routes(app)
 
 # ==========================================
 # Development Server
@@ -0,0 +1,41 @@
+"""
+gunicorn.conf.py - Production server settings
+=============================================
+Loaded by `gunicorn -c gunicorn.conf.py wsgi:application`.
+
+Supabase calls are I/O-bound, so we use gevent workers (one per CPU core)
+that each keep many requests in flight instead of blocking on every
+round-trip. All values can be overridden with environment variables.
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gevent"
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 200))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """Give each worker its own Supabase/LPR clients and connection pools."""
+    # Only relevant with --preload; otherwise the app is imported later, after
+    # the gevent worker has monkey-patched the standard library.
+    client_module = sys.modules.get("supabase_client")
+    if client_module is not None:
+        client_module.reset_supabase()
+    system_module = sys.modules.get("routes_system")
+    if system_module is not None:
+        system_module.reset_lpr_client()
+
+
+def post_worker_init(worker):
+    """Open the worker's Supabase connection before it accepts requests."""
+    if os.getenv("SUPABASE_WARM_UP", "1") != "0":
+        import supabase_client
+
+        supabase_client.warm_up()
@@ -13,6 +13,7 @@ This is useful during development/demo to get a clean slate.
 It does NOT affect the users table, vehicles, or Supabase Auth data.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client
 import os
@@ -32,9 +33,23 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 seed_only = "--seed-only" in sys.argv
 
+# Default spot names for the seeded facility: A-01 .. A-32
+SPOT_NAMES = tuple(f"A-{i:02d}" for i in range(1, 33))
+
 
 def clear_data():
     """Delete all transactional data (sessions, reservations, detections, etc.)."""
+    # Fast path: one TRUNCATE via the reset_transactional_data() function
+    # from supabase_schema.sql. Older databases without it fall back to
+    # deleting table by table.
+    try:
+        supabase.rpc("reset_transactional_data").execute()
+        print("  Cleared all transactional tables.")
+        print("  All parking spots reset to free.")
+        return
+    except Exception as e:
+        print(f"  reset_transactional_data() unavailable ({e}), deleting per table.")
+
     tables_to_clear = [
         "gate_events",
         "detection_logs",
@@ -64,6 +79,25 @@ def clear_data():
         pass
 
 
+def probe_facility_tables(facility_id):
+    """Check floors, spots, and pricing plans for a facility concurrently.
+
+    Returns the three query results in that order.
+    """
+
+    def probe(table):
+        return (
+            supabase.table(table)
+            .select("id")
+            .eq("facility_id", facility_id)
+            .limit(1)
+            .execute()
+        )
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        return list(pool.map(probe, ("floors", "parking_spots", "pricing_plans")))
+
+
 def seed_facility():
     """Create the default facility, floor, spots, and pricing if they don't exist."""
     # Check for existing facility
@@ -88,14 +122,10 @@ def seed_facility():
         facility_id = result.data[0]["id"]
         print(f"\n  Created facility: Sentra Main Parking (id={facility_id})")
 
+    # The three existence checks only depend on the facility id
+    floor_exists, spots_exist, plans_exist = probe_facility_tables(facility_id)
+
     # Create ground floor
-    floor_exists = (
-        supabase.table("floors")
-        .select("id")
-        .eq("facility_id", facility_id)
-        .limit(1)
-        .execute()
-    )
     floor_id = None
     if not floor_exists.data:
         floor_result = (
@@ -117,39 +147,24 @@ def seed_facility():
         print(f"  Floor already exists (id={floor_id})")
 
     # Create 32 parking spots (A-01 to A-32)
-    spots_exist = (
-        supabase.table("parking_spots")
-        .select("id")
-        .eq("facility_id", facility_id)
-        .limit(1)
-        .execute()
-    )
     if not spots_exist.data:
-        spots = []
-        for i in range(1, 33):
-            spots.append(
-                {
-                    "facility_id": facility_id,
-                    "floor_id": floor_id,
-                    "spot_name": f"A-{str(i).zfill(2)}",
-                    "spot_type": "regular",
-                    "is_occupied": False,
-                    "is_reserved": False,
-                }
-            )
+        spots = [
+            {
+                "facility_id": facility_id,
+                "floor_id": floor_id,
+                "spot_name": name,
+                "spot_type": "regular",
+                "is_occupied": False,
+                "is_reserved": False,
+            }
+            for name in SPOT_NAMES
+        ]
         supabase.table("parking_spots").insert(spots).execute()
-        print(f"  Created 32 parking spots (A-01 to A-32)")
+        print(f"  Created {len(SPOT_NAMES)} parking spots (A-01 to A-32)")
     else:
         print("  Spots already exist, skipping.")
 
     # Create default pricing plans
-    plans_exist = (
-        supabase.table("pricing_plans")
-        .select("id")
-        .eq("facility_id", facility_id)
-        .limit(1)
-        .execute()
-    )
     if not plans_exist.data:
         plans = [
             {
@@ -1,36 +1,58 @@
 """
 routes.py - Route registry
 =========================
-Imports route modules so their Flask decorators register endpoints.
+Registers every route module's blueprint on the Flask app.
 """
 
-# Shared helpers/constants
-import routes_common  # noqa: F401
-
 # Auth + admin
-import routes_auth  # noqa: F401
-import routes_users  # noqa: F401
+import routes_auth
+import routes_users
 
 # Core parking operations
-import routes_vehicles  # noqa: F401
-import routes_facilities  # noqa: F401
-import routes_spots  # noqa: F401
-import routes_reservations  # noqa: F401
-import routes_sessions  # noqa: F401
+import routes_vehicles
+import routes_facilities
+import routes_spots
+import routes_reservations
+import routes_sessions
 
 # Billing
-import routes_wallet  # noqa: F401
-import routes_subscriptions  # noqa: F401
+import routes_wallet
+import routes_subscriptions
 
 # Hardware + detections
-import routes_cameras  # noqa: F401
-import routes_gates  # noqa: F401
-import routes_detections  # noqa: F401
+import routes_cameras
+import routes_gates
+import routes_detections
 
 # Notifications + analytics
-import routes_notifications  # noqa: F401
-import routes_dashboard  # noqa: F401
+import routes_notifications
+import routes_dashboard
 
 # System + compat
-import routes_system  # noqa: F401
-import routes_compat  # noqa: F401
+import routes_system
+import routes_compat
+
+BLUEPRINT_MODULES = (
+    routes_auth,
+    routes_users,
+    routes_vehicles,
+    routes_facilities,
+    routes_spots,
+    routes_reservations,
+    routes_sessions,
+    routes_wallet,
+    routes_subscriptions,
+    routes_cameras,
+    routes_gates,
+    routes_detections,
+    routes_notifications,
+    routes_dashboard,
+    routes_system,
+    routes_compat,
+)
+
+
+def register_routes(app):
+    """Attach all API blueprints to `app`."""
+    for module in BLUEPRINT_MODULES:
+        app.register_blueprint(module.bp)
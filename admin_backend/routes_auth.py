@@ -4,19 +4,29 @@ routes_auth.py - Auth endpoints
 Signup, login, and profile management.
 """
 
-from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify
 
-from flask import request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    invalidate_cached_user,
+    prime_auth_cache,
+    run_in_background,
+    conditional_json,
+    first_embedded,
+)
 
-from app import app, supabase
-from routes_common import require_auth
+bp = Blueprint("auth", __name__)
+
+# Fields a user may change on their own profile (PUT /api/auth/me)
+_PROFILE_UPDATE_FIELDS = frozenset({"full_name", "phone", "profile_image"})
 
 # ==========================================================================
 # 1. AUTH ENDPOINTS
 # ==========================================================================
 
 
-@app.route("/api/auth/signup", methods=["POST"])
+@bp.route("/api/auth/signup", methods=["POST"])
 def signup():
     """
     POST /api/auth/signup
@@ -58,14 +68,10 @@ def signup():
             }
             result = supabase.table("users").insert(user_record).execute()
 
-            # Create wallet for the user
+            # Create wallet for the user. Nothing in the signup response
+            # depends on it, so don't make the client wait for it.
             if result.data:
-                supabase.table("user_wallets").insert(
-                    {
-                        "user_id": result.data[0]["id"],
-                        "balance": 0,
-                    }
-                ).execute()
+                run_in_background(_create_wallet, result.data[0]["id"])
 
             return (
                 jsonify(
@@ -89,7 +95,12 @@ def signup():
         return jsonify({"message": f"Error: {error_msg}"}), 500
 
 
-@app.route("/api/auth/login", methods=["POST"])
+def _create_wallet(user_id):
+    """Create the empty wallet that every new user starts with."""
+    supabase.table("user_wallets").insert({"user_id": user_id, "balance": 0}).execute()
+
+
+@bp.route("/api/auth/login", methods=["POST"])
 def login():
     """
     POST /api/auth/login
@@ -113,14 +124,16 @@ def login():
         )
 
         if response.user and response.session:
+            # Same row shape require_auth caches, so it can be reused below
             user_data = (
                 supabase.table("users")
-                .select("*")
-                .eq("email", email)
+                .select("*, user_wallets(balance)")
+                .eq("auth_user_id", response.user.id)
                 .limit(1)
                 .execute()
             )
             user_record = user_data.data[0] if user_data.data else {}
+            prime_auth_cache(response.session.access_token, response.user, user_record)
 
             return (
                 jsonify(
@@ -147,7 +160,7 @@ def login():
         return jsonify({"message": f"Login failed: {str(e)}"}), 401
 
 
-@app.route("/api/auth/me", methods=["GET"])
+@bp.route("/api/auth/me", methods=["GET"])
 @require_auth
 def get_profile():
     """GET /api/auth/me – Get current user's profile."""
@@ -155,49 +168,36 @@ def get_profile():
         return jsonify({"message": "User profile not found"}), 404
 
     user = request.db_user
-    # Get wallet balance
-    wallet = (
-        supabase.table("user_wallets")
-        .select("balance")
-        .eq("user_id", user["id"])
-        .limit(1)
-        .execute()
-    )
-
-    return (
-        jsonify(
-            {
-                "user": {
-                    "id": user["id"],
-                    "email": user["email"],
-                    "full_name": user.get("full_name"),
-                    "phone": user.get("phone"),
-                    "role": user["role"],
-                    "is_active": user["is_active"],
-                    "wallet_balance": wallet.data[0]["balance"] if wallet.data else 0,
-                    "created_at": user["created_at"],
-                }
+    # Wallet is embedded in the users row by require_auth
+    wallet = first_embedded(user.get("user_wallets"))
+
+    return conditional_json(
+        {
+            "user": {
+                "id": user["id"],
+                "email": user["email"],
+                "full_name": user.get("full_name"),
+                "phone": user.get("phone"),
+                "role": user["role"],
+                "is_active": user["is_active"],
+                "wallet_balance": wallet["balance"] if wallet else 0,
+                "created_at": user["created_at"],
             }
-        ),
-        200,
+        }
     )
 
 
-@app.route("/api/auth/me", methods=["PUT"])
+@bp.route("/api/auth/me", methods=["PUT"])
 @require_auth
 def update_profile():
     """PUT /api/auth/me – Update current user's profile."""
     data = request.get_json()
-    updates = {}
-    for field in ["full_name", "phone", "profile_image"]:
-        if field in data:
-            updates[field] = data[field]
+    updates = {k: data[k] for k in data.keys() & _PROFILE_UPDATE_FIELDS}
 
     if not updates:
         return jsonify({"message": "No fields to update"}), 400
 
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
-
     supabase.table("users").update(updates).eq("id", request.db_user["id"]).execute()
+    invalidate_cached_user(request.db_user["id"])
 
     return jsonify({"message": "Profile updated"}), 200
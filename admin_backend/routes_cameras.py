@@ -4,28 +4,44 @@ routes_cameras.py - Camera management
 Admin endpoints for camera configuration.
 """
 
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    cached_json,
+    device_list_key,
+    invalidate_device_lists,
+    DEVICE_LIST_TTL,
+)
+
+bp = Blueprint("cameras", __name__)
 
 # ==========================================================================
 # 10. CAMERAS (Admin)
 # ==========================================================================
 
 
-@app.route("/api/cameras", methods=["GET"])
+@bp.route("/api/cameras", methods=["GET"])
 @require_admin
 def get_cameras():
     """GET /api/cameras – List all cameras, optionally filtered by facility."""
     facility_id = request.args.get("facility_id", type=int)
+    return cached_json(
+        device_list_key("cameras", facility_id),
+        DEVICE_LIST_TTL,
+        lambda: {"cameras": _load_cameras(facility_id)},
+        shared_only=True,
+    )
+
+
+def _load_cameras(facility_id):
     query = supabase.table("cameras").select("*").order("id")
     if facility_id:
         query = query.eq("facility_id", facility_id)
-    result = query.execute()
-    return jsonify({"cameras": result.data}), 200
+    return query.execute().data
 
 
-@app.route("/api/cameras", methods=["POST"])
+@bp.route("/api/cameras", methods=["POST"])
 @require_admin
 def add_camera():
     """POST /api/cameras – Add a new camera."""
@@ -62,12 +78,14 @@ def add_camera():
         "is_active": True,
     }
     result = supabase.table("cameras").insert(camera).execute()
+    invalidate_device_lists("cameras", [camera["facility_id"]])
     return jsonify({"message": "Camera added", "camera": result.data[0]}), 201
 
 
-@app.route("/api/cameras/<int:camera_id>", methods=["DELETE"])
+@bp.route("/api/cameras/<int:camera_id>", methods=["DELETE"])
 @require_admin
 def delete_camera(camera_id):
     """DELETE /api/cameras/:id – Remove a camera."""
-    supabase.table("cameras").delete().eq("id", camera_id).execute()
+    result = supabase.table("cameras").delete().eq("id", camera_id).execute()
+    invalidate_device_lists("cameras", [row["facility_id"] for row in result.data])
     return jsonify({"message": "Camera deleted"}), 200
@@ -5,10 +5,31 @@ Centralizes shared constants, auth decorators, and small helpers used
 across the route modules.
 """
 
+import base64
+import hashlib
+import logging
 import os
-from flask import request, jsonify
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import jwt
+import orjson
+from datetime import datetime
+from flask import abort, make_response, request, jsonify, Response
+from postgrest import APIError
 from functools import wraps
-from app import supabase
+from cachetools import TTLCache
+from werkzeug.exceptions import HTTPException
+
+try:
+    import redis
+except ImportError:  # optional: only needed when REDIS_URL is set
+    redis = None
+from supabase_client import supabase, SUPABASE_URL
+
+logger = logging.getLogger(__name__)
 
 # External LPR service URL (use container name in Docker, localhost for local dev)
 LPR_SERVICE_URL = os.getenv("LPR_SERVICE_URL", "http://127.0.0.1:5001")
@@ -16,80 +37,626 @@ LPR_SERVICE_URL = os.getenv("LPR_SERVICE_URL", "http://127.0.0.1:5001")
 # Defaults
 DEFAULT_HOURLY_RATE = 150  # LKR per hour (fallback when facility has no rate)
 DEFAULT_CURRENCY = "LKR"
+MAX_LIST_LIMIT = 200  # largest page a list endpoint will return
+
+# Allowed values of the matching CHECK constraints in supabase_schema.sql
+SPOT_TYPES = frozenset({"regular", "handicapped", "ev_charging", "vip"})
+ENTRY_METHODS = frozenset({"lpr", "manual", "qr_code"})
+
+# PostgREST error code for a missing SQL function (schema not yet updated)
+FUNCTION_NOT_FOUND = "PGRST202"
+
+# Recently verified tokens -> (auth user, users row, JWT exp, row generation).
+# Saves the GoTrue round-trip on repeat requests, and the users lookup too
+# while the row's generation in Redis is unchanged: invalidate_cached_user()
+# bumps it, so a role or wallet change reaches every worker at once. Without
+# Redis the row can't be kept in sync across workers and is re-read each time.
+# Entries live at most AUTH_CACHE_TTL seconds and never past the token's exp.
+AUTH_CACHE_TTL = 60
+_auth_cache = TTLCache(maxsize=10_000, ttl=AUTH_CACHE_TTL)
+_auth_cache_lock = threading.Lock()
+
+# Supabase access tokens are verified locally when possible, skipping the
+# GoTrue round-trip: HS256 with the project's JWT secret, or RS256/ES256
+# against the project's JWKS (fetched once, then cached by PyJWKClient).
+# Anything that fails local verification falls back to auth.get_user.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+JWT_AUDIENCE = "authenticated"
+_jwks_client = jwt.PyJWKClient(
+    f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json", cache_keys=True
+)
+
+# Short-lived response cache for public, read-heavy endpoints. With
+# REDIS_URL set it is shared by every worker; otherwise each process keeps
+# its own copy. Writers call invalidate_cache() so TTLs only bound staleness
+# from changes made elsewhere (e.g. directly in Supabase). Data a user acts
+# on right after changing it is cached with shared_only=True, i.e. in Redis
+# only: a per-process copy would survive writes handled by other workers.
+REDIS_URL = os.getenv("REDIS_URL")
+_redis = redis.Redis.from_url(REDIS_URL) if redis and REDIS_URL else None
+_response_cache = TTLCache(maxsize=256, ttl=300)  # key -> (expires_at, body)
+_response_cache_lock = threading.Lock()
+
+# Same encoding as app.ORJSONProvider, for bodies built without jsonify()
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+FACILITIES_CACHE_KEY = "facilities:list"
+FACILITIES_CACHE_TTL = 15  # seconds; occupancy counts change constantly
+LEGACY_SPOTS_CACHE_KEY = "spots:legacy"  # v1 GET /api/spots, same TTL
+LEGACY_LOGS_CACHE_KEY = "logs:legacy"  # v1 GET /api/logs
+LEGACY_LOGS_TTL = 5
+# Everything that shows spot occupancy or the sessions behind it; drop these
+# whenever a spot changes or a vehicle enters or leaves
+SPOT_STATE_CACHE_KEYS = (
+    FACILITIES_CACHE_KEY,
+    LEGACY_SPOTS_CACHE_KEY,
+    LEGACY_LOGS_CACHE_KEY,
+)
+DETECTION_LOGS_TTL = 3  # written at camera rate, so expired rather than dropped
+DEFAULT_FACILITY_KEY = "facilities:default"
+DEFAULT_FACILITY_TTL = 3600  # Redis only; facility create/delete invalidate
+VEHICLE_LOOKUP_TTL = 300  # Redis only; vehicle and subscription writes invalidate
+WALLET_CACHE_TTL = 30  # Redis only; balance changes call invalidate_cached_user()
+DEVICE_LIST_TTL = 30  # cameras and gates, Redis only; API writes invalidate
+LPR_STATUS_CACHE_KEY = "lpr:status"
+LPR_STATUS_TTL = 2  # collapses dashboard tabs polling the LPR health check
+
+# Worker pool for Supabase calls that can overlap or need not block the
+# response. Under gunicorn's gevent workers `threading` is monkey-patched,
+# so these workers are greenlets rather than OS threads.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="supabase")
+
+
+def _auth_cache_key(token):
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _token_expiry(token):
+    """Read the (unverified) `exp` claim of a JWT, or None if unreadable."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return orjson.loads(base64.urlsafe_b64decode(payload)).get("exp")
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+def _verify_token_locally(token):
+    """Return the verified JWT claims, or None if local verification failed.
+
+    Raises jwt.ExpiredSignatureError for a correctly signed but expired token.
+    """
+    try:
+        alg = jwt.get_unverified_header(token).get("alg")
+        if alg == "HS256":
+            if not SUPABASE_JWT_SECRET:
+                return None
+            key = SUPABASE_JWT_SECRET
+        elif alg in ("RS256", "ES256"):
+            key = _jwks_client.get_signing_key_from_jwt(token).key
+        else:
+            return None
+        return jwt.decode(token, key, algorithms=[alg], audience=JWT_AUDIENCE)
+    except jwt.ExpiredSignatureError:
+        raise
+    except jwt.PyJWTError:
+        return None
+
+
+def _authenticate(token):
+    """Return (auth_user, exp) for a token, or (None, None) if invalid."""
+    try:
+        claims = _verify_token_locally(token)
+    except jwt.ExpiredSignatureError:
+        return None, None
+    if claims:
+        user = SimpleNamespace(
+            id=claims["sub"], email=claims.get("email"), role=claims.get("role")
+        )
+        return user, claims.get("exp")
+
+    user = supabase.auth.get_user(token)
+    if not user:
+        return None, None
+    return user.user, _token_expiry(token)
+
+
+def _user_generation_key(user_id):
+    return f"user:gen:{user_id}"
+
+
+def _user_generation(user_id):
+    """The users row's change counter, shared by every worker through Redis.
+
+    None when it can't be read (no Redis, or Redis is down): the cached row
+    then can't be trusted and is re-read.
+    """
+    if _redis is None:
+        return None
+    try:
+        return _redis.get(_user_generation_key(user_id)) or b"0"
+    except redis.RedisError:
+        return None
+
 
+def _resolve_user(token):
+    """Return (auth_user, db_user) for a token, or (None, None) if invalid."""
+    key = _auth_cache_key(token)
+    with _auth_cache_lock:
+        cached = _auth_cache.get(key)
+    if cached and (cached[2] is None or cached[2] > time.time()):
+        user, db_row, exp, generation = cached
+        if generation is not None and generation == _user_generation(db_row["id"]):
+            return user, db_row
+        # Token still verified; only the users row needs re-reading
+    else:
+        user, exp = _authenticate(token)
+        if not user:
+            with _auth_cache_lock:
+                _auth_cache.pop(key, None)
+            return None, None
 
-def require_auth(f):
-    """Protect a route: any valid JWT is accepted."""
+    # Attach local DB user record (wallet embedded so /api/auth/me needs no
+    # extra round-trip)
+    db_user = (
+        supabase.table("users")
+        .select("*, user_wallets(balance)")
+        .eq("auth_user_id", user.id)
+        .limit(1)
+        .execute()
+    )
+    db_row = db_user.data[0] if db_user.data else None
+    if db_row:
+        with _auth_cache_lock:
+            _auth_cache[key] = (user, db_row, exp, _user_generation(db_row["id"]))
+    return user, db_row
 
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"message": "No authorization token provided"}), 401
+
+def prime_auth_cache(token, auth_user, db_row):
+    """Cache a token that was just issued (at login) with its users row, so
+    the client's first authenticated request skips both user lookups."""
+    if db_row:
+        with _auth_cache_lock:
+            _auth_cache[_auth_cache_key(token)] = (
+                auth_user,
+                db_row,
+                _token_expiry(token),
+                _user_generation(db_row["id"]),
+            )
+
+
+def invalidate_cached_user(user_id):
+    """Drop cached auth entries (which embed the wallet balance) and the
+    cached GET /api/wallet response for a users row after it is modified.
+
+    Bumping the row's generation makes every other worker re-read it too.
+    """
+    with _auth_cache_lock:
+        stale = [k for k, v in _auth_cache.items() if v[1]["id"] == user_id]
+        for k in stale:
+            _auth_cache.pop(k, None)
+    if _redis is not None:
         try:
-            token = auth_header.split(" ")[1] if " " in auth_header else auth_header
-            user = supabase.auth.get_user(token)
-            if not user:
+            # Outlives any auth cache entry that could hold the old value
+            with _redis.pipeline() as pipe:
+                pipe.incr(_user_generation_key(user_id))
+                pipe.expire(_user_generation_key(user_id), 2 * AUTH_CACHE_TTL)
+                pipe.execute()
+        except redis.RedisError:
+            pass
+    invalidate_cache(wallet_cache_key(user_id))
+
+
+def require_role(*allowed):
+    """Protect a route: any valid JWT, optionally limited to the given roles.
+
+    With no roles every authenticated user is accepted; otherwise the
+    user's `role` column must be one of `allowed`.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            auth_header = request.headers.get("Authorization")
+            if not auth_header:
+                return jsonify({"message": "No authorization token provided"}), 401
+            token = auth_header.removeprefix("Bearer ").removeprefix("bearer ").strip()
+            # A JWT is header.payload.signature; reject anything else without
+            # a Supabase round-trip.
+            if token.count(".") != 2:
                 return jsonify({"message": "Invalid or expired token"}), 401
-            request.current_user = user.user
-            # Attach local DB user record
-            db_user = (
-                supabase.table("users")
-                .select("*")
-                .eq("auth_user_id", user.user.id)
-                .limit(1)
-                .execute()
-            )
-            request.db_user = db_user.data[0] if db_user.data else None
-            return f(*args, **kwargs)
-        except Exception as e:
-            return jsonify({"message": f"Authentication failed: {str(e)}"}), 401
+            try:
+                user, db_user = _resolve_user(token)
+                if not user:
+                    return jsonify({"message": "Invalid or expired token"}), 401
+                request.current_user = user
+                if allowed and (not db_user or db_user["role"] not in allowed):
+                    return jsonify({"message": "Admin access required"}), 403
+                request.db_user = db_user
+                return f(*args, **kwargs)
+            except HTTPException:
+                raise  # abort() from the handler: already the right response
+            except Exception as e:
+                with _auth_cache_lock:
+                    _auth_cache.pop(_auth_cache_key(token), None)
+                return jsonify({"message": f"Authentication failed: {str(e)}"}), 401
+
+        return decorated
+
+    return decorator
 
-    return decorated
 
+# Any valid JWT is accepted.
+require_auth = require_role()
+# Only admin users.
+require_admin = require_role("admin", "operator")
+
+
+def _create_notification(user_id, title, message, notif_type="system", data=None):
+    """Helper: queue a notification for a user.
 
-def require_admin(f):
-    """Protect a route: only admin users."""
+    The insert runs on the background executor, so callers never wait on
+    it and a failure can't break the main operation (it is only logged).
+    """
+    run_in_background(
+        _insert_notification,
+        {
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "type": notif_type,
+            "data": data,
+        },
+    )
 
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"message": "No authorization token provided"}), 401
+
+def _insert_notification(row):
+    supabase.table("notifications").insert(row).execute()
+
+
+def conditional_json(payload, max_age=5, public=False):
+    """jsonify() with an ETag; answers 304 with no body on If-None-Match.
+
+    For endpoints clients poll: unchanged data costs a round-trip but no
+    download or JSON parse. `public` lets shared caches keep the response
+    (only for data that is the same for every caller).
+    """
+    return _conditional(jsonify(payload), max_age, public)
+
+
+def _conditional(resp, max_age, public):
+    resp.set_etag(hashlib.blake2b(resp.get_data(), digest_size=16).hexdigest())
+    scope = "public" if public else "private"
+    resp.headers["Cache-Control"] = f"{scope}, max-age={max_age}"
+    return resp.make_conditional(request)
+
+
+def _cache_get(key, shared_only=False):
+    if _redis is not None:
         try:
-            token = auth_header.split(" ")[1] if " " in auth_header else auth_header
-            user = supabase.auth.get_user(token)
-            if not user:
-                return jsonify({"message": "Invalid or expired token"}), 401
-            request.current_user = user.user
-            db_user = (
-                supabase.table("users")
-                .select("*")
-                .eq("auth_user_id", user.user.id)
-                .limit(1)
-                .execute()
+            return _redis.get(key)
+        except redis.RedisError:
+            return None
+    if shared_only:
+        return None
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _cache_set(key, body, ttl, shared_only=False):
+    if _redis is not None:
+        try:
+            _redis.setex(key, ttl, body)
+        except redis.RedisError:
+            pass
+        return
+    if shared_only:
+        return
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() + ttl, body)
+
+
+def cached_json(key, ttl, loader, max_age=5, public=False, shared_only=False):
+    """Serve `loader()` as JSON, reusing the encoded body for `ttl` seconds.
+
+    The response gets the same ETag / 304 handling as conditional_json().
+    With `shared_only` the body is cached in Redis or not at all.
+    """
+    body = _cache_get(key, shared_only)
+    if body is None:
+        body = orjson.dumps(loader(), option=ORJSON_OPTIONS)
+        _cache_set(key, body, ttl, shared_only)
+    return _conditional(Response(body, mimetype="application/json"), max_age, public)
+
+
+def cached_value(key, ttl, loader):
+    """`loader()`'s JSON-serialisable result, shared for `ttl` seconds."""
+    body = _cache_get(key)
+    if body is None:
+        body = orjson.dumps(loader(), option=ORJSON_OPTIONS)
+        _cache_set(key, body, ttl)
+    return orjson.loads(body)
+
+
+def invalidate_cache(*keys):
+    """Drop cached responses after the data behind them changes."""
+    if _redis is not None:
+        try:
+            _redis.delete(*keys)
+        except redis.RedisError:
+            pass
+    with _response_cache_lock:
+        for key in keys:
+            _response_cache.pop(key, None)
+
+
+def default_facility_id():
+    """Id of the facility the v1 endpoints operate on (the first one), or None."""
+    cached = _cache_get(DEFAULT_FACILITY_KEY, shared_only=True)
+    if cached is not None:
+        return int(cached)
+    result = supabase.table("facilities").select("id").order("id").limit(1).execute()
+    if not result.data:
+        return None
+    facility_id = result.data[0]["id"]
+    _cache_set(
+        DEFAULT_FACILITY_KEY,
+        str(facility_id).encode(),
+        DEFAULT_FACILITY_TTL,
+        shared_only=True,
+    )
+    return facility_id
+
+
+def wallet_cache_key(user_id):
+    return f"wallet:{user_id}"
+
+
+def device_list_key(kind, facility_id=None):
+    """Cache key for the camera/gate list, per facility filter."""
+    return f"{kind}:list:{facility_id or 'all'}"
+
+
+def invalidate_device_lists(kind, facility_ids=()):
+    """Drop the unfiltered list and the list of every facility touched."""
+    invalidate_cache(
+        device_list_key(kind), *(device_list_key(kind, f) for f in facility_ids)
+    )
+
+
+def detection_logs_key(limit, cursor=None):
+    """Cache key for one page of the v1 detection log."""
+    return f"detections:legacy:{limit}:{cursor or ''}"
+
+
+def vehicle_lookup_key(plate):
+    return f"vehicle:plate:{plate}"
+
+
+def invalidate_vehicle_lookup(plate=None, vehicle_id=None):
+    """Forget the cached LPR lookup for a plate (or the vehicle's plate)."""
+    if _redis is None:
+        return  # lookups are only cached in Redis
+    if plate is None and vehicle_id is not None:
+        row = (
+            supabase.table("vehicles")
+            .select("plate_number")
+            .eq("id", vehicle_id)
+            .limit(1)
+            .execute()
+        )
+        plate = row.data[0]["plate_number"] if row.data else None
+    if plate:
+        invalidate_cache(vehicle_lookup_key(plate))
+
+
+def free_spot_query(facility_id, columns="*", spot_type=None):
+    """Query for the first free, active spot in a facility (lowest id first).
+
+    Only the client-side fallbacks use this; the allocate_spot() and
+    process_vehicle_entry() functions apply the same predicate in SQL.
+    """
+    query = (
+        supabase.table("parking_spots")
+        .select(columns)
+        .eq("facility_id", facility_id)
+        .eq("is_occupied", False)
+        .eq("is_reserved", False)
+        .eq("is_active", True)
+    )
+    if spot_type:
+        query = query.eq("spot_type", spot_type)
+    return query.order("id").limit(1)
+
+
+def adjust_wallet(user_id, delta, require_min=0):
+    """Add `delta` to the user's wallet if its balance is >= `require_min`.
+
+    Returns the new balance, or None if there is no wallet or too little in
+    it. Uses the wallet_adjust() SQL function; until that exists, retries a
+    compare-and-set update so a concurrent change is never overwritten.
+    """
+    try:
+        return (
+            supabase.rpc(
+                "wallet_adjust",
+                {"p_user_id": user_id, "p_delta": delta, "p_require_min": require_min},
             )
-            if not db_user.data or db_user.data[0]["role"] not in ("admin", "operator"):
-                return jsonify({"message": "Admin access required"}), 403
-            request.db_user = db_user.data[0]
-            return f(*args, **kwargs)
-        except Exception as e:
-            return jsonify({"message": f"Authentication failed: {str(e)}"}), 401
+            .execute()
+            .data
+        )
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
 
-    return decorated
+    for _ in range(3):
+        wallet = (
+            supabase.table("user_wallets")
+            .select("id, balance")
+            .eq("user_id", user_id)
+            .limit(1)
+            .execute()
+        )
+        if not wallet.data or wallet.data[0]["balance"] < require_min:
+            return None
+        balance = wallet.data[0]["balance"]
+        updated = (
+            supabase.table("user_wallets")
+            .update({"balance": balance + delta})
+            .eq("id", wallet.data[0]["id"])
+            .eq("balance", balance)
+            .execute()
+        )
+        if updated.data:
+            return balance + delta
+    return None
 
 
-def _create_notification(user_id, title, message, notif_type="system", data=None):
-    """Helper: create a notification for a user."""
+def spot_occupancy(facility_id=None):
+    """Return {facility_id: {"total", "occupied", "reserved"}} for active spots.
+
+    Uses the facility_occupancy() SQL function (one aggregate query); if it
+    hasn't been created yet, counts a single spots select in Python instead.
+    """
     try:
-        supabase.table("notifications").insert(
-            {
-                "user_id": user_id,
-                "title": title,
-                "message": message,
-                "type": notif_type,
-                "data": data,
+        params = {"p_facility_id": facility_id} if facility_id else {}
+        rows = supabase.rpc("facility_occupancy", params).execute().data
+        return {
+            r["facility_id"]: {
+                "total": r["total"],
+                "occupied": r["occupied"],
+                "reserved": r["reserved"],
             }
-        ).execute()
-    except Exception:
-        pass  # Non-critical: don't fail the main operation
+            for r in rows
+        }
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+
+    query = (
+        supabase.table("parking_spots")
+        .select("facility_id, is_occupied, is_reserved")
+        .eq("is_active", True)
+    )
+    if facility_id:
+        query = query.eq("facility_id", facility_id)
+    counts = {}
+    for spot in query.execute().data:
+        c = counts.setdefault(
+            spot["facility_id"], {"total": 0, "occupied": 0, "reserved": 0}
+        )
+        c["total"] += 1
+        if spot["is_occupied"]:
+            c["occupied"] += 1
+        elif spot["is_reserved"]:
+            c["reserved"] += 1
+    return counts
+
+
+NO_SPOTS = {"total": 0, "occupied": 0, "reserved": 0}
+
+
+def seek_page(query, column, limit, cursor=None):
+    """Fetch one newest-first page of `query`, keyed on (`column`, id).
+
+    Returns (rows, next_cursor). Pass next_cursor back as `cursor` to get
+    the following page; it is None once the last page has been served.
+    Unlike OFFSET, each page costs the same however deep the client reads.
+    The id breaks ties, so rows sharing a timestamp are never skipped.
+    A malformed cursor aborts the request with a 400.
+    """
+    limit = max(1, min(limit, MAX_LIST_LIMIT))
+    if cursor:
+        value, row_id = _decode_cursor(cursor)
+        query = query.or_(
+            f"{column}.lt.{value},and({column}.eq.{value},id.lt.{row_id})"
+        )
+    rows = (
+        query.order(column, desc=True)
+        .order("id", desc=True)
+        .limit(limit)
+        .execute()
+        .data
+    )
+    if len(rows) < limit:
+        return rows, None
+    return rows, encode_cursor(rows[-1][column], rows[-1]["id"])
+
+
+def encode_cursor(value, row_id):
+    """Opaque, URL-safe cursor for the row (`value`, `row_id`)."""
+    return base64.urlsafe_b64encode(orjson.dumps([value, row_id])).decode()
+
+
+def _decode_cursor(cursor):
+    """(timestamp, id) from a cursor made by encode_cursor(), else abort 400."""
+    try:
+        value, row_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        # Re-serialising the parsed timestamp keeps the filter free of
+        # anything PostgREST would read as syntax. Python 3.10's
+        # fromisoformat() doesn't accept the "Z" Supabase returns.
+        value = datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+        if isinstance(row_id, int) and not isinstance(row_id, bool):
+            return value, row_id
+    except (ValueError, TypeError, AttributeError):
+        pass
+    abort(make_response(jsonify({"message": "Invalid cursor"}), 400))
+
+
+# Runs of whitespace, and whitespace around a hyphen, in a plate number
+_PLATE_SPACING = re.compile(r"\s*(-)\s*|\s+")
+
+
+def normalize_plate(plate):
+    """Canonical plate form: upper case, single spaces, no space around "-".
+
+    "wp  ca - 1234 " and "WP CA-1234" must hit the same row (and index
+    entry), so every plate is normalised before it is stored or looked up.
+    """
+    return _PLATE_SPACING.sub(lambda m: m.group(1) or " ", plate.strip().upper())
+
+
+def json_body():
+    """The request's JSON object, or {} if the body is missing or not an object."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+
+def as_id(value):
+    """Coerce a JSON id (integer or digit string) to int; None if invalid."""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return None
+
+
+def first_embedded(value):
+    """Normalise a PostgREST one-to-one embed (object, one-item list, or None)."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def run_parallel(*calls):
+    """Run independent zero-argument callables concurrently.
+
+    Returns their results in the order given; re-raises the first error.
+    """
+    futures = [_executor.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def run_in_background(fn, *args, **kwargs):
+    """Fire-and-forget a non-critical call after the response is decided."""
+
+    def _run():
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            logger.exception("Background task %s failed", fn.__name__)
+
+    _executor.submit(_run)
@@ -4,12 +4,38 @@ routes_compat.py - Backward compatibility endpoints
 Legacy endpoint aliases for v1 clients.
 """
 
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_auth, require_admin, DEFAULT_HOURLY_RATE
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from postgrest.types import ReturnMethod
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    require_admin,
+    cached_json,
+    default_facility_id,
+    detection_logs_key,
+    invalidate_cache,
+    json_body,
+    seek_page,
+    DEFAULT_FACILITY_KEY,
+    DEFAULT_HOURLY_RATE,
+    DETECTION_LOGS_TTL,
+    FACILITIES_CACHE_TTL,
+    LEGACY_LOGS_CACHE_KEY,
+    LEGACY_LOGS_TTL,
+    LEGACY_SPOTS_CACHE_KEY,
+    SPOT_STATE_CACHE_KEYS,
+    FUNCTION_NOT_FOUND,
+)
 from routes_auth import signup, login
 from routes_sessions import vehicle_entry, vehicle_exit
 from routes_detections import add_detection, update_detection_action
+from routes_system import reset_parking_state
+
+bp = Blueprint("compat", __name__)
+
+# Spots created by /api/init-spots: A-01 .. A-32 (as in reset_db.py)
+DEFAULT_SPOT_NAMES = tuple(f"A-{i:02d}" for i in range(1, 33))
 
 # ==========================================================================
 # BACKWARD COMPATIBILITY – Old endpoint aliases
@@ -18,31 +44,33 @@ from routes_detections import add_detection, update_detection_action
 # frontend code keeps working during the migration.
 
 
-@app.route("/api/signup", methods=["POST"])
+@bp.route("/api/signup", methods=["POST"])
 def signup_compat():
     """Backward compat: /api/signup → /api/auth/signup"""
     return signup()
 
 
-@app.route("/api/login", methods=["POST"])
+@bp.route("/api/login", methods=["POST"])
 def login_compat():
     """Backward compat: /api/login → /api/auth/login"""
     return login()
 
 
-@app.route("/api/spots", methods=["GET"])
+@bp.route("/api/spots", methods=["GET"])
 @require_auth
 def get_spots_compat():
     """Backward compat: /api/spots → returns spots for facility 1."""
-    # Find first facility
-    facility = supabase.table("facilities").select("id").limit(1).execute()
-    if not facility.data:
-        return jsonify({"spots": []}), 200
-    facility_id = facility.data[0]["id"]
+    return cached_json(LEGACY_SPOTS_CACHE_KEY, FACILITIES_CACHE_TTL, _load_legacy_spots)
+
+
+def _load_legacy_spots():
+    facility_id = default_facility_id()
+    if facility_id is None:
+        return {"spots": []}
 
     result = (
         supabase.table("parking_spots")
-        .select("*")
+        .select("id, spot_name, is_occupied")
         .eq("facility_id", facility_id)
         .order("id")
         .execute()
@@ -51,150 +79,169 @@ def get_spots_compat():
         {"id": s["id"], "name": s["spot_name"], "is_occupied": s["is_occupied"]}
         for s in result.data
     ]
-    return jsonify({"spots": output}), 200
+    return {"spots": output}
 
 
-@app.route("/api/init-spots", methods=["POST"])
+@bp.route("/api/init-spots", methods=["POST"])
 def init_spots_compat():
     """Backward compat: /api/init-spots → creates facility + spots."""
-    # Create default facility if none exists
-    existing = supabase.table("facilities").select("id").limit(1).execute()
-    if not existing.data:
-        supabase.table("facilities").insert(
-            {
-                "name": "Sentra Main Parking",
-                "address": "Main Street",
-                "city": "Colombo",
-                "total_spots": 32,
-                "hourly_rate": DEFAULT_HOURLY_RATE,
-            }
-        ).execute()
-        existing = supabase.table("facilities").select("id").limit(1).execute()
-
-    facility_id = existing.data[0]["id"]
-
-    # Check if spots exist
-    spots = (
-        supabase.table("parking_spots")
-        .select("id")
-        .eq("facility_id", facility_id)
-        .limit(1)
-        .execute()
-    )
-    if spots.data:
+    try:
+        created = (
+            supabase.rpc(
+                "ensure_default_facility_and_spots",
+                {"p_hourly_rate": DEFAULT_HOURLY_RATE},
+            )
+            .execute()
+            .data
+        )
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        created = _init_default_spots_steps()
+
+    if not created:
         return jsonify({"message": "Spots already initialized!"}), 400
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS, DEFAULT_FACILITY_KEY)
+    return jsonify({"message": "32 Parking spots created successfully!"}), 201
 
-    spot_list = []
-    for i in range(1, 33):
-        spot_list.append(
-            {
-                "facility_id": facility_id,
-                "spot_name": f"A-{str(i).zfill(2)}",
-                "is_occupied": False,
-            }
+
+def _init_default_spots_steps():
+    """init_spots_compat without the SQL function: returns spots created."""
+    # Create default facility if none exists
+    facility_id = default_facility_id()
+    if facility_id is None:
+        created = (
+            supabase.table("facilities")
+            .insert(
+                {
+                    "name": "Sentra Main Parking",
+                    "address": "Main Street",
+                    "city": "Colombo",
+                    "total_spots": 32,
+                    "hourly_rate": DEFAULT_HOURLY_RATE,
+                }
+            )
+            .execute()
         )
-    supabase.table("parking_spots").insert(spot_list).execute()
-    return jsonify({"message": "32 Parking spots created successfully!"}), 201
+        facility_id = created.data[0]["id"]
+    else:
+        # Check if spots exist
+        spots = (
+            supabase.table("parking_spots")
+            .select("id")
+            .eq("facility_id", facility_id)
+            .limit(1)
+            .execute()
+        )
+        if spots.data:
+            return 0
+
+    spot_list = [
+        {"facility_id": facility_id, "spot_name": name, "is_occupied": False}
+        for name in DEFAULT_SPOT_NAMES
+    ]
+    supabase.table("parking_spots").insert(
+        spot_list, returning=ReturnMethod.minimal
+    ).execute()
+    return len(spot_list)
 
 
-@app.route("/api/vehicle/entry", methods=["POST"])
+@bp.route("/api/vehicle/entry", methods=["POST"])
 def vehicle_entry_compat():
     """Backward compat: /api/vehicle/entry → /api/sessions/entry"""
-    data = request.get_json() or {}
+    data = json_body()
     # Add default facility_id if not present
     if "facility_id" not in data:
-        facility = supabase.table("facilities").select("id").limit(1).execute()
-        if facility.data:
-            data["facility_id"] = facility.data[0]["id"]
-        else:
+        data["facility_id"] = default_facility_id()
+        if data["facility_id"] is None:
             return (
                 jsonify({"message": "No facility exists. Run /api/init-spots first."}),
                 400,
             )
 
-    # Temporarily override request data
-    original_json = request.get_json
-    request.get_json = lambda *a, **kw: data
-    result = vehicle_entry()
-    request.get_json = original_json
-    return result
+    return vehicle_entry(payload=data)
 
 
-@app.route("/api/vehicle/exit", methods=["POST"])
+@bp.route("/api/vehicle/exit", methods=["POST"])
 def vehicle_exit_compat():
     """Backward compat: /api/vehicle/exit → /api/sessions/exit"""
     return vehicle_exit()
 
 
-@app.route("/api/logs", methods=["GET"])
+@bp.route("/api/logs", methods=["GET"])
 @require_auth
 def get_logs_compat():
-    """Backward compat: /api/logs → returns recent sessions for facility 1."""
-    facility = supabase.table("facilities").select("id").limit(1).execute()
-    fid = facility.data[0]["id"] if facility.data else None
+    """Backward compat: /api/logs → returns recent sessions for facility 1.
+
+    Shared by every caller for a few seconds; entry and exit drop it early.
+    """
+    return cached_json(LEGACY_LOGS_CACHE_KEY, LEGACY_LOGS_TTL, _load_legacy_logs)
+
+
+def _load_legacy_logs():
+    fid = default_facility_id()
 
+    # Select just the v1 fields, renamed by PostgREST, so rows go out as-is;
+    # the facility name rides along so clients need no second lookup
     query = (
         supabase.table("parking_sessions")
-        .select("*")
+        .select(
+            "id, plate_number, spot:spot_name, entry_time, exit_time, "
+            "duration_minutes, amount_lkr:amount, facility:facilities(name)"
+        )
         .order("entry_time", desc=True)
         .limit(50)
     )
     if fid:
         query = query.eq("facility_id", fid)
-    result = query.execute()
-
-    output = []
-    for s in result.data:
-        output.append(
-            {
-                "id": s["id"],
-                "plate_number": s["plate_number"],
-                "spot": s["spot_name"],
-                "entry_time": s["entry_time"],
-                "exit_time": s.get("exit_time"),
-                "duration_minutes": s.get("duration_minutes"),
-                "amount_lkr": s.get("amount"),
-            }
-        )
-    return jsonify({"logs": output}), 200
+    return {"logs": query.execute().data}
 
 
-@app.route("/api/reset-system", methods=["POST"])
+@bp.route("/api/reset-system", methods=["POST"])
 def reset_system_compat():
     """Backward compat: /api/reset-system (no auth for compat)."""
     try:
-        supabase.table("parking_sessions").delete().neq("id", 0).execute()
-        supabase.table("reservations").delete().neq("id", 0).execute()
-        supabase.table("parking_spots").update(
-            {"is_occupied": False, "is_reserved": False}
-        ).neq("id", 0).execute()
+        reset_parking_state()
         return jsonify({"message": "System reset! All spots are now free."}), 200
     except Exception as e:
         return jsonify({"message": f"Reset failed: {str(e)}"}), 500
 
 
-@app.route("/api/detection-logs", methods=["GET"])
+@bp.route("/api/detection-logs", methods=["GET"])
 @require_auth
 def get_detection_logs_compat():
-    """Backward compat: /api/detection-logs"""
+    """Backward compat: /api/detection-logs
+
+    Pass the returned next_cursor as ?cursor= for the next page. Each page is
+    shared for DETECTION_LOGS_TTL seconds.
+    """
     limit = request.args.get("limit", 50, type=int)
-    result = (
-        supabase.table("detection_logs")
-        .select("*")
-        .order("detected_at", desc=True)
-        .limit(limit)
-        .execute()
+    cursor = request.args.get("cursor")
+    return cached_json(
+        detection_logs_key(limit, cursor),
+        DETECTION_LOGS_TTL,
+        lambda: _load_detection_logs(limit, cursor),
+        max_age=DETECTION_LOGS_TTL,
+    )
+
+
+def _load_detection_logs(limit, cursor):
+    logs, next_cursor = seek_page(
+        supabase.table("detection_logs").select("*"),
+        "detected_at",
+        limit,
+        cursor,
     )
-    return jsonify({"logs": result.data}), 200
+    return {"logs": logs, "next_cursor": next_cursor}
 
 
-@app.route("/api/detection-logs", methods=["POST"])
+@bp.route("/api/detection-logs", methods=["POST"])
 def add_detection_log_compat():
     """Backward compat: /api/detection-logs → /api/detections"""
     return add_detection()
 
 
-@app.route("/api/detection-logs/<int:log_id>/action", methods=["PATCH"])
+@bp.route("/api/detection-logs/<int:log_id>/action", methods=["PATCH"])
 @require_admin
 def update_detection_compat(log_id):
     """Backward compat: /api/detection-logs/:id/action"""
@@ -5,16 +5,25 @@ Admin analytics endpoints.
 """
 
 from datetime import datetime, timezone
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    run_parallel,
+    spot_occupancy,
+    NO_SPOTS,
+    FUNCTION_NOT_FOUND,
+)
+
+bp = Blueprint("dashboard", __name__)
 
 # ==========================================================================
 # 14. DASHBOARD / ANALYTICS (Admin)
 # ==========================================================================
 
 
-@app.route("/api/dashboard/stats", methods=["GET"])
+@bp.route("/api/dashboard/stats", methods=["GET"])
 @require_admin
 def dashboard_stats():
     """
@@ -25,87 +34,94 @@ def dashboard_stats():
     if not facility_id:
         return jsonify({"message": "facility_id is required"}), 400
 
-    # Spots summary
-    spots = (
-        supabase.table("parking_spots")
-        .select("is_occupied, is_reserved")
-        .eq("facility_id", facility_id)
-        .eq("is_active", True)
-        .execute()
-    )
-    total_spots = len(spots.data)
-    occupied = sum(1 for s in spots.data if s["is_occupied"])
-    reserved = sum(1 for s in spots.data if s["is_reserved"] and not s["is_occupied"])
+    # One aggregate query in dashboard_stats() (see supabase_schema.sql);
+    # until it is deployed, assemble the same numbers from separate queries.
+    try:
+        stats = (
+            supabase.rpc("dashboard_stats", {"p_facility_id": facility_id})
+            .execute()
+            .data
+        )
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        stats = _dashboard_stats_steps(facility_id)
+    return jsonify(stats), 200
+
+
+def _dashboard_stats_steps(facility_id):
+    """Client-side dashboard stats: same numbers as dashboard_stats()."""
+    # Spots summary (aggregated in Postgres)
+    counts = spot_occupancy(facility_id).get(facility_id, NO_SPOTS)
+    total_spots = counts["total"]
+    occupied = counts["occupied"]
+    reserved = counts["reserved"]
     available = total_spots - occupied - reserved
 
     # Today's sessions and revenue
     today_start = (
-        datetime.now(timezone.utc).replace(hour=0, minute=0, second=0).isoformat()
+        datetime.now(timezone.utc)
+        .replace(hour=0, minute=0, second=0, microsecond=0)
+        .isoformat()
     )
-    today_sessions = (
-        supabase.table("parking_sessions")
+
+    # The rest only need a count: head=True returns just the total
+    def count(table):
+        return supabase.table(table).select("id", count="exact", head=True)
+
+    (
+        today_sessions,
+        active_sessions,
+        today_reservations,
+        total_users,
+        total_vehicles,
+    ) = run_parallel(
+        lambda: supabase.table("parking_sessions")
         .select("amount, payment_status")
         .eq("facility_id", facility_id)
         .gte("entry_time", today_start)
-        .execute()
-    )
-    today_entries = len(today_sessions.data)
-    today_revenue = sum(
-        s.get("amount", 0) or 0
-        for s in today_sessions.data
-        if s.get("payment_status") == "paid"
-    )
-
-    # Active sessions
-    active_sessions = (
-        supabase.table("parking_sessions")
-        .select("id")
+        .execute(),
+        lambda: count("parking_sessions")
         .eq("facility_id", facility_id)
         .is_("exit_time", "null")
         .execute()
-    )
-
-    # Today's reservations
-    today_reservations = (
-        supabase.table("reservations")
-        .select("id")
+        .count,
+        lambda: count("reservations")
         .eq("facility_id", facility_id)
         .gte("reserved_start", today_start)
         .execute()
+        .count,
+        lambda: count("users").eq("role", "user").execute().count,
+        lambda: count("vehicles").eq("is_active", True).execute().count,
     )
-
-    # Registered users count
-    total_users = supabase.table("users").select("id").eq("role", "user").execute()
-    total_vehicles = (
-        supabase.table("vehicles").select("id").eq("is_active", True).execute()
+    today_entries = len(today_sessions.data)
+    today_revenue = sum(
+        s.get("amount", 0) or 0
+        for s in today_sessions.data
+        if s.get("payment_status") == "paid"
     )
 
-    return (
-        jsonify(
-            {
-                "spots": {
-                    "total": total_spots,
-                    "occupied": occupied,
-                    "reserved": reserved,
-                    "available": available,
-                },
-                "today": {
-                    "entries": today_entries,
-                    "revenue": today_revenue,
-                    "active_sessions": len(active_sessions.data),
-                    "reservations": len(today_reservations.data),
-                },
-                "system": {
-                    "total_users": len(total_users.data),
-                    "total_vehicles": len(total_vehicles.data),
-                },
-            }
-        ),
-        200,
-    )
+    return {
+        "spots": {
+            "total": total_spots,
+            "occupied": occupied,
+            "reserved": reserved,
+            "available": available,
+        },
+        "today": {
+            "entries": today_entries,
+            "revenue": today_revenue,
+            "active_sessions": active_sessions,
+            "reservations": today_reservations,
+        },
+        "system": {
+            "total_users": total_users,
+            "total_vehicles": total_vehicles,
+        },
+    }
 
 
-@app.route("/api/dashboard/recent-activity", methods=["GET"])
+@bp.route("/api/dashboard/recent-activity", methods=["GET"])
 @require_admin
 def recent_activity():
     """GET /api/dashboard/recent-activity – Recent sessions, detections, gate events."""
@@ -114,23 +130,20 @@ def recent_activity():
 
     sessions = (
         supabase.table("parking_sessions")
-        .select("*")
+        .select("*, facilities(name)")
         .order("entry_time", desc=True)
         .limit(limit)
     )
-    if facility_id:
-        sessions = sessions.eq("facility_id", facility_id)
-    sessions = sessions.execute()
-
     detections = (
         supabase.table("detection_logs")
-        .select("*")
+        .select("*, facilities(name)")
         .order("detected_at", desc=True)
         .limit(limit)
     )
     if facility_id:
+        sessions = sessions.eq("facility_id", facility_id)
         detections = detections.eq("facility_id", facility_id)
-    detections = detections.execute()
+    sessions, detections = run_parallel(sessions.execute, detections.execute)
 
     return (
         jsonify(
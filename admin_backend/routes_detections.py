@@ -5,35 +5,47 @@ Endpoints for LPR detection logs.
 """
 
 from datetime import datetime, timezone
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    normalize_plate,
+    json_body,
+    seek_page,
+    FUNCTION_NOT_FOUND,
+    MAX_LIST_LIMIT,
+)
+
+bp = Blueprint("detections", __name__)
 
 # ==========================================================================
 # 12. DETECTION LOGS
 # ==========================================================================
 
 
-@app.route("/api/detections", methods=["GET"])
+@bp.route("/api/detections", methods=["GET"])
 @require_admin
 def get_detections():
-    """GET /api/detections – Get LPR detection logs."""
-    limit = request.args.get("limit", 50, type=int)
+    """GET /api/detections – Get LPR detection logs.
+
+    Newest first; page with ?limit=50&cursor=<next_cursor>.
+    """
     facility_id = request.args.get("facility_id", type=int)
 
-    query = (
-        supabase.table("detection_logs")
-        .select("*")
-        .order("detected_at", desc=True)
-        .limit(limit)
-    )
+    query = supabase.table("detection_logs").select("*, facilities(name)")
     if facility_id:
         query = query.eq("facility_id", facility_id)
-    result = query.execute()
-    return jsonify({"detections": result.data}), 200
+    detections, next_cursor = seek_page(
+        query,
+        "detected_at",
+        request.args.get("limit", 50, type=int),
+        request.args.get("cursor"),
+    )
+    return jsonify({"detections": detections, "next_cursor": next_cursor}), 200
 
 
-@app.route("/api/detections", methods=["POST"])
+@bp.route("/api/detections", methods=["POST"])
 def add_detection():
     """
     POST /api/detections
@@ -42,16 +54,59 @@ def add_detection():
 
     Body: { "camera_id", "facility_id", "plate_number", "confidence",
             "vehicle_class"?, "image_url"? }
+      or a JSON array of such objects (each may add "detected_at") to log
+      a buffered batch in one request.
 
     Auto-checks if the plate is registered and flags it.
     """
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        return _add_detection_batch(data)
+    if not isinstance(data, dict):
+        data = {}
     camera_id = data.get("camera_id")
     plate = data.get("plate_number")
 
-    if not camera_id or not plate:
+    if not camera_id or not isinstance(plate, str) or not plate:
         return jsonify({"message": "camera_id and plate_number are required"}), 400
+    plate = normalize_plate(plate)
+
+    try:
+        rows = (
+            supabase.rpc(
+                "log_detection",
+                {
+                    "p_camera_id": camera_id,
+                    "p_facility_id": data.get("facility_id"),
+                    "p_plate": plate,
+                    "p_confidence": data.get("confidence", 0.0),
+                    "p_vehicle_class": data.get("vehicle_class"),
+                    "p_image_url": data.get("image_url"),
+                },
+            )
+            .execute()
+            .data
+        )
+        logged = rows[0]
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        logged = _log_detection_steps(plate, data)
+
+    return (
+        jsonify(
+            {
+                "message": "Detection logged",
+                "id": logged["id"],
+                "is_registered": logged["is_registered"],
+            }
+        ),
+        201,
+    )
 
+
+def _log_detection_steps(plate, data):
+    """add_detection without log_detection(): look up the plate, then insert."""
     # Check if plate is registered
     vehicle = (
         supabase.table("vehicles")
@@ -64,42 +119,97 @@ def add_detection():
     is_registered = len(vehicle.data) > 0
     vehicle_id = vehicle.data[0]["id"] if vehicle.data else None
 
-    log = {
-        "camera_id": camera_id,
-        "facility_id": data.get("facility_id"),
-        "plate_number": plate,
-        "confidence": data.get("confidence", 0.0),
-        "vehicle_id": vehicle_id,
-        "is_registered": is_registered,
-        "detected_at": datetime.now(timezone.utc).isoformat(),
-        "action_taken": "pending",
-        "vehicle_class": data.get("vehicle_class"),
-        "image_url": data.get("image_url"),
-    }
+    log = _detection_row(data, plate, vehicle_id)
     result = supabase.table("detection_logs").insert(log).execute()
-
+    return {"id": result.data[0]["id"], "is_registered": is_registered}
+
+
+def _add_detection_batch(items):
+    """Log a batch of detections with one vehicle lookup and one insert."""
+    if not 0 < len(items) <= MAX_LIST_LIMIT:
+        return (
+            jsonify({"message": f"Send between 1 and {MAX_LIST_LIMIT} detections"}),
+            400,
+        )
+    plates = []
+    for item in items:
+        plate = item.get("plate_number") if isinstance(item, dict) else None
+        if not isinstance(plate, str) or not plate or not item.get("camera_id"):
+            return (
+                jsonify({"message": "camera_id and plate_number are required"}),
+                400,
+            )
+        plates.append(normalize_plate(plate))
+
+    vehicles = (
+        supabase.table("vehicles")
+        .select("id, plate_number")
+        .in_("plate_number", list(set(plates)))
+        .eq("is_active", True)
+        .execute()
+    )
+    vehicle_ids = {v["plate_number"]: v["id"] for v in vehicles.data}
+
+    now = datetime.now(timezone.utc)
+    logs = [
+        _detection_row(
+            item, plate, vehicle_ids.get(plate), item.get("detected_at") or now
+        )
+        for item, plate in zip(items, plates)
+    ]
+    result = supabase.table("detection_logs").insert(logs).execute()
     return (
         jsonify(
             {
-                "message": "Detection logged",
-                "id": result.data[0]["id"],
-                "is_registered": is_registered,
+                "message": f"{len(logs)} detections logged",
+                "detections": [
+                    {"id": row["id"], "is_registered": row["is_registered"]}
+                    for row in result.data
+                ],
             }
         ),
         201,
     )
 
 
-@app.route("/api/detections/<int:log_id>/action", methods=["PATCH"])
+def _detection_row(data, plate, vehicle_id, detected_at=None):
+    """detection_logs row for one detection from the request body.
+
+    Without `detected_at` the column's DEFAULT NOW() stamps the row.
+    """
+    if isinstance(detected_at, datetime):
+        detected_at = detected_at.isoformat()
+    row = {
+        "camera_id": data.get("camera_id"),
+        "facility_id": data.get("facility_id"),
+        "plate_number": plate,
+        "confidence": data.get("confidence", 0.0),
+        "vehicle_id": vehicle_id,
+        "is_registered": vehicle_id is not None,
+        "action_taken": "pending",
+        "vehicle_class": data.get("vehicle_class"),
+        "image_url": data.get("image_url"),
+    }
+    if detected_at is not None:
+        row["detected_at"] = detected_at
+    return row
+
+
+@bp.route("/api/detections/<int:log_id>/action", methods=["PATCH"])
 @require_admin
 def update_detection_action(log_id):
     """PATCH /api/detections/:id/action – Approve/reject a detection."""
-    data = request.get_json()
-    action = data.get("action")
+    action = json_body().get("action")
     if action not in ("entry", "exit", "ignored", "gate_opened"):
         return jsonify({"message": "Invalid action"}), 400
 
-    supabase.table("detection_logs").update({"action_taken": action}).eq(
-        "id", log_id
-    ).execute()
+    # One round-trip: the UPDATE's returned rows tell us whether the log exists
+    result = (
+        supabase.table("detection_logs")
+        .update({"action_taken": action})
+        .eq("id", log_id)
+        .execute()
+    )
+    if not result.data:
+        return jsonify({"message": "Detection not found"}), 404
     return jsonify({"message": f"Action updated to {action}"}), 200
@@ -4,53 +4,77 @@ routes_facilities.py - Facility management
 CRUD for parking facilities.
 """
 
-from datetime import datetime, timezone
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin, DEFAULT_HOURLY_RATE
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    run_parallel,
+    cached_json,
+    spot_occupancy,
+    NO_SPOTS,
+    invalidate_cache,
+    DEFAULT_HOURLY_RATE,
+    FACILITIES_CACHE_KEY,
+    SPOT_STATE_CACHE_KEYS,
+    FACILITIES_CACHE_TTL,
+    DEFAULT_FACILITY_KEY,
+)
+
+bp = Blueprint("facilities", __name__)
+
+# Fields accepted by PUT /api/facilities/:id
+_FACILITY_UPDATE_FIELDS = frozenset(
+    {
+        "name",
+        "address",
+        "city",
+        "latitude",
+        "longitude",
+        "hourly_rate",
+        "operating_hours_start",
+        "operating_hours_end",
+        "is_active",
+        "image_url",
+    }
+)
 
 # ==========================================================================
 # 4. FACILITY MANAGEMENT
 # ==========================================================================
 
 
-@app.route("/api/facilities", methods=["GET"])
+@bp.route("/api/facilities", methods=["GET"])
 def get_facilities():
     """GET /api/facilities – List all active facilities (public for mobile app)."""
-    result = (
-        supabase.table("facilities")
+    return cached_json(
+        FACILITIES_CACHE_KEY, FACILITIES_CACHE_TTL, _load_facilities, public=True
+    )
+
+
+def _load_facilities():
+    result, occupancy = run_parallel(
+        lambda: supabase.table("facilities")
         .select("*")
         .eq("is_active", True)
         .order("name")
-        .execute()
+        .execute(),
+        spot_occupancy,
     )
 
     # Add live occupancy counts
     facilities = []
     for f in result.data:
-        spots = (
-            supabase.table("parking_spots")
-            .select("is_occupied, is_reserved")
-            .eq("facility_id", f["id"])
-            .eq("is_active", True)
-            .execute()
-        )
-        total = len(spots.data)
-        occupied = sum(1 for s in spots.data if s["is_occupied"])
-        reserved = sum(
-            1 for s in spots.data if s["is_reserved"] and not s["is_occupied"]
-        )
-
-        f["total_spots"] = total
-        f["occupied_spots"] = occupied
-        f["reserved_spots"] = reserved
-        f["available_spots"] = total - occupied - reserved
+        counts = occupancy.get(f["id"], NO_SPOTS)
+        f["total_spots"] = counts["total"]
+        f["occupied_spots"] = counts["occupied"]
+        f["reserved_spots"] = counts["reserved"]
+        f["available_spots"] = counts["total"] - counts["occupied"] - counts["reserved"]
         facilities.append(f)
 
-    return jsonify({"facilities": facilities}), 200
+    return {"facilities": facilities}
 
 
-@app.route("/api/facilities", methods=["POST"])
+@bp.route("/api/facilities", methods=["POST"])
 @require_admin
 def create_facility():
     """POST /api/facilities – Create a new parking facility."""
@@ -71,40 +95,33 @@ def create_facility():
         "image_url": data.get("image_url"),
     }
     result = supabase.table("facilities").insert(facility).execute()
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS, DEFAULT_FACILITY_KEY)
     return jsonify({"message": "Facility created", "facility": result.data[0]}), 201
 
 
-@app.route("/api/facilities/<int:facility_id>", methods=["GET"])
+@bp.route("/api/facilities/<int:facility_id>", methods=["GET"])
 def get_facility(facility_id):
     """GET /api/facilities/:id – Get facility details with floors and spot summary."""
-    facility = (
-        supabase.table("facilities")
+    facility, floors, occupancy = run_parallel(
+        lambda: supabase.table("facilities")
         .select("*")
         .eq("id", facility_id)
         .limit(1)
-        .execute()
-    )
-    if not facility.data:
-        return jsonify({"message": "Facility not found"}), 404
-
-    floors = (
-        supabase.table("floors")
+        .execute(),
+        lambda: supabase.table("floors")
         .select("*")
         .eq("facility_id", facility_id)
         .order("floor_number")
-        .execute()
+        .execute(),
+        lambda: spot_occupancy(facility_id),
     )
+    if not facility.data:
+        return jsonify({"message": "Facility not found"}), 404
 
-    spots = (
-        supabase.table("parking_spots")
-        .select("is_occupied, is_reserved, spot_type")
-        .eq("facility_id", facility_id)
-        .eq("is_active", True)
-        .execute()
-    )
-    total = len(spots.data)
-    occupied = sum(1 for s in spots.data if s["is_occupied"])
-    reserved = sum(1 for s in spots.data if s["is_reserved"] and not s["is_occupied"])
+    counts = occupancy.get(facility_id, NO_SPOTS)
+    total = counts["total"]
+    occupied = counts["occupied"]
+    reserved = counts["reserved"]
 
     return (
         jsonify(
@@ -123,37 +140,24 @@ def get_facility(facility_id):
     )
 
 
-@app.route("/api/facilities/<int:facility_id>", methods=["PUT"])
+@bp.route("/api/facilities/<int:facility_id>", methods=["PUT"])
 @require_admin
 def update_facility(facility_id):
     """PUT /api/facilities/:id – Update facility details."""
     data = request.get_json()
-    updates = {}
-    for field in [
-        "name",
-        "address",
-        "city",
-        "latitude",
-        "longitude",
-        "hourly_rate",
-        "operating_hours_start",
-        "operating_hours_end",
-        "is_active",
-        "image_url",
-    ]:
-        if field in data:
-            updates[field] = data[field]
+    updates = {k: data[k] for k in data.keys() & _FACILITY_UPDATE_FIELDS}
     if not updates:
         return jsonify({"message": "No fields to update"}), 400
 
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
     supabase.table("facilities").update(updates).eq("id", facility_id).execute()
+    invalidate_cache(FACILITIES_CACHE_KEY)
     return jsonify({"message": "Facility updated"}), 200
 
 
-@app.route("/api/facilities/<int:facility_id>", methods=["DELETE"])
+@bp.route("/api/facilities/<int:facility_id>", methods=["DELETE"])
 @require_admin
 def delete_facility(facility_id):
     """DELETE /api/facilities/:id – Remove a facility."""
     supabase.table("facilities").delete().eq("id", facility_id).execute()
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS, DEFAULT_FACILITY_KEY)
     return jsonify({"message": "Facility deleted"}), 200
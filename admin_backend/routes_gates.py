@@ -4,28 +4,44 @@ routes_gates.py - Gate management
 Admin endpoints for gates and manual control.
 """
 
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    cached_json,
+    device_list_key,
+    invalidate_device_lists,
+    DEVICE_LIST_TTL,
+)
+
+bp = Blueprint("gates", __name__)
 
 # ==========================================================================
 # 11. GATES
 # ==========================================================================
 
 
-@app.route("/api/gates", methods=["GET"])
+@bp.route("/api/gates", methods=["GET"])
 @require_admin
 def get_gates():
     """GET /api/gates – List all gates, optionally by facility."""
     facility_id = request.args.get("facility_id", type=int)
+    return cached_json(
+        device_list_key("gates", facility_id),
+        DEVICE_LIST_TTL,
+        lambda: {"gates": _load_gates(facility_id)},
+        shared_only=True,
+    )
+
+
+def _load_gates(facility_id):
     query = supabase.table("gates").select("*").order("id")
     if facility_id:
         query = query.eq("facility_id", facility_id)
-    result = query.execute()
-    return jsonify({"gates": result.data}), 200
+    return query.execute().data
 
 
-@app.route("/api/gates", methods=["POST"])
+@bp.route("/api/gates", methods=["POST"])
 @require_admin
 def add_gate():
     """POST /api/gates – Add a new gate."""
@@ -44,14 +60,18 @@ def add_gate():
         "camera_id": data.get("camera_id"),
     }
     result = supabase.table("gates").insert(gate).execute()
+    invalidate_device_lists("gates", [gate["facility_id"]])
     return jsonify({"message": "Gate added", "gate": result.data[0]}), 201
 
 
-@app.route("/api/gates/<int:gate_id>/open", methods=["POST"])
+@bp.route("/api/gates/<int:gate_id>/open", methods=["POST"])
 @require_admin
 def open_gate(gate_id):
     """POST /api/gates/:id/open – Manually open a gate."""
-    supabase.table("gates").update({"status": "open"}).eq("id", gate_id).execute()
+    result = (
+        supabase.table("gates").update({"status": "open"}).eq("id", gate_id).execute()
+    )
+    invalidate_device_lists("gates", [row["facility_id"] for row in result.data])
 
     supabase.table("gate_events").insert(
         {
@@ -68,11 +88,14 @@ def open_gate(gate_id):
     return jsonify({"message": "Gate opened"}), 200
 
 
-@app.route("/api/gates/<int:gate_id>/close", methods=["POST"])
+@bp.route("/api/gates/<int:gate_id>/close", methods=["POST"])
 @require_admin
 def close_gate(gate_id):
     """POST /api/gates/:id/close – Manually close a gate."""
-    supabase.table("gates").update({"status": "closed"}).eq("id", gate_id).execute()
+    result = (
+        supabase.table("gates").update({"status": "closed"}).eq("id", gate_id).execute()
+    )
+    invalidate_device_lists("gates", [row["facility_id"] for row in result.data])
 
     supabase.table("gate_events").insert(
         {
@@ -4,16 +4,18 @@ routes_notifications.py - User notifications
 Endpoints for retrieving and marking notifications.
 """
 
-from flask import request, jsonify
-from app import app, supabase
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
 from routes_common import require_auth
 
+bp = Blueprint("notifications", __name__)
+
 # ==========================================================================
 # 13. NOTIFICATIONS
 # ==========================================================================
 
 
-@app.route("/api/notifications", methods=["GET"])
+@bp.route("/api/notifications", methods=["GET"])
 @require_auth
 def get_notifications():
     """GET /api/notifications – Get current user's notifications."""
@@ -29,7 +31,7 @@ def get_notifications():
     return jsonify({"notifications": result.data}), 200
 
 
-@app.route("/api/notifications/<int:notif_id>/read", methods=["PUT"])
+@bp.route("/api/notifications/<int:notif_id>/read", methods=["PUT"])
 @require_auth
 def mark_notification_read(notif_id):
     """PUT /api/notifications/:id/read – Mark one notification as read."""
@@ -39,7 +41,7 @@ def mark_notification_read(notif_id):
     return jsonify({"message": "Marked as read"}), 200
 
 
-@app.route("/api/notifications/read-all", methods=["PUT"])
+@bp.route("/api/notifications/read-all", methods=["PUT"])
 @require_auth
 def mark_all_notifications_read():
     """PUT /api/notifications/read-all – Mark all notifications as read."""
@@ -4,18 +4,93 @@ routes_reservations.py - Reservation management
 Endpoints for booking and managing reservations.
 """
 
-from datetime import datetime, timezone
-import uuid
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_auth, require_admin, _create_notification
+import hashlib
+import hmac
+import itertools
+import secrets
+import time
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    require_admin,
+    _create_notification,
+    invalidate_cache,
+    seek_page,
+    free_spot_query,
+    json_body,
+    as_id,
+    SPOT_TYPES,
+    SPOT_STATE_CACHE_KEYS,
+    FUNCTION_NOT_FOUND,
+)
+
+bp = Blueprint("reservations", __name__)
+
+# Fields accepted by a general (no action) PUT /api/reservations/:id
+_RESERVATION_UPDATE_FIELDS = frozenset(
+    {
+        "reserved_start",
+        "reserved_end",
+        "notes",
+        "amount",
+        "payment_status",
+    }
+)
+
+# QR tokens are HMACs of a per-process counter under a key drawn once at
+# import, so minting one costs a SHA-256 instead of an entropy read.
+_QR_KEY = secrets.token_bytes(32)
+_qr_counter = itertools.count()
+
+
+def _qr_token(user_id, spot_id):
+    message = f"{next(_qr_counter)}|{user_id}|{spot_id}|{time.time_ns()}"
+    return hmac.new(_QR_KEY, message.encode(), hashlib.sha256).hexdigest()[:32]
+
 
 # ==========================================================================
 # 6. RESERVATIONS
 # ==========================================================================
 
 
-@app.route("/api/reservations", methods=["POST"])
+def _allocate_spot(facility_id, spot_type):
+    """Atomically mark a free spot reserved and return it (None if full)."""
+    try:
+        rows = (
+            supabase.rpc(
+                "allocate_spot",
+                {"p_facility_id": facility_id, "p_spot_type": spot_type},
+            )
+            .execute()
+            .data
+        )
+        return rows[0] if rows else None
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+
+    # allocate_spot() not deployed: claim with a conditional update so a
+    # concurrent booking that got there first makes us try the next spot.
+    for _ in range(3):
+        spots = free_spot_query(facility_id, "id", spot_type).execute()
+        if not spots.data:
+            return None
+        claimed = (
+            supabase.table("parking_spots")
+            .update({"is_reserved": True})
+            .eq("id", spots.data[0]["id"])
+            .eq("is_occupied", False)
+            .eq("is_reserved", False)
+            .execute()
+        )
+        if claimed.data:
+            return claimed.data[0]
+    return None
+
+
+@bp.route("/api/reservations", methods=["POST"])
 @require_auth
 def create_reservation():
     """
@@ -24,9 +99,9 @@ def create_reservation():
 
     Body: { "vehicle_id", "facility_id", "reserved_start", "reserved_end", "spot_type"?: "regular" }
     """
-    data = request.get_json()
-    vehicle_id = data.get("vehicle_id")
-    facility_id = data.get("facility_id")
+    data = json_body()
+    vehicle_id = as_id(data.get("vehicle_id"))
+    facility_id = as_id(data.get("facility_id"))
     start = data.get("reserved_start")
     end = data.get("reserved_end")
     spot_type = data.get("spot_type", "regular")
@@ -40,25 +115,8 @@ def create_reservation():
             ),
             400,
         )
-
-    # Find an available spot of the requested type
-    spots = (
-        supabase.table("parking_spots")
-        .select("*")
-        .eq("facility_id", facility_id)
-        .eq("is_occupied", False)
-        .eq("is_reserved", False)
-        .eq("is_active", True)
-        .eq("spot_type", spot_type)
-        .order("id")
-        .limit(1)
-        .execute()
-    )
-
-    if not spots.data:
-        return jsonify({"message": "No available spots of this type"}), 404
-
-    spot = spots.data[0]
+    if spot_type not in SPOT_TYPES:
+        return jsonify({"message": "Invalid spot_type"}), 400
 
     # Get reservation pricing
     pricing = (
@@ -72,10 +130,11 @@ def create_reservation():
     )
     amount = pricing.data[0]["rate"] if pricing.data else 200  # Default LKR 200
 
-    # Mark spot as reserved
-    supabase.table("parking_spots").update({"is_reserved": True}).eq(
-        "id", spot["id"]
-    ).execute()
+    # Claim an available spot of the requested type
+    spot = _allocate_spot(facility_id, spot_type)
+    if spot is None:
+        return jsonify({"message": "No available spots of this type"}), 404
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
     # Create reservation
     reservation = {
@@ -88,7 +147,7 @@ def create_reservation():
         "status": "confirmed",
         "amount": amount,
         "payment_status": "pending",
-        "qr_code": str(uuid.uuid4()),
+        "qr_code": _qr_token(request.db_user["id"], spot["id"]),
     }
     result = supabase.table("reservations").insert(reservation).execute()
 
@@ -107,13 +166,14 @@ def create_reservation():
     )
 
 
-@app.route("/api/reservations", methods=["GET"])
+@bp.route("/api/reservations", methods=["GET"])
 @require_auth
 def get_reservations():
     """
     GET /api/reservations
     - Users: their reservations
     - Admin: all reservations (with ?all=true), filterable by status and facility_id
+    Newest first; page with ?limit=200&cursor=<next_cursor>.
     """
     is_admin = request.args.get("all") == "true" and request.db_user["role"] in (
         "admin",
@@ -121,13 +181,9 @@ def get_reservations():
     )
 
     if is_admin:
-        query = (
-            supabase.table("reservations")
-            .select(
-                "*, users(id, email, full_name, phone), vehicles(plate_number, make, model), "
-                "facilities(name), parking_spots(spot_name, spot_type)"
-            )
-            .order("reserved_start", desc=True)
+        query = supabase.table("reservations").select(
+            "*, users(id, email, full_name, phone), vehicles(plate_number, make, model), "
+            "facilities(name), parking_spots(spot_name, spot_type)"
         )
     else:
         query = (
@@ -136,7 +192,6 @@ def get_reservations():
                 "*, vehicles(plate_number), facilities(name), parking_spots(spot_name)"
             )
             .eq("user_id", request.db_user["id"])
-            .order("reserved_start", desc=True)
         )
 
     status_filter = request.args.get("status")
@@ -147,11 +202,16 @@ def get_reservations():
     if facility_filter:
         query = query.eq("facility_id", int(facility_filter))
 
-    result = query.limit(200).execute()
-    return jsonify({"reservations": result.data}), 200
+    reservations, next_cursor = seek_page(
+        query,
+        "reserved_start",
+        request.args.get("limit", 200, type=int),
+        request.args.get("cursor"),
+    )
+    return jsonify({"reservations": reservations, "next_cursor": next_cursor}), 200
 
 
-@app.route("/api/reservations/<int:reservation_id>", methods=["GET"])
+@bp.route("/api/reservations/<int:reservation_id>", methods=["GET"])
 @require_auth
 def get_reservation_detail(reservation_id):
     """GET /api/reservations/:id – Get full reservation detail (admin)."""
@@ -170,7 +230,7 @@ def get_reservation_detail(reservation_id):
     return jsonify({"reservation": res.data[0]}), 200
 
 
-@app.route("/api/reservations/<int:reservation_id>", methods=["PUT"])
+@bp.route("/api/reservations/<int:reservation_id>", methods=["PUT"])
 @require_auth
 def update_reservation(reservation_id):
     """
@@ -181,12 +241,11 @@ def update_reservation(reservation_id):
     """
     data = request.get_json()
     action = data.get("action")
-    now_iso = datetime.now(timezone.utc).isoformat()
 
     # Fetch reservation
     res = (
         supabase.table("reservations")
-        .select("*")
+        .select("status, spot_id, user_id")
         .eq("id", reservation_id)
         .limit(1)
         .execute()
@@ -202,10 +261,11 @@ def update_reservation(reservation_id):
             supabase.table("parking_spots").update({"is_reserved": False}).eq(
                 "id", reservation["spot_id"]
             ).execute()
+            invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
-        supabase.table("reservations").update(
-            {"status": "cancelled", "updated_at": now_iso}
-        ).eq("id", reservation_id).execute()
+        supabase.table("reservations").update({"status": "cancelled"}).eq(
+            "id", reservation_id
+        ).execute()
 
         _create_notification(
             reservation["user_id"],
@@ -219,10 +279,15 @@ def update_reservation(reservation_id):
     # ---------- ACTION: confirm ----------
     if action == "confirm":
         if reservation["status"] not in ("pending",):
-            return jsonify({"message": f"Cannot confirm a {reservation['status']} reservation"}), 400
-        supabase.table("reservations").update(
-            {"status": "confirmed", "updated_at": now_iso}
-        ).eq("id", reservation_id).execute()
+            return (
+                jsonify(
+                    {"message": f"Cannot confirm a {reservation['status']} reservation"}
+                ),
+                400,
+            )
+        supabase.table("reservations").update({"status": "confirmed"}).eq(
+            "id", reservation_id
+        ).execute()
 
         _create_notification(
             reservation["user_id"],
@@ -236,25 +301,40 @@ def update_reservation(reservation_id):
     # ---------- ACTION: check_in ----------
     if action == "check_in":
         if reservation["status"] not in ("confirmed", "pending"):
-            return jsonify({"message": f"Cannot check in a {reservation['status']} reservation"}), 400
-        supabase.table("reservations").update(
-            {"status": "checked_in", "updated_at": now_iso}
-        ).eq("id", reservation_id).execute()
+            return (
+                jsonify(
+                    {
+                        "message": f"Cannot check in a {reservation['status']} reservation"
+                    }
+                ),
+                400,
+            )
+        supabase.table("reservations").update({"status": "checked_in"}).eq(
+            "id", reservation_id
+        ).execute()
         return jsonify({"message": "Reservation checked in"}), 200
 
     # ---------- ACTION: complete ----------
     if action == "complete":
         if reservation["status"] not in ("checked_in", "confirmed"):
-            return jsonify({"message": f"Cannot complete a {reservation['status']} reservation"}), 400
+            return (
+                jsonify(
+                    {
+                        "message": f"Cannot complete a {reservation['status']} reservation"
+                    }
+                ),
+                400,
+            )
 
         # Free the spot
         if reservation["spot_id"]:
             supabase.table("parking_spots").update(
                 {"is_reserved": False, "is_occupied": False}
             ).eq("id", reservation["spot_id"]).execute()
+            invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
         supabase.table("reservations").update(
-            {"status": "completed", "payment_status": "paid", "updated_at": now_iso}
+            {"status": "completed", "payment_status": "paid"}
         ).eq("id", reservation_id).execute()
 
         _create_notification(
@@ -269,17 +349,25 @@ def update_reservation(reservation_id):
     # ---------- ACTION: no_show ----------
     if action == "no_show":
         if reservation["status"] not in ("confirmed", "pending"):
-            return jsonify({"message": f"Cannot mark a {reservation['status']} reservation as no-show"}), 400
+            return (
+                jsonify(
+                    {
+                        "message": f"Cannot mark a {reservation['status']} reservation as no-show"
+                    }
+                ),
+                400,
+            )
 
         # Free the spot
         if reservation["spot_id"]:
             supabase.table("parking_spots").update({"is_reserved": False}).eq(
                 "id", reservation["spot_id"]
             ).execute()
+            invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
-        supabase.table("reservations").update(
-            {"status": "no_show", "updated_at": now_iso}
-        ).eq("id", reservation_id).execute()
+        supabase.table("reservations").update({"status": "no_show"}).eq(
+            "id", reservation_id
+        ).execute()
 
         _create_notification(
             reservation["user_id"],
@@ -291,12 +379,8 @@ def update_reservation(reservation_id):
         return jsonify({"message": "Reservation marked as no-show"}), 200
 
     # ---------- General update (no action) ----------
-    updates = {}
-    for field in ["reserved_start", "reserved_end", "notes", "amount", "payment_status"]:
-        if field in data:
-            updates[field] = data[field]
+    updates = {k: data[k] for k in data.keys() & _RESERVATION_UPDATE_FIELDS}
     if updates:
-        updates["updated_at"] = now_iso
         supabase.table("reservations").update(updates).eq(
             "id", reservation_id
         ).execute()
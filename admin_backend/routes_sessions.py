@@ -6,17 +6,38 @@ Entry, exit, and session history endpoints.
 
 from datetime import datetime, timezone
 from math import ceil
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_auth, DEFAULT_HOURLY_RATE, _create_notification
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    invalidate_cached_user,
+    adjust_wallet,
+    invalidate_cache,
+    first_embedded,
+    free_spot_query,
+    json_body,
+    normalize_plate,
+    as_id,
+    run_parallel,
+    run_in_background,
+    seek_page,
+    DEFAULT_HOURLY_RATE,
+    ENTRY_METHODS,
+    SPOT_STATE_CACHE_KEYS,
+    FUNCTION_NOT_FOUND,
+    _create_notification,
+)
+
+bp = Blueprint("sessions", __name__)
 
 # ==========================================================================
 # 7. PARKING SESSIONS (Entry / Exit)
 # ==========================================================================
 
 
-@app.route("/api/sessions/entry", methods=["POST"])
-def vehicle_entry():
+@bp.route("/api/sessions/entry", methods=["POST"])
+def vehicle_entry(payload=None):
     """
     POST /api/sessions/entry
     Register a vehicle entering a facility.
@@ -38,27 +59,96 @@ def vehicle_entry():
         Response instructs kiosk / display to show QR code for registration.
         Once registered, vehicle follows Scenario 2 on next attempt.
 
-    This endpoint is PUBLIC so the LPR service can call it.
+    This endpoint is PUBLIC so the LPR service can call it. Internal callers
+    (the v1 alias) pass the body as `payload` instead.
     """
-    data = request.get_json()
+    data = json_body() if payload is None else payload
     plate = data.get("plate_number")
-    facility_id = data.get("facility_id")
+    facility_id = as_id(data.get("facility_id"))
     entry_method = data.get("entry_method", "lpr")
 
-    if not plate:
+    # Reject bad input here rather than spend a round-trip on a failing RPC
+    if not plate or not isinstance(plate, str):
         return jsonify({"message": "plate_number is required"}), 400
-    if not facility_id:
+    plate = normalize_plate(plate)
+    if facility_id is None:
         return jsonify({"message": "facility_id is required"}), 400
+    if entry_method not in ENTRY_METHODS:
+        return jsonify({"message": "Invalid entry_method"}), 400
+
+    # The whole entry runs as one transaction in process_vehicle_entry()
+    # (see supabase_schema.sql). Until that function is deployed, fall back
+    # to the step-by-step version below.
+    try:
+        result = (
+            supabase.rpc(
+                "process_vehicle_entry",
+                {
+                    "p_plate": plate,
+                    "p_facility_id": facility_id,
+                    "p_entry_method": entry_method,
+                },
+            )
+            .execute()
+            .data
+        )
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        return _vehicle_entry_steps(plate, facility_id, entry_method)
 
-    # Check for duplicate active session
-    active = (
-        supabase.table("parking_sessions")
-        .select("*")
+    status = result.pop("status")
+    if status == 200:
+        invalidate_cache(*SPOT_STATE_CACHE_KEYS)
+    return jsonify(result), status
+
+
+def _claim_free_spot(facility_id, candidates):
+    """Mark the first free spot occupied and return it (None if full).
+
+    The update only matches while the spot is still free, so when a
+    concurrent entry claims it first we move on to the next free spot
+    instead of parking two cars in one bay.
+    """
+    for attempt in range(3):
+        if attempt:
+            candidates = free_spot_query(facility_id).execute().data
+        if not candidates:
+            return None
+        claimed = (
+            supabase.table("parking_spots")
+            .update({"is_occupied": True, "is_reserved": False})
+            .eq("id", candidates[0]["id"])
+            .eq("is_occupied", False)
+            .eq("is_reserved", False)
+            .execute()
+        )
+        if claimed.data:
+            return claimed.data[0]
+    return None
+
+
+def _vehicle_entry_steps(plate, facility_id, entry_method):
+    """Client-side vehicle entry: same outcome as process_vehicle_entry()."""
+    # These lookups don't depend on each other: run them concurrently.
+    # The free spot is pre-fetched for walk-ins; reserved entries ignore it.
+    active, vehicle, free_spot = run_parallel(
+        lambda: supabase.table("parking_sessions")
+        .select("spot_name")
         .eq("plate_number", plate)
         .is_("exit_time", "null")
         .limit(1)
-        .execute()
+        .execute(),
+        lambda: supabase.table("vehicles")
+        .select("*, users(id, full_name)")
+        .eq("plate_number", plate)
+        .eq("is_active", True)
+        .limit(1)
+        .execute(),
+        lambda: free_spot_query(facility_id).execute(),
     )
+
+    # Check for duplicate active session
     if active.data:
         return (
             jsonify(
@@ -71,14 +161,6 @@ def vehicle_entry():
         )
 
     # Look up vehicle registration
-    vehicle = (
-        supabase.table("vehicles")
-        .select("*, users(id, full_name)")
-        .eq("plate_number", plate)
-        .eq("is_active", True)
-        .limit(1)
-        .execute()
-    )
     vehicle_data = vehicle.data[0] if vehicle.data else None
     vehicle_id = vehicle_data["id"] if vehicle_data else None
     user_id = vehicle_data["user_id"] if vehicle_data else None
@@ -87,17 +169,18 @@ def vehicle_entry():
     # ── Scenario 3: Unregistered vehicle → deny entry ──────────────
     if not is_registered:
         # Log the detection so the admin can see it
-        try:
-            supabase.table("detection_logs").insert(
+        run_in_background(
+            lambda: supabase.table("detection_logs")
+            .insert(
                 {
                     "facility_id": facility_id,
                     "plate_number": plate,
                     "is_registered": False,
                     "action_taken": "denied",
                 }
-            ).execute()
-        except Exception:
-            pass
+            )
+            .execute()
+        )
 
         return (
             jsonify(
@@ -117,91 +200,75 @@ def vehicle_entry():
     session_type = "walk_in"
     reservation_id = None
     spot = None
-    billing_start = datetime.now(timezone.utc)  # default: now
+    billing_start = None  # default: entry_time DEFAULT NOW() in the database
+
+    # Reservation (with its spot embedded) and subscription lookups
+    res, sub = run_parallel(
+        lambda: supabase.table("reservations")
+        .select("*, parking_spots(*)")
+        .eq("vehicle_id", vehicle_id)
+        .eq("facility_id", facility_id)
+        .eq("status", "confirmed")
+        .limit(1)
+        .execute(),
+        lambda: supabase.table("subscriptions")
+        .select("id")
+        .eq("vehicle_id", vehicle_id)
+        .eq("facility_id", facility_id)
+        .eq("status", "active")
+        .limit(1)
+        .execute(),
+    )
 
     # ── Scenario 1: Check for active reservation ───────────────────
-    if vehicle_id:
-        res = (
-            supabase.table("reservations")
-            .select("*, parking_spots(id, spot_name)")
-            .eq("vehicle_id", vehicle_id)
-            .eq("facility_id", facility_id)
-            .eq("status", "confirmed")
-            .limit(1)
-            .execute()
-        )
-        if res.data:
-            reservation = res.data[0]
-            reservation_id = reservation["id"]
-            session_type = "reserved"
-
-            # Billing starts from the scheduled reservation time
-            reserved_start_str = reservation.get("reserved_start")
-            if reserved_start_str:
-                try:
-                    billing_start = datetime.fromisoformat(
-                        reserved_start_str.replace("Z", "+00:00")
-                    )
-                except (ValueError, TypeError):
-                    pass  # fallback to now
-
-            # Use the reserved spot
-            if reservation.get("spot_id"):
-                spot_result = (
-                    supabase.table("parking_spots")
-                    .select("*")
-                    .eq("id", reservation["spot_id"])
-                    .limit(1)
-                    .execute()
+    if res.data:
+        reservation = res.data[0]
+        reservation_id = reservation["id"]
+        session_type = "reserved"
+
+        # Billing starts from the scheduled reservation time
+        reserved_start_str = reservation.get("reserved_start")
+        if reserved_start_str:
+            try:
+                billing_start = datetime.fromisoformat(
+                    reserved_start_str.replace("Z", "+00:00")
                 )
-                spot = spot_result.data[0] if spot_result.data else None
+            except (ValueError, TypeError):
+                pass  # fallback to the database clock
 
-            # Update reservation status
-            supabase.table("reservations").update(
-                {
-                    "status": "checked_in",
-                    "updated_at": datetime.now(timezone.utc).isoformat(),
-                }
-            ).eq("id", reservation_id).execute()
+        # Use the reserved spot
+        if reservation.get("spot_id"):
+            spot = reservation.get("parking_spots")
 
     # Check for active subscription
-    if vehicle_id and session_type == "walk_in":
-        sub = (
-            supabase.table("subscriptions")
-            .select("*")
-            .eq("vehicle_id", vehicle_id)
-            .eq("facility_id", facility_id)
-            .eq("status", "active")
-            .limit(1)
+    elif sub.data:
+        session_type = "subscription"
+
+    writes = []
+    if spot:
+        # Mark the reserved spot occupied and clear its reserved flag
+        writes.append(
+            lambda: supabase.table("parking_spots")
+            .update({"is_occupied": True, "is_reserved": False})
+            .eq("id", spot["id"])
             .execute()
         )
-        if sub.data:
-            session_type = "subscription"
-
-    # ── Scenario 2: auto-assign a free spot (walk-in / subscription) ─
-    if not spot:
-        spot_result = (
-            supabase.table("parking_spots")
-            .select("*")
-            .eq("facility_id", facility_id)
-            .eq("is_occupied", False)
-            .eq("is_reserved", False)
-            .eq("is_active", True)
-            .order("id")
-            .limit(1)
+    else:
+        # ── Scenario 2: auto-assign a free spot (walk-in / subscription) ─
+        spot = _claim_free_spot(facility_id, free_spot.data)
+        if spot is None:
+            return jsonify({"message": "Parking is full!", "gate_action": "deny"}), 404
+    # Check the reservation in
+    if reservation_id:
+        writes.append(
+            lambda: supabase.table("reservations")
+            .update({"status": "checked_in"})
+            .eq("id", reservation_id)
             .execute()
         )
-        if not spot_result.data:
-            return jsonify({"message": "Parking is full!", "gate_action": "deny"}), 404
-        spot = spot_result.data[0]
-
-    # Mark spot as occupied, clear reserved flag
-    supabase.table("parking_spots").update(
-        {
-            "is_occupied": True,
-            "is_reserved": False,
-        }
-    ).eq("id", spot["id"]).execute()
+    if writes:
+        run_parallel(*writes)
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
     # Create parking session (entry_time = billing start)
     session = {
@@ -211,10 +278,11 @@ def vehicle_entry():
         "reservation_id": reservation_id,
         "plate_number": plate,
         "spot_name": spot["spot_name"],
-        "entry_time": billing_start.isoformat(),
         "session_type": session_type,
         "entry_method": entry_method,
     }
+    if billing_start is not None:
+        session["entry_time"] = billing_start.isoformat()
     session_result = supabase.table("parking_sessions").insert(session).execute()
 
     # Notify registered user (push notification with assigned spot)
@@ -262,7 +330,47 @@ def vehicle_entry():
     )
 
 
-@app.route("/api/sessions/exit", methods=["POST"])
+def _charge_wallet(user_id, amount, session_id, description):
+    """Debit `amount` from the user's wallet and record the payment.
+
+    Returns False (nothing charged) if the balance no longer covers it.
+    """
+    try:
+        new_balance = (
+            supabase.rpc(
+                "charge_wallet",
+                {
+                    "p_user_id": user_id,
+                    "p_amount": amount,
+                    "p_session_id": session_id,
+                    "p_description": description,
+                },
+            )
+            .execute()
+            .data
+        )
+        return new_balance is not None
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+
+    # charge_wallet() not deployed: debit, then record the payment
+    if adjust_wallet(user_id, -amount, amount) is None:
+        return False
+    supabase.table("payments").insert(
+        {
+            "user_id": user_id,
+            "session_id": session_id,
+            "amount": amount,
+            "payment_method": "wallet",
+            "payment_status": "completed",
+            "description": description,
+        }
+    ).execute()
+    return True
+
+
+@bp.route("/api/sessions/exit", methods=["POST"])
 def vehicle_exit():
     """
     POST /api/sessions/exit
@@ -277,17 +385,49 @@ def vehicle_exit():
       4. Process payment (wallet auto-deduct, or mark as pending)
       5. Close session, notify user
     """
-    data = request.get_json() or {}
+    data = json_body()
     plate = data.get("plate_number")
     payment_method = data.get("payment_method", "wallet")
 
-    if not plate:
+    if not plate or not isinstance(plate, str):
         return jsonify({"message": "plate_number is required"}), 400
-
-    # Find active session
+    plate = normalize_plate(plate)
+
+    # The whole exit runs as one transaction in process_vehicle_exit(); until
+    # that function is deployed, fall back to the step-by-step version below.
+    try:
+        result = (
+            supabase.rpc(
+                "process_vehicle_exit",
+                {"p_plate": plate, "p_payment_method": payment_method},
+            )
+            .execute()
+            .data
+        )
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        return _vehicle_exit_steps(plate, payment_method)
+
+    status = result.pop("status")
+    user_id = result.pop("user_id", None)
+    if status == 200:
+        invalidate_cache(*SPOT_STATE_CACHE_KEYS)
+        if result["payment_status"] == "paid":
+            invalidate_cached_user(user_id)
+    return jsonify(result), status
+
+
+def _vehicle_exit_steps(plate, payment_method):
+    """Client-side vehicle exit: same outcome as process_vehicle_exit()."""
+    # Find active session, with the facility rate and the owner's wallet
+    # embedded so the exit needs no further lookups
     session_result = (
         supabase.table("parking_sessions")
-        .select("*")
+        .select(
+            "*, facilities(hourly_rate), "
+            "vehicles(user_id, users(user_wallets(id, balance)))"
+        )
         .eq("plate_number", plate)
         .is_("exit_time", "null")
         .order("entry_time", desc=True)
@@ -298,15 +438,8 @@ def vehicle_exit():
         return jsonify({"message": f"No active session for {plate}"}), 404
 
     session = session_result.data[0]
-
-    # Free the spot
-    if session.get("spot_id"):
-        supabase.table("parking_spots").update(
-            {
-                "is_occupied": False,
-                "is_reserved": False,
-            }
-        ).eq("id", session["spot_id"]).execute()
+    facility = session.pop("facilities", None)
+    vehicle = session.pop("vehicles", None)
 
     # Calculate duration and fee
     entry_time = datetime.fromisoformat(session["entry_time"].replace("Z", "+00:00"))
@@ -314,14 +447,7 @@ def vehicle_exit():
     duration_minutes = int((exit_time - entry_time).total_seconds() // 60)
 
     # Get facility rate
-    facility = (
-        supabase.table("facilities")
-        .select("hourly_rate")
-        .eq("id", session["facility_id"])
-        .limit(1)
-        .execute()
-    )
-    rate = facility.data[0]["hourly_rate"] if facility.data else DEFAULT_HOURLY_RATE
+    rate = facility["hourly_rate"] if facility else DEFAULT_HOURLY_RATE
 
     # Calculate amount
     if session["session_type"] == "subscription":
@@ -332,87 +458,63 @@ def vehicle_exit():
         amount = billed_hours * rate
         payment_status = "pending"
 
-    # Update session
-    supabase.table("parking_sessions").update(
-        {
-            "exit_time": exit_time.isoformat(),
-            "duration_minutes": duration_minutes,
-            "amount": amount,
-            "payment_status": payment_status if amount == 0 else "pending",
-        }
-    ).eq("id", session["id"]).execute()
+    # Auto-pay from wallet if registered user (the embedded balance only
+    # decides whether to try; the charge itself re-checks atomically)
+    user_id = vehicle["user_id"] if vehicle else None
+    if amount > 0 and user_id and payment_method == "wallet":
+        wallet = first_embedded((vehicle.get("users") or {}).get("user_wallets"))
+        if wallet and wallet["balance"] >= amount:
+            description = f"Parking fee for {plate} at {session['spot_name']}"
+            if _charge_wallet(user_id, amount, session["id"], description):
+                payment_status = "paid"
+                invalidate_cached_user(user_id)
 
-    # Complete reservation if applicable
-    if session.get("reservation_id"):
-        supabase.table("reservations").update(
+    # All writes are independent of each other
+    writes = [
+        lambda: supabase.table("parking_sessions")
+        .update(
             {
-                "status": "completed",
-                "updated_at": exit_time.isoformat(),
+                "exit_time": exit_time.isoformat(),
+                "duration_minutes": duration_minutes,
+                "amount": amount,
+                "payment_status": payment_status,
             }
-        ).eq("id", session["reservation_id"]).execute()
-
-    # Auto-pay from wallet if registered user
-    if amount > 0 and session.get("vehicle_id"):
-        vehicle = (
-            supabase.table("vehicles")
-            .select("user_id")
-            .eq("id", session["vehicle_id"])
-            .limit(1)
+        )
+        .eq("id", session["id"])
+        .execute()
+    ]
+    # Free the spot
+    if session.get("spot_id"):
+        writes.append(
+            lambda: supabase.table("parking_spots")
+            .update({"is_occupied": False, "is_reserved": False})
+            .eq("id", session["spot_id"])
             .execute()
         )
-        if vehicle.data:
-            user_id = vehicle.data[0]["user_id"]
-            wallet = (
-                supabase.table("user_wallets")
-                .select("*")
-                .eq("user_id", user_id)
-                .limit(1)
-                .execute()
-            )
-            if (
-                wallet.data
-                and wallet.data[0]["balance"] >= amount
-                and payment_method == "wallet"
-            ):
-                new_balance = wallet.data[0]["balance"] - amount
-                supabase.table("user_wallets").update(
-                    {
-                        "balance": new_balance,
-                        "updated_at": exit_time.isoformat(),
-                    }
-                ).eq("id", wallet.data[0]["id"]).execute()
-
-                supabase.table("payments").insert(
-                    {
-                        "user_id": user_id,
-                        "session_id": session["id"],
-                        "amount": amount,
-                        "payment_method": "wallet",
-                        "payment_status": "completed",
-                        "description": f"Parking fee for {plate} at {session['spot_name']}",
-                    }
-                ).execute()
-
-                supabase.table("parking_sessions").update(
-                    {
-                        "payment_status": "paid",
-                    }
-                ).eq("id", session["id"]).execute()
-
-                payment_status = "paid"
+    # Complete reservation if applicable
+    if session.get("reservation_id"):
+        writes.append(
+            lambda: supabase.table("reservations")
+            .update({"status": "completed"})
+            .eq("id", session["reservation_id"])
+            .execute()
+        )
+    run_parallel(*writes)
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
-            # Notify user
-            _create_notification(
-                user_id,
-                "Vehicle Exited",
-                f"Your vehicle {plate} has left. Duration: {duration_minutes} min. Fee: LKR {amount}.",
-                "exit",
-                {
-                    "session_id": session["id"],
-                    "amount": amount,
-                    "duration_minutes": duration_minutes,
-                },
-            )
+    # Notify user
+    if amount > 0 and user_id:
+        _create_notification(
+            user_id,
+            "Vehicle Exited",
+            f"Your vehicle {plate} has left. Duration: {duration_minutes} min. Fee: LKR {amount}.",
+            "exit",
+            {
+                "session_id": session["id"],
+                "amount": amount,
+                "duration_minutes": duration_minutes,
+            },
+        )
 
     return (
         jsonify(
@@ -428,16 +530,17 @@ def vehicle_exit():
     )
 
 
-@app.route("/api/sessions", methods=["GET"])
+@bp.route("/api/sessions", methods=["GET"])
 @require_auth
 def get_sessions():
     """
     GET /api/sessions
-    Get parking session history.
+    Get parking session history, newest first.
 
-    Query params: ?facility_id=1&active=true&limit=50
+    Query params: ?facility_id=1&active=true&limit=50&cursor=<next_cursor>
     - Users: their sessions only
     - Admin: all sessions (with ?all=true)
+    Pass the returned next_cursor as ?cursor= for the next page.
     """
     limit = request.args.get("limit", 50, type=int)
     facility_id = request.args.get("facility_id", type=int)
@@ -449,28 +552,21 @@ def get_sessions():
     ):
         query = supabase.table("parking_sessions").select("*")
     elif request.db_user.get("id"):
-        # Get user's vehicle IDs
-        vehicles = (
-            supabase.table("vehicles")
-            .select("id")
-            .eq("user_id", request.db_user["id"])
-            .execute()
-        )
-        vehicle_ids = [v["id"] for v in vehicles.data]
-        if not vehicle_ids:
-            return jsonify({"sessions": []}), 200
+        # Filter through the vehicle join instead of fetching vehicle ids first
         query = (
             supabase.table("parking_sessions")
-            .select("*")
-            .in_("vehicle_id", vehicle_ids)
+            .select("*, vehicles!inner(user_id)")
+            .eq("vehicles.user_id", request.db_user["id"])
         )
     else:
-        return jsonify({"sessions": []}), 200
+        return jsonify({"sessions": [], "next_cursor": None}), 200
 
     if facility_id:
         query = query.eq("facility_id", facility_id)
     if active_only:
         query = query.is_("exit_time", "null")
 
-    result = query.order("entry_time", desc=True).limit(limit).execute()
-    return jsonify({"sessions": result.data}), 200
+    sessions, next_cursor = seek_page(
+        query, "entry_time", limit, request.args.get("cursor")
+    )
+    return jsonify({"sessions": sessions, "next_cursor": next_cursor}), 200
@@ -6,17 +6,40 @@ Admins can create, read, update, and delete individual spots,
 initialise spots in bulk, and adjust the total slot count.
 """
 
-from datetime import datetime, timezone
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from postgrest.types import ReturnMethod
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    invalidate_cache,
+    conditional_json,
+    json_body,
+    SPOT_TYPES,
+    SPOT_STATE_CACHE_KEYS,
+    FUNCTION_NOT_FOUND,
+)
+
+bp = Blueprint("spots", __name__)
+
+# Fields accepted by PUT /api/spots/:id
+_SPOT_UPDATE_FIELDS = frozenset(
+    {
+        "spot_name",
+        "spot_type",
+        "is_active",
+        "is_occupied",
+        "is_reserved",
+        "floor_id",
+    }
+)
 
 # ==========================================================================
 # 5. PARKING SPOTS – Full CRUD
 # ==========================================================================
 
 
-@app.route("/api/facilities/<int:facility_id>/spots", methods=["GET"])
+@bp.route("/api/facilities/<int:facility_id>/spots", methods=["GET"])
 def get_spots(facility_id):
     """GET /api/facilities/:id/spots – Get all spots for a facility."""
     include_inactive = request.args.get("include_inactive") == "true"
@@ -31,10 +54,10 @@ def get_spots(facility_id):
         query = query.eq("is_active", True)
 
     result = query.execute()
-    return jsonify({"spots": result.data}), 200
+    return conditional_json({"spots": result.data}, public=True)
 
 
-@app.route("/api/facilities/<int:facility_id>/spots", methods=["POST"])
+@bp.route("/api/facilities/<int:facility_id>/spots", methods=["POST"])
 @require_admin
 def create_spot(facility_id):
     """
@@ -83,7 +106,7 @@ def create_spot(facility_id):
     )
 
 
-@app.route("/api/facilities/<int:facility_id>/spots/init", methods=["POST"])
+@bp.route("/api/facilities/<int:facility_id>/spots/init", methods=["POST"])
 @require_admin
 def init_spots(facility_id):
     """
@@ -92,12 +115,19 @@ def init_spots(facility_id):
 
     Body: { "count": 32, "prefix": "A", "floor_id"?: 1, "spot_type"?: "regular" }
     """
-    data = request.get_json() or {}
+    data = json_body()
     count = data.get("count", 32)
     prefix = data.get("prefix", "A")
     floor_id = data.get("floor_id")
     spot_type = data.get("spot_type", "regular")
 
+    if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+        return jsonify({"message": "count must be a positive integer"}), 400
+    if not prefix or not isinstance(prefix, str):
+        return jsonify({"message": "prefix must be a non-empty string"}), 400
+    if spot_type not in SPOT_TYPES:
+        return jsonify({"message": "Invalid spot_type"}), 400
+
     # Check if spots already exist
     existing = (
         supabase.table("parking_spots")
@@ -109,45 +139,59 @@ def init_spots(facility_id):
     if existing.data:
         return jsonify({"message": "Spots already initialized for this facility"}), 400
 
-    spots = []
-    for i in range(1, count + 1):
-        spots.append(
+    # init_facility_spots() builds the rows server-side, so only the five
+    # parameters cross the wire; without it, send the rows ourselves and
+    # skip echoing them back.
+    try:
+        supabase.rpc(
+            "init_facility_spots",
             {
-                "facility_id": facility_id,
-                "floor_id": floor_id,
-                "spot_name": f"{prefix}-{str(i).zfill(2)}",
-                "spot_type": spot_type,
-                "is_occupied": False,
-                "is_reserved": False,
-            }
-        )
+                "p_facility_id": facility_id,
+                "p_prefix": prefix,
+                "p_count": count,
+                "p_floor_id": floor_id,
+                "p_spot_type": spot_type,
+            },
+        ).execute()
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        base = {
+            "facility_id": facility_id,
+            "floor_id": floor_id,
+            "spot_type": spot_type,
+            "is_occupied": False,
+            "is_reserved": False,
+        }
+        spots = [
+            {**base, "spot_name": f"{prefix}-{i:02d}"} for i in range(1, count + 1)
+        ]
 
-    supabase.table("parking_spots").insert(spots).execute()
+        supabase.table("parking_spots").insert(
+            spots, returning=ReturnMethod.minimal
+        ).execute()
 
-    # Update facility total
-    supabase.table("facilities").update({"total_spots": count}).eq(
-        "id", facility_id
-    ).execute()
+        # Update facility total
+        supabase.table("facilities").update({"total_spots": count}).eq(
+            "id", facility_id
+        ).execute()
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
     return jsonify({"message": f"{count} spots created"}), 201
 
 
-@app.route("/api/spots/<int:spot_id>", methods=["GET"])
+@bp.route("/api/spots/<int:spot_id>", methods=["GET"])
 def get_spot(spot_id):
     """GET /api/spots/:id – Get a single spot by ID."""
     result = (
-        supabase.table("parking_spots")
-        .select("*")
-        .eq("id", spot_id)
-        .limit(1)
-        .execute()
+        supabase.table("parking_spots").select("*").eq("id", spot_id).limit(1).execute()
     )
     if not result.data:
         return jsonify({"message": "Spot not found"}), 404
     return jsonify({"spot": result.data[0]}), 200
 
 
-@app.route("/api/spots/<int:spot_id>", methods=["PUT"])
+@bp.route("/api/spots/<int:spot_id>", methods=["PUT"])
 @require_admin
 def update_spot(spot_id):
     """
@@ -157,24 +201,13 @@ def update_spot(spot_id):
     is_reserved, floor_id.
     """
     data = request.get_json()
-    updates = {}
-    allowed = [
-        "spot_name",
-        "spot_type",
-        "is_active",
-        "is_occupied",
-        "is_reserved",
-        "floor_id",
-    ]
-    for field in allowed:
-        if field in data:
-            updates[field] = data[field]
+    updates = {k: data[k] for k in data.keys() & _SPOT_UPDATE_FIELDS}
 
     if not updates:
         return jsonify({"message": "No valid fields to update"}), 400
 
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
     supabase.table("parking_spots").update(updates).eq("id", spot_id).execute()
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
 
     # If active status changed, re-sync facility total
     if "is_active" in updates:
@@ -191,7 +224,7 @@ def update_spot(spot_id):
     return jsonify({"message": "Spot updated"}), 200
 
 
-@app.route("/api/spots/<int:spot_id>", methods=["DELETE"])
+@bp.route("/api/spots/<int:spot_id>", methods=["DELETE"])
 @require_admin
 def delete_spot(spot_id):
     """
@@ -202,11 +235,7 @@ def delete_spot(spot_id):
     """
     # Fetch the spot
     spot_result = (
-        supabase.table("parking_spots")
-        .select("*")
-        .eq("id", spot_id)
-        .limit(1)
-        .execute()
+        supabase.table("parking_spots").select("*").eq("id", spot_id).limit(1).execute()
     )
     if not spot_result.data:
         return jsonify({"message": "Spot not found"}), 404
@@ -216,9 +245,7 @@ def delete_spot(spot_id):
     # Block deletion of occupied spots
     if spot.get("is_occupied"):
         return (
-            jsonify(
-                {"message": "Cannot delete an occupied spot. Free it first."}
-            ),
+            jsonify({"message": "Cannot delete an occupied spot. Free it first."}),
             409,
         )
 
@@ -250,9 +277,7 @@ def delete_spot(spot_id):
     return jsonify({"message": "Spot deleted"}), 200
 
 
-@app.route(
-    "/api/facilities/<int:facility_id>/spots/adjust-count", methods=["PUT"]
-)
+@bp.route("/api/facilities/<int:facility_id>/spots/adjust-count", methods=["PUT"])
 @require_admin
 def adjust_spot_count(facility_id):
     """
@@ -276,7 +301,7 @@ def adjust_spot_count(facility_id):
     # Current active spots
     current = (
         supabase.table("parking_spots")
-        .select("*")
+        .select("id, spot_name, is_occupied, is_reserved")
         .eq("facility_id", facility_id)
         .eq("is_active", True)
         .order("id")
@@ -294,19 +319,20 @@ def adjust_spot_count(facility_id):
             if len(parts) == 2 and parts[1].isdigit():
                 max_num = max(max_num, int(parts[1]))
 
-        new_spots = []
-        for i in range(1, to_add + 1):
-            new_spots.append(
-                {
-                    "facility_id": facility_id,
-                    "spot_name": f"{prefix}-{str(max_num + i).zfill(2)}",
-                    "spot_type": spot_type,
-                    "is_occupied": False,
-                    "is_reserved": False,
-                    "is_active": True,
-                }
-            )
-        supabase.table("parking_spots").insert(new_spots).execute()
+        base = {
+            "facility_id": facility_id,
+            "spot_type": spot_type,
+            "is_occupied": False,
+            "is_reserved": False,
+            "is_active": True,
+        }
+        new_spots = [
+            {**base, "spot_name": f"{prefix}-{max_num + i:02d}"}
+            for i in range(1, to_add + 1)
+        ]
+        supabase.table("parking_spots").insert(
+            new_spots, returning=ReturnMethod.minimal
+        ).execute()
 
     elif new_total < current_count:
         # Deactivate unused spots from the end
@@ -320,9 +346,9 @@ def adjust_spot_count(facility_id):
         for s in removable:
             if deactivated >= to_remove:
                 break
-            supabase.table("parking_spots").update(
-                {"is_active": False}
-            ).eq("id", s["id"]).execute()
+            supabase.table("parking_spots").update({"is_active": False}).eq(
+                "id", s["id"]
+            ).execute()
             deactivated += 1
 
         if deactivated < to_remove:
@@ -351,14 +377,12 @@ def _sync_facility_total(facility_id):
     """Re-count active spots and update the facility's total_spots column."""
     active = (
         supabase.table("parking_spots")
-        .select("id")
+        .select("id", count="exact", head=True)
         .eq("facility_id", facility_id)
         .eq("is_active", True)
         .execute()
     )
-    supabase.table("facilities").update(
-        {
-            "total_spots": len(active.data),
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-        }
-    ).eq("id", facility_id).execute()
+    supabase.table("facilities").update({"total_spots": active.count or 0}).eq(
+        "id", facility_id
+    ).execute()
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
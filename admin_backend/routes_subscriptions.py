@@ -5,16 +5,24 @@ Endpoints for monthly pass subscriptions.
 """
 
 from datetime import datetime, timezone, timedelta
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_auth, _create_notification
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    invalidate_cached_user,
+    adjust_wallet,
+    invalidate_vehicle_lookup,
+    _create_notification,
+)
+
+bp = Blueprint("subscriptions", __name__)
 
 # ==========================================================================
 # 9. SUBSCRIPTIONS
 # ==========================================================================
 
 
-@app.route("/api/subscriptions", methods=["POST"])
+@bp.route("/api/subscriptions", methods=["POST"])
 @require_auth
 def create_subscription():
     """
@@ -36,7 +44,11 @@ def create_subscription():
 
     # Get plan details
     plan = (
-        supabase.table("pricing_plans").select("*").eq("id", plan_id).limit(1).execute()
+        supabase.table("pricing_plans")
+        .select("plan_type, rate, name")
+        .eq("id", plan_id)
+        .limit(1)
+        .execute()
     )
     if not plan.data or plan.data[0]["plan_type"] != "monthly":
         return jsonify({"message": "Invalid monthly plan"}), 400
@@ -45,28 +57,13 @@ def create_subscription():
     start_date = datetime.now(timezone.utc).date()
     end_date = start_date + timedelta(days=30)
 
-    # Check wallet balance
-    wallet = (
-        supabase.table("user_wallets")
-        .select("*")
-        .eq("user_id", request.db_user["id"])
-        .limit(1)
-        .execute()
-    )
-    if not wallet.data or wallet.data[0]["balance"] < amount:
+    # Deduct from wallet (fails if the balance doesn't cover it)
+    if adjust_wallet(request.db_user["id"], -amount, amount) is None:
         return (
             jsonify({"message": f"Insufficient wallet balance. Need LKR {amount}"}),
             400,
         )
-
-    # Deduct from wallet
-    new_balance = wallet.data[0]["balance"] - amount
-    supabase.table("user_wallets").update(
-        {
-            "balance": new_balance,
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-        }
-    ).eq("id", wallet.data[0]["id"]).execute()
+    invalidate_cached_user(request.db_user["id"])
 
     # Create subscription
     sub = {
@@ -79,6 +76,7 @@ def create_subscription():
         "status": "active",
     }
     result = supabase.table("subscriptions").insert(sub).execute()
+    invalidate_vehicle_lookup(vehicle_id=vehicle_id)
 
     # Record payment
     supabase.table("payments").insert(
@@ -106,7 +104,7 @@ def create_subscription():
     )
 
 
-@app.route("/api/subscriptions", methods=["GET"])
+@bp.route("/api/subscriptions", methods=["GET"])
 @require_auth
 def get_subscriptions():
     """GET /api/subscriptions – Get user's subscriptions (or all for admin)."""
@@ -129,7 +127,7 @@ def get_subscriptions():
     return jsonify({"subscriptions": result.data}), 200
 
 
-@app.route("/api/subscriptions/<int:sub_id>", methods=["PUT"])
+@bp.route("/api/subscriptions/<int:sub_id>", methods=["PUT"])
 @require_auth
 def update_subscription(sub_id):
     """PUT /api/subscriptions/:id – Cancel or update auto-renew."""
@@ -140,6 +138,9 @@ def update_subscription(sub_id):
     if "auto_renew" in data:
         updates["auto_renew"] = bool(data["auto_renew"])
     if updates:
-        updates["updated_at"] = datetime.now(timezone.utc).isoformat()
-        supabase.table("subscriptions").update(updates).eq("id", sub_id).execute()
+        result = (
+            supabase.table("subscriptions").update(updates).eq("id", sub_id).execute()
+        )
+        for row in result.data:
+            invalidate_vehicle_lookup(vehicle_id=row["vehicle_id"])
     return jsonify({"message": "Subscription updated"}), 200
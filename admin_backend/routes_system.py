@@ -4,60 +4,130 @@ routes_system.py - System and health endpoints
 System reset and LPR health check.
 """
 
+import atexit
+import threading
+
 import httpx
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin, LPR_SERVICE_URL
+from flask import Blueprint, request, jsonify
+from postgrest import APIError
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    cached_value,
+    invalidate_cache,
+    LPR_STATUS_CACHE_KEY,
+    LPR_STATUS_TTL,
+    SPOT_STATE_CACHE_KEYS,
+    FUNCTION_NOT_FOUND,
+    LPR_SERVICE_URL,
+)
+
+bp = Blueprint("system", __name__)
+
+# Keep-alive client for the LPR service, created lazily once per process so
+# the admin dashboard's status polling reuses one connection instead of
+# opening a new one per check. Like the Supabase client, it must not survive
+# a fork; gunicorn.conf.py calls reset_lpr_client() in post_fork.
+_lpr_client = None
+_lpr_client_lock = threading.Lock()
+
+
+def get_lpr_client():
+    """Return this process's LPR service client, creating it on first use."""
+    global _lpr_client
+    if _lpr_client is None:
+        with _lpr_client_lock:
+            if _lpr_client is None:
+                # Only the status poll talks to the LPR service, so a couple
+                # of idle connections is plenty
+                _lpr_client = httpx.Client(
+                    base_url=LPR_SERVICE_URL,
+                    timeout=5.0,
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_keepalive_connections=4, keepalive_expiry=60
+                    ),
+                )
+                atexit.register(_lpr_client.close)
+    return _lpr_client
+
+
+def reset_lpr_client():
+    """Forget the current LPR client so the next call builds a fresh one."""
+    global _lpr_client
+    _lpr_client = None
+
 
 # ==========================================================================
 # 15. SYSTEM
 # ==========================================================================
 
 
-@app.route("/api/system/reset", methods=["POST"])
+@bp.route("/api/system/reset", methods=["POST"])
 @require_admin
 def reset_system():
     """POST /api/system/reset – Clear all sessions, free all spots. DESTRUCTIVE."""
     facility_id = request.get_json().get("facility_id") if request.get_json() else None
 
     try:
-        if facility_id:
-            supabase.table("parking_sessions").delete().eq(
-                "facility_id", facility_id
-            ).neq("id", 0).execute()
-            supabase.table("reservations").delete().eq("facility_id", facility_id).neq(
-                "id", 0
-            ).execute()
-            supabase.table("parking_spots").update(
-                {
-                    "is_occupied": False,
-                    "is_reserved": False,
-                }
-            ).eq("facility_id", facility_id).neq("id", 0).execute()
-        else:
-            supabase.table("parking_sessions").delete().neq("id", 0).execute()
-            supabase.table("reservations").delete().neq("id", 0).execute()
-            supabase.table("parking_spots").update(
-                {
-                    "is_occupied": False,
-                    "is_reserved": False,
-                }
-            ).neq("id", 0).execute()
-
+        reset_parking_state(facility_id)
         return jsonify({"message": "System reset! All spots are now free."}), 200
     except Exception as e:
         return jsonify({"message": f"Reset failed: {str(e)}"}), 500
 
 
-@app.route("/api/lpr/status", methods=["GET"])
+def reset_parking_state(facility_id=None):
+    """Delete sessions and reservations and free every spot, for one
+    facility or (facility_id None) all of them, in a single transaction."""
+    try:
+        supabase.rpc("reset_facility", {"p_facility_id": facility_id}).execute()
+    except APIError as e:
+        if e.code != FUNCTION_NOT_FOUND:
+            raise
+        _reset_parking_state_steps(facility_id)
+    invalidate_cache(*SPOT_STATE_CACHE_KEYS)
+
+
+def _reset_parking_state_steps(facility_id):
+    """reset_parking_state without reset_facility(): three separate writes."""
+    sessions = supabase.table("parking_sessions").delete()
+    reservations = supabase.table("reservations").delete()
+    # Only rewrite spots that are actually held
+    spots = (
+        supabase.table("parking_spots")
+        .update({"is_occupied": False, "is_reserved": False})
+        .or_("is_occupied.eq.true,is_reserved.eq.true")
+    )
+    if facility_id:
+        sessions = sessions.eq("facility_id", facility_id)
+        reservations = reservations.eq("facility_id", facility_id)
+        spots = spots.eq("facility_id", facility_id)
+    else:
+        # PostgREST rejects a DELETE without any filter
+        sessions = sessions.neq("id", 0)
+        reservations = reservations.neq("id", 0)
+    for query in (sessions, reservations, spots):
+        query.execute()
+
+
+@bp.route("/api/lpr/status", methods=["GET"])
 @require_admin
 def lpr_status():
-    """GET /api/lpr/status – Health check for SentraAI LPR service."""
+    """GET /api/lpr/status – Health check for SentraAI LPR service.
+
+    The result is shared for LPR_STATUS_TTL seconds, so any number of polling
+    dashboards cost at most one upstream check per window.
+    """
+    status = cached_value(LPR_STATUS_CACHE_KEY, LPR_STATUS_TTL, _probe_lpr)
+    return jsonify(status), 200 if status["connected"] else 503
+
+
+def _probe_lpr():
+    """One health check against the LPR service."""
     try:
-        response = httpx.get(f"{LPR_SERVICE_URL}/api/health", timeout=5.0)
+        response = get_lpr_client().get("/api/health")
         if response.status_code == 200:
-            data = response.json()
-            return jsonify({"connected": True, **data}), 200
-        return jsonify({"connected": False, "message": "Service unavailable"}), 503
+            return {"connected": True, **response.json()}
+        return {"connected": False, "message": "Service unavailable"}
     except Exception as e:
-        return jsonify({"connected": False, "message": str(e)}), 503
+        return {"connected": False, "message": str(e)}
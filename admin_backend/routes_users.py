@@ -4,48 +4,127 @@ routes_users.py - Admin user management
 Admin-only endpoints for listing and updating users.
 """
 
-from datetime import datetime, timezone
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_admin
+import orjson
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from supabase_client import supabase
+from routes_common import (
+    require_admin,
+    invalidate_cached_user,
+    conditional_json,
+    seek_page,
+    ORJSON_OPTIONS,
+    MAX_LIST_LIMIT,
+)
+
+bp = Blueprint("users", __name__)
 
 # ==========================================================================
 # 2. USER MANAGEMENT (Admin)
 # ==========================================================================
 
+# Columns returned by the admin user endpoints (avoid shipping whole rows)
+USER_LIST_COLUMNS = "id,email,full_name,phone,role,is_active,created_at"
+USER_DETAIL_COLUMNS = USER_LIST_COLUMNS + ",profile_image,updated_at"
+USER_VEHICLE_COLUMNS = (
+    "id,plate_number,make,model,color,vehicle_type,is_active,created_at"
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Rows fetched per Supabase call when streaming the full list (?all=1)
+STREAM_PAGE_SIZE = MAX_LIST_LIMIT
+
+
+def _users_query(role_filter):
+    query = supabase.table("users").select(USER_LIST_COLUMNS)
+    if role_filter:
+        query = query.eq("role", role_filter)
+    return query
+
+
+def _stream_users(role_filter):
+    """Yield every matching user as one JSON document, a page at a time.
+
+    Pages are keyset seeks on (created_at, id), so users sharing a
+    created_at are neither repeated nor skipped between pages.
+    """
+    yield b'{"users":['
+    cursor = None
+    first = True
+    while True:
+        rows, cursor = seek_page(
+            _users_query(role_filter), "created_at", STREAM_PAGE_SIZE, cursor
+        )
+        for row in rows:
+            if not first:
+                yield b","
+            yield orjson.dumps(row, option=ORJSON_OPTIONS)
+            first = False
+        if cursor is None:
+            break
+    yield b'],"next_page":null}'
+
 
-@app.route("/api/admin/users", methods=["GET"])
+@bp.route("/api/admin/users", methods=["GET"])
 @require_admin
 def list_users():
-    """GET /api/admin/users – List all users with optional role filter."""
+    """
+    GET /api/admin/users?role=&page=1&page_size=50
+    List users (newest first) one page at a time with optional role filter.
+    `next_page` is null on the last page. With `?all=1` every user is
+    streamed in a single response instead.
+    """
     role_filter = request.args.get("role")
-    query = supabase.table("users").select("*").order("created_at", desc=True)
-    if role_filter:
-        query = query.eq("role", role_filter)
-    result = query.execute()
-    return jsonify({"users": result.data}), 200
+    if request.args.get("all") == "1":
+        return Response(
+            stream_with_context(_stream_users(role_filter)),
+            mimetype="application/json",
+        )
+
+    page = max(request.args.get("page", 1, type=int), 1)
+    page_size = request.args.get("page_size", DEFAULT_PAGE_SIZE, type=int)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    offset = (page - 1) * page_size
+
+    result = (
+        _users_query(role_filter)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .range(offset, offset + page_size - 1)
+        .execute()
+    )
+
+    next_page = page + 1 if len(result.data) == page_size else None
+    return conditional_json({"users": result.data, "next_page": next_page})
 
 
-@app.route("/api/admin/users/<int:user_id>", methods=["GET"])
+@bp.route("/api/admin/users/<int:user_id>", methods=["GET"])
 @require_admin
 def get_user(user_id):
     """GET /api/admin/users/:id – Get user details with their vehicles."""
-    user = supabase.table("users").select("*").eq("id", user_id).limit(1).execute()
+    user = (
+        supabase.table("users")
+        .select(USER_DETAIL_COLUMNS)
+        .eq("id", user_id)
+        .limit(1)
+        .execute()
+    )
     if not user.data:
         return jsonify({"message": "User not found"}), 404
 
     vehicles = (
         supabase.table("vehicles")
-        .select("*")
+        .select(USER_VEHICLE_COLUMNS)
         .eq("user_id", user_id)
         .order("created_at", desc=True)
+        .range(0, DEFAULT_PAGE_SIZE - 1)
         .execute()
     )
 
     return jsonify({"user": user.data[0], "vehicles": vehicles.data}), 200
 
 
-@app.route("/api/admin/users/<int:user_id>", methods=["PUT"])
+@bp.route("/api/admin/users/<int:user_id>", methods=["PUT"])
 @require_admin
 def update_user(user_id):
     """PUT /api/admin/users/:id – Update user role / active status."""
@@ -59,6 +138,6 @@ def update_user(user_id):
     if not updates:
         return jsonify({"message": "No valid fields to update"}), 400
 
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
     supabase.table("users").update(updates).eq("id", user_id).execute()
+    invalidate_cached_user(user_id)
     return jsonify({"message": "User updated"}), 200
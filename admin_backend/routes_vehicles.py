@@ -4,16 +4,37 @@ routes_vehicles.py - Vehicle management
 Endpoints for registering and managing vehicles.
 """
 
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_auth
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    cached_json,
+    normalize_plate,
+    vehicle_lookup_key,
+    invalidate_vehicle_lookup,
+    VEHICLE_LOOKUP_TTL,
+)
+
+bp = Blueprint("vehicles", __name__)
+
+# Fields accepted by PUT /api/vehicles/:id
+_VEHICLE_UPDATE_FIELDS = frozenset(
+    {
+        "make",
+        "model",
+        "color",
+        "year",
+        "vehicle_type",
+        "is_active",
+    }
+)
 
 # ==========================================================================
 # 3. VEHICLE MANAGEMENT
 # ==========================================================================
 
 
-@app.route("/api/vehicles", methods=["POST"])
+@bp.route("/api/vehicles", methods=["POST"])
 @require_auth
 def register_vehicle():
     """
@@ -24,8 +45,9 @@ def register_vehicle():
     """
     data = request.get_json()
     plate = data.get("plate_number")
-    if not plate:
+    if not plate or not isinstance(plate, str):
         return jsonify({"message": "plate_number is required"}), 400
+    plate = normalize_plate(plate)
 
     # Check if plate already registered
     existing = (
@@ -48,10 +70,11 @@ def register_vehicle():
         "vehicle_type": data.get("vehicle_type", "car"),
     }
     result = supabase.table("vehicles").insert(vehicle).execute()
+    invalidate_vehicle_lookup(plate)
     return jsonify({"message": "Vehicle registered", "vehicle": result.data[0]}), 201
 
 
-@app.route("/api/vehicles", methods=["GET"])
+@bp.route("/api/vehicles", methods=["GET"])
 @require_auth
 def get_vehicles():
     """
@@ -80,34 +103,38 @@ def get_vehicles():
     return jsonify({"vehicles": result.data}), 200
 
 
-@app.route("/api/vehicles/<int:vehicle_id>", methods=["PUT"])
+@bp.route("/api/vehicles/<int:vehicle_id>", methods=["PUT"])
 @require_auth
 def update_vehicle(vehicle_id):
     """PUT /api/vehicles/:id – Update vehicle details."""
     data = request.get_json()
-    updates = {}
-    for field in ["make", "model", "color", "year", "vehicle_type", "is_active"]:
-        if field in data:
-            updates[field] = data[field]
+    updates = {k: data[k] for k in data.keys() & _VEHICLE_UPDATE_FIELDS}
 
     if not updates:
         return jsonify({"message": "No fields to update"}), 400
 
-    supabase.table("vehicles").update(updates).eq("id", vehicle_id).execute()
+    result = supabase.table("vehicles").update(updates).eq("id", vehicle_id).execute()
+    for row in result.data:
+        invalidate_vehicle_lookup(row["plate_number"])
     return jsonify({"message": "Vehicle updated"}), 200
 
 
-@app.route("/api/vehicles/<int:vehicle_id>", methods=["DELETE"])
+@bp.route("/api/vehicles/<int:vehicle_id>", methods=["DELETE"])
 @require_auth
 def deactivate_vehicle(vehicle_id):
     """DELETE /api/vehicles/:id – Deactivate (soft-delete) a vehicle."""
-    supabase.table("vehicles").update({"is_active": False}).eq(
-        "id", vehicle_id
-    ).execute()
+    result = (
+        supabase.table("vehicles")
+        .update({"is_active": False})
+        .eq("id", vehicle_id)
+        .execute()
+    )
+    for row in result.data:
+        invalidate_vehicle_lookup(row["plate_number"])
     return jsonify({"message": "Vehicle deactivated"}), 200
 
 
-@app.route("/api/vehicles/lookup/<plate_number>", methods=["GET"])
+@bp.route("/api/vehicles/lookup/<plate_number>", methods=["GET"])
 def lookup_vehicle(plate_number):
     """
     GET /api/vehicles/lookup/:plate
@@ -115,7 +142,22 @@ def lookup_vehicle(plate_number):
     if a detected plate belongs to a registered user.
 
     Public endpoint (no auth) so the AI service can call it.
+
+    The LPR service hits this on every detection, so with Redis configured
+    the answer is cached per plate for VEHICLE_LOOKUP_TTL seconds; vehicle
+    and subscription writes invalidate it. A per-worker copy could keep a
+    deactivated vehicle valid, so without Redis every lookup is live.
     """
+    plate_number = normalize_plate(plate_number)
+    return cached_json(
+        vehicle_lookup_key(plate_number),
+        VEHICLE_LOOKUP_TTL,
+        lambda: _lookup_vehicle(plate_number),
+        shared_only=True,
+    )
+
+
+def _lookup_vehicle(plate_number):
     result = (
         supabase.table("vehicles")
         .select("*, users(id, email, full_name, phone)")
@@ -126,7 +168,7 @@ def lookup_vehicle(plate_number):
     )
 
     if not result.data:
-        return jsonify({"registered": False, "plate_number": plate_number}), 200
+        return {"registered": False, "plate_number": plate_number}
 
     vehicle = result.data[0]
     # Check for active subscription
@@ -139,14 +181,9 @@ def lookup_vehicle(plate_number):
         .execute()
     )
 
-    return (
-        jsonify(
-            {
-                "registered": True,
-                "vehicle": vehicle,
-                "has_subscription": len(sub.data) > 0,
-                "subscription": sub.data[0] if sub.data else None,
-            }
-        ),
-        200,
-    )
+    return {
+        "registered": True,
+        "vehicle": vehicle,
+        "has_subscription": len(sub.data) > 0,
+        "subscription": sub.data[0] if sub.data else None,
+    }
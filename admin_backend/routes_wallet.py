@@ -4,33 +4,54 @@ routes_wallet.py - Wallet and payments
 Endpoints for wallet balance, top-ups, and payment history.
 """
 
-from datetime import datetime, timezone
-from flask import request, jsonify
-from app import app, supabase
-from routes_common import require_auth, DEFAULT_CURRENCY, _create_notification
+from flask import Blueprint, request, jsonify
+from supabase_client import supabase
+from routes_common import (
+    require_auth,
+    invalidate_cached_user,
+    adjust_wallet,
+    cached_json,
+    seek_page,
+    wallet_cache_key,
+    DEFAULT_CURRENCY,
+    WALLET_CACHE_TTL,
+    _create_notification,
+)
+
+bp = Blueprint("wallet", __name__)
 
 # ==========================================================================
 # 8. PAYMENTS & WALLET
 # ==========================================================================
 
 
-@app.route("/api/wallet", methods=["GET"])
+@bp.route("/api/wallet", methods=["GET"])
 @require_auth
 def get_wallet():
     """GET /api/wallet – Get current user's wallet balance."""
+    user_id = request.db_user["id"]
+    return cached_json(
+        wallet_cache_key(user_id),
+        WALLET_CACHE_TTL,
+        lambda: _load_wallet(user_id),
+        shared_only=True,
+    )
+
+
+def _load_wallet(user_id):
     wallet = (
         supabase.table("user_wallets")
         .select("*")
-        .eq("user_id", request.db_user["id"])
+        .eq("user_id", user_id)
         .limit(1)
         .execute()
     )
     if not wallet.data:
-        return jsonify({"balance": 0, "currency": DEFAULT_CURRENCY}), 200
-    return jsonify(wallet.data[0]), 200
+        return {"balance": 0, "currency": DEFAULT_CURRENCY}
+    return wallet.data[0]
 
 
-@app.route("/api/wallet/topup", methods=["POST"])
+@bp.route("/api/wallet/topup", methods=["POST"])
 @require_auth
 def topup_wallet():
     """
@@ -44,23 +65,10 @@ def topup_wallet():
     if not amount or amount <= 0:
         return jsonify({"message": "A positive amount is required"}), 400
 
-    wallet = (
-        supabase.table("user_wallets")
-        .select("*")
-        .eq("user_id", request.db_user["id"])
-        .limit(1)
-        .execute()
-    )
-    if not wallet.data:
+    new_balance = adjust_wallet(request.db_user["id"], amount)
+    if new_balance is None:
         return jsonify({"message": "Wallet not found"}), 404
-
-    new_balance = wallet.data[0]["balance"] + amount
-    supabase.table("user_wallets").update(
-        {
-            "balance": new_balance,
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-        }
-    ).eq("id", wallet.data[0]["id"]).execute()
+    invalidate_cached_user(request.db_user["id"])
 
     # Record payment
     supabase.table("payments").insert(
@@ -84,10 +92,13 @@ def topup_wallet():
     return jsonify({"message": "Wallet topped up", "new_balance": new_balance}), 200
 
 
-@app.route("/api/payments", methods=["GET"])
+@bp.route("/api/payments", methods=["GET"])
 @require_auth
 def get_payments():
-    """GET /api/payments – Payment history for the current user (or all for admin)."""
+    """GET /api/payments – Payment history for the current user (or all for admin).
+
+    Newest first; page with ?limit=100&cursor=<next_cursor>.
+    """
     if request.args.get("all") == "true" and request.db_user["role"] in (
         "admin",
         "operator",
@@ -98,5 +109,10 @@ def get_payments():
             supabase.table("payments").select("*").eq("user_id", request.db_user["id"])
         )
 
-    result = query.order("created_at", desc=True).limit(100).execute()
-    return jsonify({"payments": result.data}), 200
+    payments, next_cursor = seek_page(
+        query,
+        "created_at",
+        request.args.get("limit", 100, type=int),
+        request.args.get("cursor"),
+    )
+    return jsonify({"payments": payments, "next_cursor": next_cursor}), 200
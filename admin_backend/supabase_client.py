@@ -0,0 +1,148 @@
+"""
+supabase_client.py - Supabase connection
+========================================
+Owns the Supabase client used by the route modules. Kept separate from
+app.py so blueprints can import it without importing the Flask app.
+
+Environment Variables Required (in .env):
+  SUPABASE_URL - Your Supabase project URL (e.g. https://xyz.supabase.co)
+  SUPABASE_KEY - Your Supabase anon/public API key
+"""
+
+import logging
+import os
+import threading
+import time
+
+import httpx
+from dotenv import load_dotenv
+from supabase import create_client, Client, ClientOptions
+
+# Load environment variables from .env file in the same directory
+load_dotenv()
+
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+# Fail fast if credentials are missing - no point starting without a database
+if not SUPABASE_URL or not SUPABASE_KEY:
+    raise ValueError(
+        "Missing required environment variables: SUPABASE_URL and SUPABASE_KEY must be set in .env file"
+    )
+
+
+# Connection pool bounds, per worker process. Every Supabase call is an
+# HTTPS request to PostgREST/GoTrue, which hold the actual Postgres
+# connections, so these cap how many sockets a worker keeps open rather than
+# Postgres slots. With gevent, a request that finds the pool full waits up
+# to SUPABASE_POOL_TIMEOUT seconds for a free connection instead of opening
+# a new one.
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 128))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", 64))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 300))
+SUPABASE_POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", 5))
+
+# Supabase calls slower than this many milliseconds are logged as warnings,
+# so an endpoint that regresses under load shows up in the worker logs.
+SUPABASE_SLOW_MS = float(os.getenv("SUPABASE_SLOW_MS", 200))
+
+logger = logging.getLogger(__name__)
+
+
+def _start_timer(request):
+    request.extensions["sentra_started"] = time.perf_counter()
+
+
+def _log_slow_call(response):
+    """Warn about a Supabase round-trip that took longer than SUPABASE_SLOW_MS."""
+    request = response.request
+    started = request.extensions.get("sentra_started")
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > SUPABASE_SLOW_MS:
+        logger.warning(
+            "Slow Supabase call: %s %s took %.0f ms (status %s)",
+            request.method,
+            request.url.path,
+            elapsed_ms,
+            response.status_code,
+        )
+
+
+def _new_http_client():
+    """
+    One pooled HTTP/2 client shared by the PostgREST (table/rpc) and GoTrue
+    (auth) calls. Keeping connections alive between requests means a route
+    that issues several Supabase calls pays the TCP + TLS handshake once,
+    not once per call.
+    """
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(10.0, pool=SUPABASE_POOL_TIMEOUT),
+        event_hooks={"request": [_start_timer], "response": [_log_slow_call]},
+    )
+
+
+# The Supabase client is created lazily, once per process. httpx connection
+# pools are not fork-safe, so a client built before gunicorn forks (e.g. with
+# --preload) must never be shared by the workers; gunicorn.conf.py calls
+# reset_supabase() in post_fork so each worker opens its own pool.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase() -> Client:
+    """Return this process's Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(
+                    SUPABASE_URL,
+                    SUPABASE_KEY,
+                    options=ClientOptions(
+                        httpx_client=_new_http_client(), postgrest_client_timeout=10
+                    ),
+                )
+    return _client
+
+
+def warm_up():
+    """Build the client and open its first connection before any request.
+
+    PostgREST keeps its own schema cache, so one tiny read is enough: it
+    pays the TCP + TLS (and HTTP/2) setup that would otherwise
+    land on the worker's first real request. Errors are ignored; the
+    first request will simply retry.
+    """
+    try:
+        get_supabase().table("facilities").select("id").limit(1).execute()
+    except Exception:
+        pass
+
+
+def reset_supabase():
+    """Forget the current client so the next call builds a fresh one."""
+    global _client
+    _client = None
+
+
+class _SupabaseProxy:
+    """Forwards attribute access to get_supabase(), so route modules can keep
+    using `from supabase_client import supabase` without creating the client
+    at import."""
+
+    def __getattr__(self, name):
+        return getattr(get_supabase(), name)
+
+
+# Used by all route handlers in routes_*.py (also exposed to Flask as
+# app.extensions["supabase"])
+supabase: Client = _SupabaseProxy()
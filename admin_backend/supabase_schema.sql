@@ -52,7 +52,7 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS vehicles (
     id              BIGSERIAL PRIMARY KEY,
     user_id         BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-    plate_number    VARCHAR(20) UNIQUE NOT NULL,             -- e.g. "WP CA-1234"
+    plate_number    VARCHAR(20) UNIQUE NOT NULL,             -- e.g. "WP CA-1234"; normalised (see PLATE NUMBERS)
     make            VARCHAR(50),                             -- e.g. "Toyota"
     model           VARCHAR(50),                             -- e.g. "Corolla"
     color           VARCHAR(30),                             -- e.g. "White"
@@ -181,7 +181,7 @@ CREATE TABLE IF NOT EXISTS parking_sessions (
     reservation_id  BIGINT REFERENCES reservations(id) ON DELETE SET NULL,
     plate_number    VARCHAR(20) NOT NULL,
     spot_name       VARCHAR(10) NOT NULL,
-    entry_time      TIMESTAMP WITH TIME ZONE NOT NULL,
+    entry_time      TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     exit_time       TIMESTAMP WITH TIME ZONE,
     duration_minutes INTEGER,
     amount          INTEGER,                                  -- Fee in LKR
@@ -334,7 +334,7 @@ CREATE TABLE IF NOT EXISTS detection_logs (
     confidence      FLOAT NOT NULL,
     vehicle_id      BIGINT REFERENCES vehicles(id) ON DELETE SET NULL,   -- Non-null if plate is registered
     is_registered   BOOLEAN DEFAULT FALSE,                    -- Quick flag: is this a known vehicle?
-    detected_at     TIMESTAMP WITH TIME ZONE NOT NULL,
+    detected_at     TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     action_taken    VARCHAR(20) DEFAULT 'pending'             -- 'pending' | 'entry' | 'exit' | 'ignored' | 'gate_opened'
                         CHECK (action_taken IN ('pending', 'entry', 'exit', 'ignored', 'gate_opened')),
     vehicle_class   VARCHAR(20),                              -- AI classification: 'car', 'truck', etc.
@@ -383,6 +383,9 @@ CREATE TABLE IF NOT EXISTS notifications (
 -- =============================================================================
 -- INDEXES
 -- =============================================================================
+-- On a live database with large tables, run new CREATE INDEX statements one
+-- at a time as CREATE INDEX CONCURRENTLY (outside a transaction) to avoid
+-- blocking writes.
 
 -- Users
 CREATE INDEX IF NOT EXISTS idx_users_auth_id ON users(auth_user_id);
@@ -396,6 +399,12 @@ CREATE INDEX IF NOT EXISTS idx_vehicles_plate ON vehicles(plate_number);
 CREATE INDEX IF NOT EXISTS idx_spots_facility ON parking_spots(facility_id);
 CREATE INDEX IF NOT EXISTS idx_spots_occupied ON parking_spots(is_occupied);
 CREATE INDEX IF NOT EXISTS idx_spots_reserved ON parking_spots(is_reserved);
+-- Free-spot finder used on vehicle entry ("first free active spot by id");
+-- partial, so it only holds the spots that are currently available.
+CREATE INDEX IF NOT EXISTS idx_spots_available ON parking_spots(facility_id, id)
+    WHERE is_active AND NOT is_occupied AND NOT is_reserved;
+-- Per-facility spot counts (facility_occupancy, dashboard_stats)
+CREATE INDEX IF NOT EXISTS idx_spots_facility_active ON parking_spots(facility_id, is_active);
 
 -- Parking sessions
 CREATE INDEX IF NOT EXISTS idx_sessions_plate ON parking_sessions(plate_number);
@@ -403,12 +412,24 @@ CREATE INDEX IF NOT EXISTS idx_sessions_vehicle ON parking_sessions(vehicle_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_facility ON parking_sessions(facility_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_exit ON parking_sessions(exit_time);
 CREATE INDEX IF NOT EXISTS idx_sessions_entry ON parking_sessions(entry_time);
+-- "Is this plate parked right now?" (entry duplicate check, exit lookup)
+CREATE INDEX IF NOT EXISTS idx_sessions_active_plate ON parking_sessions(plate_number)
+    WHERE exit_time IS NULL;
+-- Dashboard: today's entries and currently parked cars per facility
+CREATE INDEX IF NOT EXISTS idx_sessions_facility_entry
+    ON parking_sessions(facility_id, entry_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_active_facility ON parking_sessions(facility_id)
+    WHERE exit_time IS NULL;
 
 -- Reservations
 CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations(user_id);
 CREATE INDEX IF NOT EXISTS idx_reservations_facility ON reservations(facility_id);
 CREATE INDEX IF NOT EXISTS idx_reservations_status ON reservations(status);
 CREATE INDEX IF NOT EXISTS idx_reservations_start ON reservations(reserved_start);
+CREATE INDEX IF NOT EXISTS idx_reservations_vehicle_facility
+    ON reservations(vehicle_id, facility_id, status);
+CREATE INDEX IF NOT EXISTS idx_reservations_facility_start
+    ON reservations(facility_id, reserved_start);
 
 -- Payment methods
 CREATE INDEX IF NOT EXISTS idx_payment_methods_user ON payment_methods(user_id);
@@ -423,6 +444,9 @@ CREATE INDEX IF NOT EXISTS idx_payments_method ON payments(payment_method_id);
 CREATE INDEX IF NOT EXISTS idx_detections_detected ON detection_logs(detected_at);
 CREATE INDEX IF NOT EXISTS idx_detections_plate ON detection_logs(plate_number);
 CREATE INDEX IF NOT EXISTS idx_detections_camera ON detection_logs(camera_id);
+-- Per-facility detection feeds (newest first); also covers the facility FK
+CREATE INDEX IF NOT EXISTS idx_detections_facility_detected
+    ON detection_logs(facility_id, detected_at DESC);
 
 -- Notifications
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id);
@@ -431,11 +455,16 @@ CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, is
 -- Payments
 CREATE INDEX IF NOT EXISTS idx_payments_user ON payments(user_id);
 CREATE INDEX IF NOT EXISTS idx_payments_session ON payments(session_id);
+-- Payment history pages (newest first), per user and across all users
+CREATE INDEX IF NOT EXISTS idx_payments_user_created ON payments(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_created ON payments(created_at DESC);
 
 -- Subscriptions
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions(user_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_vehicle ON subscriptions(vehicle_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_status ON subscriptions(status);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_vehicle_facility
+    ON subscriptions(vehicle_id, facility_id, status);
 
 -- Gate events
 CREATE INDEX IF NOT EXISTS idx_gate_events_gate ON gate_events(gate_id);
@@ -484,6 +513,555 @@ CREATE POLICY "dev_all" ON gate_events FOR ALL USING (true) WITH CHECK (true);
 CREATE POLICY "dev_all" ON notifications FOR ALL USING (true) WITH CHECK (true);
 
 
+-- =============================================================================
+-- TRIGGERS
+-- =============================================================================
+-- updated_at is stamped by the database clock on every UPDATE, so the API
+-- never sends it (and app-server clock skew can't leak into the data).
+
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS users_updated_at ON users;
+CREATE TRIGGER users_updated_at BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+DROP TRIGGER IF EXISTS facilities_updated_at ON facilities;
+CREATE TRIGGER facilities_updated_at BEFORE UPDATE ON facilities
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+DROP TRIGGER IF EXISTS reservations_updated_at ON reservations;
+CREATE TRIGGER reservations_updated_at BEFORE UPDATE ON reservations
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+DROP TRIGGER IF EXISTS user_wallets_updated_at ON user_wallets;
+CREATE TRIGGER user_wallets_updated_at BEFORE UPDATE ON user_wallets
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+DROP TRIGGER IF EXISTS payment_methods_updated_at ON payment_methods;
+CREATE TRIGGER payment_methods_updated_at BEFORE UPDATE ON payment_methods
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+DROP TRIGGER IF EXISTS subscriptions_updated_at ON subscriptions;
+CREATE TRIGGER subscriptions_updated_at BEFORE UPDATE ON subscriptions
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+
+-- =============================================================================
+-- PLATE NUMBERS
+-- =============================================================================
+-- The API stores and looks up plates in one canonical form (routes_common.
+-- normalize_plate): upper case, whitespace runs collapsed to one space, no
+-- space around "-". normalize_plate() below is the same rule in SQL.
+-- Everything in this section is safe to re-run on an existing database.
+
+CREATE OR REPLACE FUNCTION normalize_plate(p_plate TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT regexp_replace(
+        btrim(regexp_replace(upper(p_plate), '[[:space:]]+', ' ', 'g')),
+        ' ?- ?', '-', 'g');
+$$;
+
+-- Backfill rows written before the API normalised plates, so registered
+-- vehicles still match at the gate and parked cars can still exit. A plate
+-- whose normalised form is already taken is left alone; the VALIDATE below
+-- then fails and names the duplicate to merge by hand.
+UPDATE vehicles v SET plate_number = normalize_plate(v.plate_number)
+    WHERE v.plate_number <> normalize_plate(v.plate_number)
+      AND NOT EXISTS (SELECT 1 FROM vehicles o
+                      WHERE o.plate_number = normalize_plate(v.plate_number));
+UPDATE parking_sessions SET plate_number = normalize_plate(plate_number)
+    WHERE plate_number <> normalize_plate(plate_number);
+
+-- Added NOT VALID (no full-table scan under lock), then validated. Replaces
+-- the earlier upper/btrim-only check.
+ALTER TABLE vehicles DROP CONSTRAINT IF EXISTS vehicles_plate_number_check;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conname = 'vehicles_plate_normalised') THEN
+        ALTER TABLE vehicles ADD CONSTRAINT vehicles_plate_normalised
+            CHECK (plate_number = normalize_plate(plate_number)) NOT VALID;
+    END IF;
+END;
+$$;
+ALTER TABLE vehicles VALIDATE CONSTRAINT vehicles_plate_normalised;
+
+
+-- =============================================================================
+-- RPC FUNCTIONS
+-- =============================================================================
+-- Called from Python via supabase.rpc("<name>", {...}). Each runs several
+-- statements in a single round-trip and a single transaction.
+
+-- Wipe all transactional data (used by reset_db.py).
+-- TRUNCATE drops the table files instead of deleting row by row.
+-- Development-only, like the dev_all policies above. Runs with the caller's
+-- privileges (not SECURITY DEFINER), so it can never do more than the
+-- calling key could do table by table.
+CREATE OR REPLACE FUNCTION reset_transactional_data()
+RETURNS void
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+BEGIN
+    TRUNCATE gate_events, detection_logs, notifications, payments,
+             subscriptions, parking_sessions, reservations
+        RESTART IDENTITY CASCADE;
+    UPDATE parking_spots
+        SET is_occupied = FALSE, is_reserved = FALSE
+        WHERE is_occupied OR is_reserved;
+END;
+$$;
+
+-- Live spot counts per facility (active spots only) in one aggregate query,
+-- instead of fetching every spot row. NULL returns every facility that has
+-- spots; pass an id for a single facility.
+CREATE OR REPLACE FUNCTION facility_occupancy(p_facility_id BIGINT DEFAULT NULL)
+RETURNS TABLE (facility_id BIGINT, total INTEGER, occupied INTEGER, reserved INTEGER)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT s.facility_id,
+           COUNT(*)::INTEGER,
+           (COUNT(*) FILTER (WHERE s.is_occupied))::INTEGER,
+           (COUNT(*) FILTER (WHERE s.is_reserved AND NOT s.is_occupied))::INTEGER
+    FROM parking_spots s
+    WHERE s.is_active
+      AND (p_facility_id IS NULL OR s.facility_id = p_facility_id)
+    GROUP BY s.facility_id;
+$$;
+
+-- Everything GET /api/dashboard/stats reports, in one round-trip. Returns
+-- the response body as JSON; "today" starts at midnight UTC.
+CREATE OR REPLACE FUNCTION dashboard_stats(p_facility_id BIGINT)
+RETURNS JSON
+LANGUAGE sql
+STABLE
+AS $$
+    WITH day AS (
+        SELECT date_trunc('day', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS start
+    ),
+    spots AS (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE is_occupied) AS occupied,
+               COUNT(*) FILTER (WHERE is_reserved AND NOT is_occupied) AS reserved
+        FROM parking_spots
+        WHERE facility_id = p_facility_id AND is_active
+    ),
+    today AS (
+        SELECT COUNT(*) AS entries,
+               COALESCE(SUM(amount) FILTER (WHERE payment_status = 'paid'), 0) AS revenue
+        FROM parking_sessions, day
+        WHERE facility_id = p_facility_id AND entry_time >= day.start
+    )
+    SELECT json_build_object(
+        'spots', json_build_object(
+            'total', s.total,
+            'occupied', s.occupied,
+            'reserved', s.reserved,
+            'available', s.total - s.occupied - s.reserved),
+        'today', json_build_object(
+            'entries', t.entries,
+            'revenue', t.revenue,
+            'active_sessions', (SELECT COUNT(*) FROM parking_sessions
+                                WHERE facility_id = p_facility_id
+                                  AND exit_time IS NULL),
+            'reservations', (SELECT COUNT(*) FROM reservations, day
+                             WHERE facility_id = p_facility_id
+                               AND reserved_start >= day.start)),
+        'system', json_build_object(
+            'total_users', (SELECT COUNT(*) FROM users WHERE role = 'user'),
+            'total_vehicles', (SELECT COUNT(*) FROM vehicles WHERE is_active)))
+    FROM spots s, today t;
+$$;
+
+-- Vehicle entry as one transaction (called by POST /api/sessions/entry).
+-- Does the whole lookup → allocate → record sequence server-side and returns
+-- the API response body plus an HTTP "status". The free spot is claimed with
+-- FOR UPDATE SKIP LOCKED, so two gates admitting cars at the same moment
+-- can never be handed the same spot.
+CREATE OR REPLACE FUNCTION process_vehicle_entry(
+    p_plate TEXT,
+    p_facility_id BIGINT,
+    p_entry_method TEXT DEFAULT 'lpr'
+)
+RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_active      parking_sessions%ROWTYPE;
+    v_vehicle     vehicles%ROWTYPE;
+    v_reservation reservations%ROWTYPE;
+    v_spot        parking_spots%ROWTYPE;
+    v_type        TEXT := 'walk_in';
+    v_start       TIMESTAMPTZ := NOW();
+    v_session_id  BIGINT;
+BEGIN
+    -- Duplicate active session
+    SELECT * INTO v_active FROM parking_sessions
+        WHERE plate_number = p_plate AND exit_time IS NULL
+        LIMIT 1;
+    IF FOUND THEN
+        RETURN json_build_object(
+            'status', 409,
+            'message', format('Vehicle %s is already parked at %s', p_plate, v_active.spot_name),
+            'gate_action', 'deny');
+    END IF;
+
+    -- Scenario 3: unregistered vehicle
+    SELECT * INTO v_vehicle FROM vehicles
+        WHERE plate_number = p_plate AND is_active
+        LIMIT 1;
+    IF NOT FOUND THEN
+        BEGIN
+            INSERT INTO detection_logs (facility_id, plate_number, is_registered, action_taken)
+            VALUES (p_facility_id, p_plate, FALSE, 'denied');
+        EXCEPTION WHEN OTHERS THEN
+            NULL;  -- best effort, like the API's non-critical logging
+        END;
+        RETURN json_build_object(
+            'status', 403,
+            'message', format('Vehicle %s is not registered. Please scan the QR code '
+                              'at the kiosk to register via the Sentra app.', p_plate),
+            'is_registered', FALSE,
+            'gate_action', 'deny',
+            'requires_registration', TRUE);
+    END IF;
+
+    -- Scenario 1: confirmed reservation (billing from its scheduled start)
+    SELECT * INTO v_reservation FROM reservations
+        WHERE vehicle_id = v_vehicle.id AND facility_id = p_facility_id
+          AND status = 'confirmed'
+        LIMIT 1
+        FOR UPDATE;
+    IF FOUND THEN
+        v_type := 'reserved';
+        v_start := v_reservation.reserved_start;
+        IF v_reservation.spot_id IS NOT NULL THEN
+            SELECT * INTO v_spot FROM parking_spots
+                WHERE id = v_reservation.spot_id
+                FOR UPDATE;
+        END IF;
+    ELSIF EXISTS (
+        SELECT 1 FROM subscriptions
+        WHERE vehicle_id = v_vehicle.id AND facility_id = p_facility_id
+          AND status = 'active'
+    ) THEN
+        v_type := 'subscription';
+    END IF;
+
+    -- Scenario 2: auto-assign a free spot
+    IF v_spot.id IS NULL THEN
+        SELECT * INTO v_spot FROM parking_spots
+            WHERE facility_id = p_facility_id AND is_active
+              AND NOT is_occupied AND NOT is_reserved
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED;
+        IF NOT FOUND THEN
+            RETURN json_build_object(
+                'status', 404, 'message', 'Parking is full!', 'gate_action', 'deny');
+        END IF;
+    END IF;
+
+    UPDATE parking_spots SET is_occupied = TRUE, is_reserved = FALSE
+        WHERE id = v_spot.id;
+    IF v_reservation.id IS NOT NULL THEN
+        UPDATE reservations SET status = 'checked_in' WHERE id = v_reservation.id;
+    END IF;
+
+    INSERT INTO parking_sessions (vehicle_id, facility_id, spot_id, reservation_id,
+                                  plate_number, spot_name, entry_time,
+                                  session_type, entry_method)
+    VALUES (v_vehicle.id, p_facility_id, v_spot.id, v_reservation.id,
+            p_plate, v_spot.spot_name, v_start, v_type, p_entry_method)
+    RETURNING id INTO v_session_id;
+
+    INSERT INTO notifications (user_id, title, message, type, data)
+    VALUES (
+        v_vehicle.user_id,
+        CASE WHEN v_type = 'reserved' THEN 'Reservation Checked In' ELSE 'Spot Assigned' END,
+        CASE WHEN v_type = 'reserved'
+            THEN format('Welcome! Your reserved spot %s is ready. Vehicle: %s.',
+                        v_spot.spot_name, p_plate)
+            ELSE format('Your vehicle %s has been assigned to spot %s. '
+                        'Please proceed to your assigned spot.', p_plate, v_spot.spot_name)
+        END,
+        'entry',
+        jsonb_build_object('session_id', v_session_id, 'spot_name', v_spot.spot_name,
+                           'facility_id', p_facility_id));
+
+    RETURN json_build_object(
+        'status', 200,
+        'message', format('Vehicle %s parked at %s', p_plate, v_spot.spot_name),
+        'spot', v_spot.spot_name,
+        'session_type', v_type,
+        'is_registered', TRUE,
+        'gate_action', 'open',
+        'session_id', v_session_id);
+END;
+$$;
+
+-- Vehicle exit as one transaction (called by POST /api/sessions/exit).
+-- Closes the plate's active session, bills it at the facility rate, charges
+-- the owner's wallet when asked and the balance covers it, frees the spot
+-- and completes any reservation. The session row is locked first, so two
+-- exits racing for one plate can't both bill it. Returns the API response
+-- body plus an HTTP "status" and the owner's "user_id".
+CREATE OR REPLACE FUNCTION process_vehicle_exit(
+    p_plate TEXT,
+    p_payment_method TEXT DEFAULT 'wallet'
+)
+RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_session  parking_sessions%ROWTYPE;
+    v_user_id  BIGINT;
+    v_rate     INTEGER;
+    v_now      TIMESTAMPTZ := NOW();
+    v_minutes  INTEGER;
+    v_amount   INTEGER := 0;
+    v_status   TEXT := 'waived';
+BEGIN
+    SELECT * INTO v_session FROM parking_sessions
+        WHERE plate_number = p_plate AND exit_time IS NULL
+        ORDER BY entry_time DESC
+        LIMIT 1
+        FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN json_build_object(
+            'status', 404, 'message', format('No active session for %s', p_plate));
+    END IF;
+
+    SELECT user_id INTO v_user_id FROM vehicles WHERE id = v_session.vehicle_id;
+    SELECT COALESCE(hourly_rate, 150) INTO v_rate
+        FROM facilities WHERE id = v_session.facility_id;
+
+    v_minutes := FLOOR(EXTRACT(EPOCH FROM v_now - v_session.entry_time) / 60);
+    IF v_session.session_type <> 'subscription' THEN
+        v_amount := GREATEST(1, CEIL(v_minutes / 60.0))::INTEGER * v_rate;
+        v_status := 'pending';
+        IF v_user_id IS NOT NULL AND p_payment_method = 'wallet'
+           AND charge_wallet(v_user_id, v_amount, v_session.id,
+                             format('Parking fee for %s at %s', p_plate,
+                                    v_session.spot_name)) IS NOT NULL THEN
+            v_status := 'paid';
+        END IF;
+    END IF;
+
+    UPDATE parking_sessions
+        SET exit_time = v_now, duration_minutes = v_minutes,
+            amount = v_amount, payment_status = v_status
+        WHERE id = v_session.id;
+    IF v_session.spot_id IS NOT NULL THEN
+        UPDATE parking_spots SET is_occupied = FALSE, is_reserved = FALSE
+            WHERE id = v_session.spot_id;
+    END IF;
+    IF v_session.reservation_id IS NOT NULL THEN
+        UPDATE reservations SET status = 'completed'
+            WHERE id = v_session.reservation_id;
+    END IF;
+
+    IF v_amount > 0 AND v_user_id IS NOT NULL THEN
+        INSERT INTO notifications (user_id, title, message, type, data)
+        VALUES (
+            v_user_id, 'Vehicle Exited',
+            format('Your vehicle %s has left. Duration: %s min. Fee: LKR %s.',
+                   p_plate, v_minutes, v_amount),
+            'exit',
+            jsonb_build_object('session_id', v_session.id, 'amount', v_amount,
+                               'duration_minutes', v_minutes));
+    END IF;
+
+    RETURN json_build_object(
+        'status', 200,
+        'user_id', v_user_id,
+        'message', format('Spot %s is now free!', v_session.spot_name),
+        'duration_minutes', v_minutes,
+        'amount', v_amount,
+        'payment_status', v_status,
+        'gate_action', 'open');
+END;
+$$;
+
+-- Bulk-create spots <prefix>-01 … <prefix>-<count> for a facility and set its
+-- total (called by POST /api/facilities/:id/spots/init).
+CREATE OR REPLACE FUNCTION init_facility_spots(
+    p_facility_id BIGINT,
+    p_prefix TEXT,
+    p_count INTEGER,
+    p_floor_id BIGINT DEFAULT NULL,
+    p_spot_type TEXT DEFAULT 'regular'
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO parking_spots (facility_id, floor_id, spot_name, spot_type,
+                               is_occupied, is_reserved)
+    SELECT p_facility_id, p_floor_id,
+           p_prefix || '-' || lpad(i::TEXT, GREATEST(2, length(i::TEXT)), '0'),
+           p_spot_type, FALSE, FALSE
+    FROM generate_series(1, p_count) AS i;
+
+    UPDATE facilities SET total_spots = p_count WHERE id = p_facility_id;
+END;
+$$;
+
+-- Legacy POST /api/init-spots: make sure a facility exists (creating the
+-- default one if the table is empty), then give the first facility spots
+-- A-01 … A-32 unless it already has some. Returns the number of spots created.
+CREATE OR REPLACE FUNCTION ensure_default_facility_and_spots(
+    p_hourly_rate INTEGER DEFAULT 150
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_facility_id BIGINT;
+    v_created INTEGER;
+BEGIN
+    SELECT id INTO v_facility_id FROM facilities ORDER BY id LIMIT 1;
+    IF v_facility_id IS NULL THEN
+        INSERT INTO facilities (name, address, city, total_spots, hourly_rate)
+        VALUES ('Sentra Main Parking', 'Main Street', 'Colombo', 32, p_hourly_rate)
+        RETURNING id INTO v_facility_id;
+    ELSIF EXISTS (SELECT 1 FROM parking_spots WHERE facility_id = v_facility_id) THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO parking_spots (facility_id, spot_name, is_occupied)
+    SELECT v_facility_id, 'A-' || lpad(i::TEXT, 2, '0'), FALSE
+    FROM generate_series(1, 32) AS i
+    ON CONFLICT (facility_id, spot_name) DO NOTHING;
+    GET DIAGNOSTICS v_created = ROW_COUNT;
+    RETURN v_created;
+END;
+$$;
+
+-- Record an LPR detection, flagging it against the registered (active)
+-- vehicle with that plate, in one statement (POST /api/detections).
+CREATE OR REPLACE FUNCTION log_detection(
+    p_camera_id TEXT,
+    p_facility_id BIGINT,
+    p_plate TEXT,
+    p_confidence FLOAT,
+    p_vehicle_class TEXT DEFAULT NULL,
+    p_image_url TEXT DEFAULT NULL
+)
+RETURNS TABLE (id BIGINT, is_registered BOOLEAN)
+LANGUAGE sql
+AS $$
+    INSERT INTO detection_logs (camera_id, facility_id, plate_number, confidence,
+                                vehicle_id, is_registered, detected_at,
+                                action_taken, vehicle_class, image_url)
+    SELECT p_camera_id, p_facility_id, p_plate, p_confidence,
+           v.id, v.id IS NOT NULL, NOW(),
+           'pending', p_vehicle_class, p_image_url
+    FROM (SELECT 1) AS one
+    LEFT JOIN vehicles v ON v.plate_number = p_plate AND v.is_active
+    RETURNING detection_logs.id, detection_logs.is_registered;
+$$;
+
+-- Admin reset: delete sessions and reservations and free every spot, for
+-- one facility or (p_facility_id NULL) all of them, as one transaction.
+CREATE OR REPLACE FUNCTION reset_facility(p_facility_id BIGINT DEFAULT NULL)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM parking_sessions
+    WHERE p_facility_id IS NULL OR facility_id = p_facility_id;
+
+    DELETE FROM reservations
+    WHERE p_facility_id IS NULL OR facility_id = p_facility_id;
+
+    UPDATE parking_spots SET is_occupied = FALSE, is_reserved = FALSE
+    WHERE (p_facility_id IS NULL OR facility_id = p_facility_id)
+      AND (is_occupied OR is_reserved);
+END;
+$$;
+
+-- Add p_delta (negative to debit) to a user's wallet, but only while the
+-- balance is at least p_require_min. The check and the write are one
+-- UPDATE, so concurrent adjustments can't lose each other's changes.
+-- Returns the new balance, or NULL if there is no wallet or too little in it.
+CREATE OR REPLACE FUNCTION wallet_adjust(
+    p_user_id BIGINT,
+    p_delta INTEGER,
+    p_require_min INTEGER DEFAULT 0
+)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    UPDATE user_wallets
+    SET balance = balance + p_delta
+    WHERE user_id = p_user_id AND balance >= p_require_min
+    RETURNING balance;
+$$;
+
+-- Debit a wallet and record the payment in one transaction. The balance
+-- check is part of the UPDATE, so concurrent charges can never take a
+-- wallet below zero. Returns the new balance, or NULL when funds are short.
+CREATE OR REPLACE FUNCTION charge_wallet(
+    p_user_id BIGINT,
+    p_amount INTEGER,
+    p_session_id BIGINT DEFAULT NULL,
+    p_description TEXT DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_balance INTEGER;
+BEGIN
+    v_balance := wallet_adjust(p_user_id, -p_amount, p_amount);
+    IF v_balance IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO payments (user_id, session_id, amount, payment_method,
+                          payment_status, description)
+    VALUES (p_user_id, p_session_id, p_amount, 'wallet', 'completed',
+            p_description);
+    RETURN v_balance;
+END;
+$$;
+
+-- Claim the first free spot of a type for a reservation and return it (no
+-- rows when the facility is full). FOR UPDATE SKIP LOCKED makes concurrent
+-- bookings pass over a row another transaction is claiming, so no spot is
+-- ever handed out twice.
+CREATE OR REPLACE FUNCTION allocate_spot(
+    p_facility_id BIGINT,
+    p_spot_type TEXT DEFAULT 'regular'
+)
+RETURNS SETOF parking_spots
+LANGUAGE sql
+AS $$
+    UPDATE parking_spots
+    SET is_reserved = TRUE
+    WHERE id = (
+        SELECT id FROM parking_spots
+        WHERE facility_id = p_facility_id
+          AND spot_type = p_spot_type
+          AND is_active AND NOT is_occupied AND NOT is_reserved
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$;
+
+
 -- =============================================================================
 -- SEED DATA (Optional)
 -- =============================================================================
@@ -5,6 +5,7 @@ Mocks the Supabase client so tests run without a real database.
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -28,15 +29,56 @@ def make_chainable_mock(return_data=None):
     mock.neq.return_value = mock
     mock.order.return_value = mock
     mock.limit.return_value = mock
+    mock.range.return_value = mock
     mock.in_.return_value = mock
+    mock.or_.return_value = mock
+    mock.is_.return_value = mock
     mock.gte.return_value = mock
     mock.lte.return_value = mock
+    mock.lt.return_value = mock
     resp = MagicMock()
     resp.data = return_data if return_data is not None else []
+    resp.count = len(resp.data)
     mock.execute.return_value = resp
     return mock
 
 
+class FakeRedis:
+    """In-memory stand-in for the few Redis commands the app uses, so tests
+    can exercise the REDIS_URL code paths (shared by every worker)."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
 # Patch create_client BEFORE importing app so routes get registered on the app
 _mock_supabase_client = MagicMock()
 _mock_supabase_client.table.return_value = make_chainable_mock()
@@ -76,6 +118,13 @@ def _patch_supabase():
     _mock_supabase_client.table.return_value = make_chainable_mock()
     _mock_supabase_client.table.side_effect = None
     _mock_supabase_client.auth.reset_mock()
+    _mock_supabase_client.rpc.reset_mock(return_value=True, side_effect=True)
+
+    # Auth lookups are cached per token; start every test cold
+    import routes_common
+
+    routes_common._auth_cache.clear()
+    routes_common._response_cache.clear()
 
     # Patch supabase in all route modules
     patches = []
@@ -85,8 +134,16 @@ def _patch_supabase():
             p.start()
             patches.append(p)
 
+    # Background tasks get a per-test executor, drained at teardown so a
+    # late task can't touch the mock while the next test is running
+    executor = ThreadPoolExecutor(max_workers=4)
+    p = patch("routes_common._executor", executor)
+    p.start()
+    patches.append(p)
+
     yield
 
+    executor.shutdown(wait=True)
     for p in patches:
         p.stop()
 
@@ -97,6 +154,60 @@ def mock_supabase():
     return _mock_supabase_client
 
 
+ROLE_ROWS = {
+    "admin": {
+        "id": 1,
+        "email": "admin@test.com",
+        "role": "admin",
+        "auth_user_id": "admin-uuid",
+        "is_active": True,
+    },
+    "user": {
+        "id": 5,
+        "email": "user@test.com",
+        "role": "user",
+        "auth_user_id": "user-uuid",
+        "is_active": True,
+    },
+}
+
+
+@pytest.fixture()
+def as_role(mock_supabase):
+    """Sign requests in as `role`; returns the Authorization headers to send.
+
+    Positional `tables` are handed out in order after the users lookup;
+    keyword tables are routed by name, the users table returning the row.
+    With neither, every table() call returns the users row.
+    """
+
+    def setup(role, *tables, **named):
+        row = ROLE_ROWS[role]
+        mock_supabase.auth.get_user.return_value = MagicMock(
+            user=MagicMock(id=row["auth_user_id"])
+        )
+        if named:
+            named.setdefault("users", make_chainable_mock([row]))
+            mock_supabase.table.side_effect = lambda name: named.get(
+                name, make_chainable_mock()
+            )
+        elif tables:
+            mock_supabase.table.side_effect = [make_chainable_mock([row]), *tables]
+        else:
+            mock_supabase.table.return_value = make_chainable_mock([row])
+        return {"Authorization": f"Bearer h.{role}-token.sig"}
+
+    return setup
+
+
+@pytest.fixture()
+def fake_redis():
+    """Run the test as if REDIS_URL were set."""
+    fake = FakeRedis()
+    with patch("routes_common._redis", fake):
+        yield fake
+
+
 @pytest.fixture()
 def client():
     """Flask test client."""
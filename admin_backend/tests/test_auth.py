@@ -3,6 +3,8 @@
 import json
 from unittest.mock import MagicMock, patch
 
+from tests.conftest import make_chainable_mock
+
 
 def test_signup_missing_email(client):
     """Signup without email should return 400."""
@@ -147,3 +149,144 @@ def test_protected_endpoint_no_token(client):
     resp = client.get("/api/auth/me")
     assert resp.status_code == 401
     assert b"No authorization token" in resp.data
+
+
+def _mock_profile_lookup(mock_supabase):
+    """Mock a valid token whose users row (and wallet) resolve."""
+    mock_user = MagicMock()
+    mock_user.id = "auth-uuid-123"
+    mock_auth_resp = MagicMock()
+    mock_auth_resp.user = mock_user
+    mock_supabase.auth.get_user.return_value = mock_auth_resp
+
+    table_mock = MagicMock()
+    table_mock.select.return_value = table_mock
+    table_mock.eq.return_value = table_mock
+    table_mock.limit.return_value = table_mock
+    table_mock.execute.return_value = MagicMock(
+        data=[
+            {
+                "id": 1,
+                "email": "test@test.com",
+                "role": "user",
+                "is_active": True,
+                "created_at": "2026-01-01T00:00:00+00:00",
+                "user_wallets": {"balance": 500},
+            }
+        ]
+    )
+    mock_supabase.table.return_value = table_mock
+
+
+def test_auth_lookup_cached_per_token(client, mock_supabase, fake_redis):
+    """Repeat requests with the same token should verify it only once."""
+    _mock_profile_lookup(mock_supabase)
+
+    for _ in range(3):
+        resp = client.get(
+            "/api/auth/me", headers={"Authorization": "Bearer h.tok-a.sig"}
+        )
+        assert resp.status_code == 200
+        assert json.loads(resp.data)["user"]["wallet_balance"] == 500
+
+    assert mock_supabase.auth.get_user.call_count == 1
+    # users row (with embedded wallet) fetched once, no separate wallet query
+    assert mock_supabase.table.call_count == 1
+
+
+def test_auth_row_reread_without_redis(client, mock_supabase):
+    """Without Redis the token stays verified but the users row is re-read,
+    since another worker may have changed it."""
+    _mock_profile_lookup(mock_supabase)
+
+    for _ in range(2):
+        client.get("/api/auth/me", headers={"Authorization": "Bearer h.tok-a.sig"})
+
+    assert mock_supabase.auth.get_user.call_count == 1
+    assert mock_supabase.table.call_count == 2
+
+
+def test_auth_row_change_seen_by_every_worker(client, mock_supabase, fake_redis):
+    """A change made through another worker bumps the row's generation in
+    Redis, so the cached role and wallet here are re-read at once."""
+    import routes_common
+
+    _mock_profile_lookup(mock_supabase)
+    client.get("/api/auth/me", headers={"Authorization": "Bearer h.tok-a.sig"})
+
+    # Another worker's invalidate_cached_user(): only Redis is shared
+    fake_redis.incr(routes_common._user_generation_key(1))
+    mock_supabase.table.return_value.execute.return_value.data[0]["role"] = "admin"
+
+    resp = client.get("/api/auth/me", headers={"Authorization": "Bearer h.tok-a.sig"})
+    assert json.loads(resp.data)["user"]["role"] == "admin"
+    assert mock_supabase.table.call_count == 2
+    assert mock_supabase.auth.get_user.call_count == 1
+
+
+def test_auth_cache_not_shared_between_tokens(client, mock_supabase):
+    """A different token must be verified on its own."""
+    _mock_profile_lookup(mock_supabase)
+
+    client.get("/api/auth/me", headers={"Authorization": "Bearer h.tok-a.sig"})
+    client.get("/api/auth/me", headers={"Authorization": "Bearer h.tok-b.sig"})
+
+    assert mock_supabase.auth.get_user.call_count == 2
+
+
+def test_hs256_token_verified_locally(client, mock_supabase):
+    """With SUPABASE_JWT_SECRET set, a valid token skips auth.get_user."""
+    import time
+
+    import jwt
+
+    SECRET = "test-secret-at-least-32-bytes-long"
+    _mock_profile_lookup(mock_supabase)
+    token = jwt.encode(
+        {"sub": "auth-uuid-123", "aud": "authenticated", "exp": time.time() + 60},
+        SECRET,
+        algorithm="HS256",
+    )
+    with patch("routes_common.SUPABASE_JWT_SECRET", SECRET):
+        resp = client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+        bad = jwt.encode(
+            {"sub": "x", "aud": "authenticated", "exp": time.time() - 60},
+            SECRET,
+            algorithm="HS256",
+        )
+        expired = client.get("/api/auth/me", headers={"Authorization": f"Bearer {bad}"})
+
+    assert resp.status_code == 200
+    assert expired.status_code == 401
+    mock_supabase.auth.get_user.assert_not_called()
+    table = mock_supabase.table.return_value
+    table.eq.assert_called_with("auth_user_id", "auth-uuid-123")
+
+
+def test_malformed_token_rejected_without_lookup(client, mock_supabase):
+    """A token that isn't JWT-shaped should 401 without calling Supabase."""
+    resp = client.get("/api/auth/me", headers={"Authorization": "Bearer garbage"})
+    assert resp.status_code == 401
+    mock_supabase.auth.get_user.assert_not_called()
+
+
+def test_login_primes_auth_cache(client, mock_supabase, fake_redis):
+    """The first request with a fresh login token needs no user lookups."""
+    mock_user = MagicMock(id="auth-uuid-123", email="test@test.com")
+    mock_session = MagicMock(access_token="h.fresh.sig", refresh_token="r")
+    mock_supabase.auth.sign_in_with_password.return_value = MagicMock(
+        user=mock_user, session=mock_session
+    )
+    row = {"id": 1, "email": "test@test.com", "role": "user", "is_active": True}
+    row["created_at"] = "2026-01-01T00:00:00"
+    mock_supabase.table.return_value = make_chainable_mock([row])
+
+    client.post(
+        "/api/auth/login", json={"email": "test@test.com", "password": "test123456"}
+    )
+    mock_supabase.table.reset_mock()
+
+    resp = client.get("/api/auth/me", headers={"Authorization": "Bearer h.fresh.sig"})
+    assert resp.status_code == 200
+    mock_supabase.auth.get_user.assert_not_called()
+    mock_supabase.table.assert_not_called()
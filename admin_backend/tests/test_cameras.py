@@ -0,0 +1,20 @@
+"""Tests for camera management endpoints."""
+
+import json
+
+from tests.conftest import make_chainable_mock
+
+
+def test_get_cameras_cached_until_camera_deleted(client, as_role, fake_redis):
+    """The camera list is served from cache until a camera is removed."""
+    listing = make_chainable_mock([{"id": 3, "facility_id": 7}])
+    auth = as_role("admin", cameras=listing)
+
+    for _ in range(2):
+        resp = client.get("/api/cameras?facility_id=7", headers=auth)
+        assert json.loads(resp.data)["cameras"] == [{"id": 3, "facility_id": 7}]
+    assert listing.execute.call_count == 1
+
+    client.delete("/api/cameras/3", headers=auth)
+    client.get("/api/cameras?facility_id=7", headers=auth)
+    assert listing.execute.call_count == 3  # delete + fresh listing
@@ -0,0 +1,206 @@
+"""Tests for the legacy v1 endpoint aliases."""
+
+import json
+from unittest.mock import MagicMock
+
+from routes_common import encode_cursor
+from tests.conftest import make_chainable_mock
+
+
+def test_default_facility_resolved_once(client, as_role, fake_redis):
+    """With Redis the v1 default facility id is looked up once and shared."""
+    import routes_common
+
+    facilities = make_chainable_mock([{"id": 7}])
+    spots = make_chainable_mock([{"id": 1, "spot_name": "A-01", "is_occupied": False}])
+    auth = as_role("user", facilities=facilities, parking_spots=spots)
+
+    resp = client.get("/api/spots", headers=auth)
+    assert json.loads(resp.data)["spots"][0]["name"] == "A-01"
+    assert routes_common.default_facility_id() == 7
+    assert facilities.execute.call_count == 1
+    spots.eq.assert_called_with("facility_id", 7)
+
+
+def test_default_facility_not_cached_per_worker(mock_supabase):
+    """Without Redis a deleted facility must not linger in other workers."""
+    import routes_common
+
+    facilities = make_chainable_mock([{"id": 7}])
+    mock_supabase.table.return_value = facilities
+
+    for _ in range(2):
+        assert routes_common.default_facility_id() == 7
+    assert facilities.execute.call_count == 2
+
+
+def test_init_spots_single_rpc(client, mock_supabase):
+    """With the SQL function deployed, cold init is one RPC call."""
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=32)
+
+    resp = client.post("/api/init-spots")
+    assert resp.status_code == 201
+    mock_supabase.rpc.assert_called_once_with(
+        "ensure_default_facility_and_spots", {"p_hourly_rate": 150}
+    )
+    mock_supabase.table.assert_not_called()
+
+
+def test_init_spots_already_initialized(client, mock_supabase):
+    """Zero spots created means the facility already had spots."""
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=0)
+
+    resp = client.post("/api/init-spots")
+    assert resp.status_code == 400
+
+
+def test_init_spots_fallback_creates_facility(client, mock_supabase):
+    """Without the function, an empty database gets a facility and 32 spots."""
+    from postgrest import APIError
+
+    mock_supabase.rpc.return_value.execute.side_effect = APIError(
+        {"code": "PGRST202", "message": "not found"}
+    )
+    lookup = make_chainable_mock([])
+    created = make_chainable_mock([{"id": 9}])
+    spots = make_chainable_mock([])
+    mock_supabase.table.side_effect = [lookup, created, spots]
+
+    resp = client.post("/api/init-spots")
+    assert resp.status_code == 201
+    rows = spots.insert.call_args.args[0]
+    assert len(rows) == 32 and rows[0] == {
+        "facility_id": 9,
+        "spot_name": "A-01",
+        "is_occupied": False,
+    }
+
+
+def test_reset_system_single_rpc(client, mock_supabase):
+    """The legacy reset runs reset_facility() for every facility at once."""
+    resp = client.post("/api/reset-system")
+    assert resp.status_code == 200
+    mock_supabase.rpc.assert_called_once_with("reset_facility", {"p_facility_id": None})
+    mock_supabase.table.assert_not_called()
+
+
+def test_reset_system_fallback_filters(client, mock_supabase):
+    """Without reset_facility(), only held spots are rewritten."""
+    from postgrest import APIError
+
+    mock_supabase.rpc.return_value.execute.side_effect = APIError(
+        {"code": "PGRST202", "message": "not found"}
+    )
+    sessions, reservations, spots = (make_chainable_mock([]) for _ in range(3))
+    mock_supabase.table.side_effect = [sessions, reservations, spots]
+
+    resp = client.post("/api/reset-system")
+    assert resp.status_code == 200
+    spots.or_.assert_called_once_with("is_occupied.eq.true,is_reserved.eq.true")
+    spots.neq.assert_not_called()
+    sessions.neq.assert_called_once_with("id", 0)
+
+
+def test_vehicle_entry_compat_fills_default_facility(client, mock_supabase):
+    """The v1 entry alias forwards its body with the default facility added."""
+    mock_supabase.table.side_effect = [make_chainable_mock([{"id": 7}])]
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(
+        data={"status": 403, "message": "Unregistered"}
+    )
+
+    resp = client.post("/api/vehicle/entry", json={"plate_number": "cab-1234"})
+    assert resp.status_code == 403
+    mock_supabase.rpc.assert_called_once_with(
+        "process_vehicle_entry",
+        {"p_plate": "CAB-1234", "p_facility_id": 7, "p_entry_method": "lpr"},
+    )
+
+
+def test_legacy_spots_cached_until_spots_change(client, as_role):
+    """GET /api/spots is served from cache until spot state changes."""
+    spots = make_chainable_mock([{"id": 1, "spot_name": "A-01", "is_occupied": True}])
+    auth = as_role(
+        "user", facilities=make_chainable_mock([{"id": 7}]), parking_spots=spots
+    )
+
+    client.get("/api/spots", headers=auth)
+    client.get("/api/spots", headers=auth)
+    assert spots.execute.call_count == 1
+
+    client.post("/api/reset-system")
+    client.get("/api/spots", headers=auth)
+    assert spots.execute.call_count == 2
+
+
+def test_logs_select_v1_fields_only(client, as_role):
+    """/api/logs asks PostgREST for the v1 field names directly."""
+    row = {"id": 1, "plate_number": "CAB-1234", "spot": "A-01", "amount_lkr": 150}
+    sessions = make_chainable_mock([row])
+    auth = as_role(
+        "user",
+        facilities=make_chainable_mock([{"id": 7}]),
+        parking_sessions=sessions,
+    )
+
+    resp = client.get("/api/logs", headers=auth)
+    assert json.loads(resp.data) == {"logs": [row]}
+    columns = sessions.select.call_args.args[0]
+    assert "spot:spot_name" in columns and "*" not in columns
+    assert "facility:facilities(name)" in columns
+
+
+def test_detection_logs_keyset_page(client, as_role):
+    """/api/detection-logs seeks past the cursor instead of re-reading from the top."""
+    rows = [
+        {"id": 2, "detected_at": "2026-01-02"},
+        {"id": 1, "detected_at": "2026-01-01"},
+    ]
+    logs = make_chainable_mock(rows)
+    auth = as_role("user", detection_logs=logs)
+
+    cursor = encode_cursor("2026-01-03T00:00:00", 9)
+    resp = client.get(f"/api/detection-logs?limit=2&cursor={cursor}", headers=auth)
+    data = json.loads(resp.data)
+    assert data == {"logs": rows, "next_cursor": encode_cursor("2026-01-01", 1)}
+    logs.or_.assert_called_once_with(
+        "detected_at.lt.2026-01-03T00:00:00,"
+        "and(detected_at.eq.2026-01-03T00:00:00,id.lt.9)"
+    )
+    logs.limit.assert_called_once_with(2)
+
+
+def test_logs_cached_until_exit(client, mock_supabase, as_role):
+    """/api/logs is served from cache until a vehicle leaves."""
+    sessions = make_chainable_mock([{"id": 1}])
+    auth = as_role(
+        "user",
+        facilities=make_chainable_mock([{"id": 7}]),
+        parking_sessions=sessions,
+    )
+    mock_supabase.rpc.return_value.execute.return_value.data = {
+        "status": 200,
+        "user_id": None,
+        "payment_status": "pending",
+    }
+
+    client.get("/api/logs", headers=auth)
+    client.get("/api/logs", headers=auth)
+    assert sessions.execute.call_count == 1
+
+    client.post("/api/vehicle/exit", json={"plate_number": "CAB-1234"})
+    client.get("/api/logs", headers=auth)
+    assert sessions.execute.call_count == 2
+
+
+def test_detection_logs_page_shared_briefly(client, as_role):
+    """Repeated polls of the same detection-log page reuse one query."""
+    logs = make_chainable_mock([{"id": 1, "detected_at": "2026-01-01"}])
+    auth = as_role("user", detection_logs=logs)
+
+    first = client.get("/api/detection-logs", headers=auth)
+    client.get("/api/detection-logs", headers=auth)
+    assert logs.execute.call_count == 1
+    assert first.headers["Cache-Control"] == "private, max-age=3"
+
+    client.get("/api/detection-logs?limit=10", headers=auth)
+    assert logs.execute.call_count == 2
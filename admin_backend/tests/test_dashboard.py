@@ -0,0 +1,72 @@
+"""Tests for dashboard analytics endpoints."""
+
+import json
+from unittest.mock import MagicMock
+
+from postgrest import APIError
+
+from tests.conftest import make_chainable_mock
+
+
+def test_dashboard_stats_single_rpc(client, mock_supabase, as_role):
+    """With dashboard_stats() deployed the endpoint is one RPC call."""
+    auth = as_role("admin")
+    stats = {
+        "spots": {"total": 10, "occupied": 4, "reserved": 2, "available": 4},
+        "today": {
+            "entries": 3,
+            "revenue": 450,
+            "active_sessions": 4,
+            "reservations": 1,
+        },
+        "system": {"total_users": 20, "total_vehicles": 25},
+    }
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=stats)
+
+    resp = client.get("/api/dashboard/stats?facility_id=7", headers=auth)
+    assert resp.status_code == 200
+    assert json.loads(resp.data) == stats
+    mock_supabase.rpc.assert_called_once_with("dashboard_stats", {"p_facility_id": 7})
+    tables = [c.args[0] for c in mock_supabase.table.call_args_list]
+    assert tables == ["users"]  # only the admin lookup
+
+
+def test_dashboard_stats_fallback_spot_counts(client, mock_supabase, as_role):
+    """Without the RPC, spot totals still come from the aggregate function."""
+    auth = as_role("admin")
+    occupancy = MagicMock(
+        data=[{"facility_id": 7, "total": 10, "occupied": 4, "reserved": 2}]
+    )
+
+    def rpc(name, params):
+        call = MagicMock()
+        if name == "dashboard_stats":
+            call.execute.side_effect = APIError(
+                {"code": "PGRST202", "message": "not found"}
+            )
+        else:
+            call.execute.return_value = occupancy
+        return call
+
+    mock_supabase.rpc.side_effect = rpc
+
+    resp = client.get("/api/dashboard/stats?facility_id=7", headers=auth)
+    assert resp.status_code == 200
+    spots = json.loads(resp.data)["spots"]
+    assert spots == {"total": 10, "occupied": 4, "reserved": 2, "available": 4}
+    mock_supabase.rpc.assert_called_with("facility_occupancy", {"p_facility_id": 7})
+    tables = [c.args[0] for c in mock_supabase.table.call_args_list]
+    assert "parking_spots" not in tables
+
+
+def test_recent_activity_filters_both_feeds(client, as_role):
+    """Sessions and detections are fetched together, both facility-filtered."""
+    sessions = make_chainable_mock([{"id": 1}])
+    detections = make_chainable_mock([{"id": 2}])
+    auth = as_role("admin", parking_sessions=sessions, detection_logs=detections)
+
+    resp = client.get("/api/dashboard/recent-activity?facility_id=7", headers=auth)
+    data = json.loads(resp.data)
+    assert data == {"recent_sessions": [{"id": 1}], "recent_detections": [{"id": 2}]}
+    sessions.eq.assert_called_with("facility_id", 7)
+    detections.eq.assert_called_with("facility_id", 7)
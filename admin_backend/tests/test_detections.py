@@ -0,0 +1,129 @@
+"""Tests for LPR detection log endpoints."""
+
+import json
+from unittest.mock import MagicMock
+
+from postgrest import APIError
+
+from routes_common import encode_cursor
+from tests.conftest import make_chainable_mock
+
+
+def test_add_detection_single_rpc(client, mock_supabase):
+    """A detection is flagged and logged by one log_detection() call."""
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(
+        data=[{"id": 11, "is_registered": True}]
+    )
+
+    resp = client.post(
+        "/api/detections",
+        json={"camera_id": "cam-1", "plate_number": " cab-1234 ", "confidence": 0.9},
+    )
+    assert resp.status_code == 201
+    assert json.loads(resp.data)["id"] == 11
+    assert json.loads(resp.data)["is_registered"] is True
+    name, params = mock_supabase.rpc.call_args.args
+    assert name == "log_detection" and params["p_plate"] == "CAB-1234"
+    mock_supabase.table.assert_not_called()
+
+
+def test_add_detection_fallback_unregistered(client, mock_supabase):
+    """Without the function, an unknown plate is looked up then inserted."""
+    mock_supabase.rpc.return_value.execute.side_effect = APIError(
+        {"code": "PGRST202", "message": "not found"}
+    )
+    logs = make_chainable_mock([{"id": 12}])
+    mock_supabase.table.side_effect = [make_chainable_mock([]), logs]
+
+    resp = client.post(
+        "/api/detections", json={"camera_id": "cam-1", "plate_number": "XYZ-9"}
+    )
+    assert resp.status_code == 201
+    assert json.loads(resp.data) == {
+        "message": "Detection logged",
+        "id": 12,
+        "is_registered": False,
+    }
+    row = logs.insert.call_args.args[0]
+    assert row["vehicle_id"] is None
+    assert "detected_at" not in row  # stamped by the column default
+
+
+def test_get_detections_keyset_page(client, as_role):
+    """?cursor= continues below the last detected_at instead of offsetting."""
+    page = [{"id": 5, "detected_at": "2026-01-02T00:00:00"}]
+    logs = make_chainable_mock(page)
+    auth = as_role("admin", logs)
+
+    cursor = encode_cursor("2026-01-03T00:00:00", 9)
+    resp = client.get(f"/api/detections?limit=1&cursor={cursor}", headers=auth)
+    next_cursor = json.loads(resp.data)["next_cursor"]
+    assert next_cursor == encode_cursor("2026-01-02T00:00:00", 5)
+    logs.or_.assert_called_once_with(
+        "detected_at.lt.2026-01-03T00:00:00,"
+        "and(detected_at.eq.2026-01-03T00:00:00,id.lt.9)"
+    )
+    assert [c.args[0] for c in logs.order.call_args_list] == ["detected_at", "id"]
+
+
+def test_get_detections_rejects_bad_cursor(client, as_role):
+    """A cursor that was not issued by the API is a 400, not a server error."""
+    logs = make_chainable_mock([])
+    auth = as_role("admin", detection_logs=logs)
+
+    for cursor in ("2026-01-03", encode_cursor("not-a-date", 1), encode_cursor(5, 1)):
+        resp = client.get(f"/api/detections?cursor={cursor}", headers=auth)
+        assert resp.status_code == 400
+        assert json.loads(resp.data) == {"message": "Invalid cursor"}
+    logs.execute.assert_not_called()
+
+
+def test_cursor_accepts_utc_z_suffix():
+    """Supabase timestamps end in "Z", which fromisoformat() rejects before 3.11."""
+    from routes_common import _decode_cursor
+
+    cursor = encode_cursor("2026-01-03T00:00:00Z", 9)
+    assert _decode_cursor(cursor) == ("2026-01-03T00:00:00+00:00", 9)
+
+
+def test_add_detection_batch_one_lookup_one_insert(client, mock_supabase):
+    """An array body is logged with a single lookup and a single insert."""
+    vehicles = make_chainable_mock([{"id": 4, "plate_number": "CAB-1234"}])
+    logs = make_chainable_mock(
+        [{"id": 21, "is_registered": True}, {"id": 22, "is_registered": False}]
+    )
+    mock_supabase.table.side_effect = [vehicles, logs]
+
+    resp = client.post(
+        "/api/detections",
+        json=[
+            {"camera_id": "cam-1", "plate_number": "cab-1234"},
+            {"camera_id": "cam-1", "plate_number": "XYZ-9", "detected_at": "T1"},
+        ],
+    )
+    assert resp.status_code == 201
+    assert [d["id"] for d in json.loads(resp.data)["detections"]] == [21, 22]
+    rows = logs.insert.call_args.args[0]
+    assert [r["vehicle_id"] for r in rows] == [4, None]
+    assert rows[1]["detected_at"] == "T1"
+    mock_supabase.rpc.assert_not_called()
+
+
+def test_add_detection_batch_rejects_bad_item(client, mock_supabase):
+    """One invalid item rejects the whole batch before any write."""
+    resp = client.post("/api/detections", json=[{"camera_id": "cam-1"}])
+    assert resp.status_code == 400
+    mock_supabase.table.assert_not_called()
+
+
+def test_update_detection_action_missing_log(client, as_role):
+    """The PATCH is a single UPDATE; no matched row means 404."""
+    logs = make_chainable_mock([])
+    auth = as_role("admin", logs)
+
+    resp = client.patch(
+        "/api/detections/99/action", json={"action": "ignored"}, headers=auth
+    )
+    assert resp.status_code == 404
+    logs.update.assert_called_once_with({"action_taken": "ignored"})
+    logs.select.assert_not_called()
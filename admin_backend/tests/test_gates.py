@@ -0,0 +1,17 @@
+"""Tests for gate management endpoints."""
+
+import json
+
+from tests.conftest import make_chainable_mock
+
+
+def test_get_gates_not_cached_per_worker(client, as_role):
+    """Without Redis gate status is read live: an operator may have just
+    opened the gate through another worker."""
+    gates = make_chainable_mock([{"id": 1, "status": "closed"}])
+    auth = as_role("admin", gates=gates)
+
+    client.get("/api/gates", headers=auth)
+    gates.execute.return_value.data = [{"id": 1, "status": "open"}]
+    resp = client.get("/api/gates", headers=auth)
+    assert json.loads(resp.data)["gates"] == [{"id": 1, "status": "open"}]
@@ -0,0 +1,103 @@
+"""Tests for reservation endpoints."""
+
+import json
+from unittest.mock import MagicMock
+
+from postgrest import APIError
+
+from tests.conftest import make_chainable_mock
+
+SPOT = {"id": 12, "spot_name": "A-12", "is_reserved": True}
+BODY = {
+    "vehicle_id": 3,
+    "facility_id": 1,
+    "reserved_start": "2025-01-01T10:00:00Z",
+    "reserved_end": "2025-01-01T12:00:00Z",
+}
+
+
+def _post(client, auth):
+    return client.post(
+        "/api/reservations",
+        data=json.dumps(BODY),
+        content_type="application/json",
+        headers=auth,
+    )
+
+
+def test_create_reservation_allocates_via_rpc(client, mock_supabase, as_role):
+    """The spot should be claimed by allocate_spot() in one call."""
+    reservation = make_chainable_mock([{"id": 99, **BODY}])
+    auth = as_role(
+        "user",
+        make_chainable_mock([{"rate": 300}]),
+        reservation,
+        make_chainable_mock(),
+    )
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=[SPOT])
+
+    resp = _post(client, auth)
+    assert resp.status_code == 201
+    mock_supabase.rpc.assert_called_once_with(
+        "allocate_spot", {"p_facility_id": 1, "p_spot_type": "regular"}
+    )
+    row = reservation.insert.call_args.args[0]
+    assert row["spot_id"] == 12
+    assert row["amount"] == 300
+    assert len(row["qr_code"]) == 32
+
+
+def test_create_reservation_full_facility(client, mock_supabase, as_role):
+    """No free spot should be a 404 and no reservation row."""
+    auth = as_role("user", make_chainable_mock([]))
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=[])
+
+    resp = _post(client, auth)
+    assert resp.status_code == 404
+
+
+def test_create_reservation_fallback_retries_lost_race(client, mock_supabase, as_role):
+    """Without the RPC, a spot taken concurrently should not be double-booked."""
+    lost = make_chainable_mock([])
+    won = make_chainable_mock([SPOT])
+    auth = as_role(
+        "user",
+        make_chainable_mock([]),
+        make_chainable_mock([{"id": 11}]),
+        lost,
+        make_chainable_mock([{"id": 12}]),
+        won,
+        make_chainable_mock([{"id": 99}]),
+        make_chainable_mock(),
+    )
+    mock_supabase.rpc.return_value.execute.side_effect = APIError(
+        {"code": "PGRST202", "message": "not found"}
+    )
+
+    resp = _post(client, auth)
+    assert resp.status_code == 201
+    lost.eq.assert_any_call("is_reserved", False)
+    won.update.assert_called_once_with({"is_reserved": True})
+
+
+def test_cancel_reservation_drops_spot_state_cache(client, as_role):
+    """Freeing a reserved spot must not leave it shown as taken from cache."""
+    import routes_common
+
+    auth = as_role(
+        "admin",
+        reservations=make_chainable_mock(
+            [{"status": "confirmed", "spot_id": 12, "user_id": 5}]
+        ),
+    )
+    for key in routes_common.SPOT_STATE_CACHE_KEYS:
+        routes_common._cache_set(key, b"{}", 60)
+
+    resp = client.put(
+        "/api/reservations/7",
+        json={"action": "cancel"},
+        headers=auth,
+    )
+    assert resp.status_code == 200
+    for key in routes_common.SPOT_STATE_CACHE_KEYS:
+        assert routes_common._cache_get(key) is None
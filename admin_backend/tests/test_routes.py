@@ -46,3 +46,137 @@ def test_json_content_type(client, mock_supabase):
 
     resp = client.get("/api/facilities")
     assert resp.content_type == "application/json"
+
+
+def test_cors_preflight_is_cacheable(client):
+    """Preflight responses should let the browser cache them."""
+    resp = client.options(
+        "/api/facilities",
+        headers={
+            "Origin": "http://localhost:5173",
+            "Access-Control-Request-Method": "POST",
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.headers["Access-Control-Max-Age"] == "86400"
+    assert "POST" in resp.headers["Access-Control-Allow-Methods"]
+
+
+def test_json_provider_uses_orjson(client):
+    """jsonify should serialise through orjson, including datetimes and Decimals."""
+    from datetime import datetime
+    from decimal import Decimal
+
+    from flask import jsonify
+
+    app = client.application
+    with app.app_context():
+        resp = jsonify({"at": datetime(2024, 1, 2, 3, 4, 5), "amount": Decimal("1.50")})
+    data = json.loads(resp.data)
+    assert data == {"at": "2024-01-02T03:04:05+00:00", "amount": "1.50"}
+    assert type(app.json).__name__ == "ORJSONProvider"
+
+
+def test_supabase_client_created_lazily_once_per_process():
+    """get_supabase() builds one client; reset_supabase() forces a new one."""
+    from unittest.mock import MagicMock, patch
+
+    import supabase_client
+
+    with patch(
+        "supabase_client.create_client", side_effect=lambda *a, **k: MagicMock()
+    ) as cc:
+        supabase_client.reset_supabase()
+        first = supabase_client.get_supabase()
+        assert supabase_client.get_supabase() is first
+        supabase_client.reset_supabase()
+        assert supabase_client.get_supabase() is not first
+    assert cc.call_count == 2
+    supabase_client.reset_supabase()
+
+
+def test_notifications_are_queued_not_inline(mock_supabase):
+    """_create_notification should hand the insert to the background executor."""
+    from unittest.mock import patch
+
+    import routes_common
+
+    with patch("routes_common.run_in_background") as bg:
+        routes_common._create_notification(7, "Hi", "Hello", "system")
+    mock_supabase.table.assert_not_called()
+    fn, row = bg.call_args.args
+    assert fn is routes_common._insert_notification
+    assert row["user_id"] == 7 and row["type"] == "system"
+
+
+def test_lpr_status_reuses_one_client(client, as_role):
+    """Repeated LPR health checks should share one keep-alive client."""
+    from unittest.mock import MagicMock, patch
+
+    import routes_system
+    from routes_common import LPR_STATUS_CACHE_KEY, invalidate_cache
+
+    auth = as_role("admin")
+    lpr = MagicMock()
+    lpr.get.return_value = MagicMock(status_code=200, json=lambda: {"ok": True})
+
+    routes_system.reset_lpr_client()
+    with patch("routes_system.httpx.Client", return_value=lpr) as factory:
+        for _ in range(2):
+            # Skip the status cache so both requests reach the LPR client
+            invalidate_cache(LPR_STATUS_CACHE_KEY)
+            resp = client.get("/api/lpr/status", headers=auth)
+            assert json.loads(resp.data) == {"connected": True, "ok": True}
+    assert factory.call_count == 1
+    assert lpr.get.call_count == 2
+    lpr.get.assert_called_with("/api/health")
+    routes_system.reset_lpr_client()
+
+
+def test_lpr_status_shared_within_ttl(client, as_role):
+    """Polls inside the TTL window reuse one upstream check, failures included."""
+    from unittest.mock import MagicMock, patch
+
+    import httpx
+
+    auth = as_role("admin")
+    lpr = MagicMock()
+    lpr.get.side_effect = httpx.ConnectError("refused")
+
+    with patch("routes_system.get_lpr_client", return_value=lpr):
+        for _ in range(3):
+            resp = client.get("/api/lpr/status", headers=auth)
+            assert resp.status_code == 503
+            assert json.loads(resp.data)["connected"] is False
+    assert lpr.get.call_count == 1
+
+
+def test_supabase_warm_up_ignores_errors():
+    """A failed warm-up must not stop the worker from booting."""
+    from unittest.mock import patch
+
+    import supabase_client
+
+    with patch("supabase_client.get_supabase", side_effect=OSError("down")):
+        supabase_client.warm_up()
+
+
+def test_responses_report_process_time(client):
+    """Every response, errors included, carries the handler's wall-clock time."""
+    resp = client.get("/api/cameras")
+    assert resp.status_code == 401
+    assert float(resp.headers["X-Process-Time-Ms"]) >= 0
+
+
+def test_slow_supabase_call_logged(caplog):
+    """Round-trips over SUPABASE_SLOW_MS are logged as warnings."""
+    from unittest.mock import patch
+
+    import httpx
+    import supabase_client
+
+    request = httpx.Request("GET", "https://db.test/rest/v1/parking_spots")
+    supabase_client._start_timer(request)
+    with patch("supabase_client.SUPABASE_SLOW_MS", -1):
+        supabase_client._log_slow_call(httpx.Response(200, request=request))
+    assert "Slow Supabase call: GET /rest/v1/parking_spots" in caplog.text
@@ -0,0 +1,341 @@
+"""Tests for parking session endpoints (entry, exit, history)."""
+
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from postgrest import APIError
+
+from routes_common import encode_cursor
+from tests.conftest import make_chainable_mock
+
+NO_ENTRY_RPC = APIError({"code": "PGRST202", "message": "function not found"})
+
+
+def _tables(mock_supabase, data_by_table):
+    """Route each supabase.table(name) call to its own chainable mock."""
+    mocks = {name: make_chainable_mock(data) for name, data in data_by_table.items()}
+    mocks_default = make_chainable_mock([])
+    mock_supabase.table.side_effect = lambda name: mocks.get(name, mocks_default)
+    return mocks
+
+
+def test_entry_uses_rpc(client, mock_supabase):
+    """Entry is one process_vehicle_entry() call when the function exists."""
+    mock_supabase.rpc.return_value.execute.return_value.data = {
+        "status": 200,
+        "message": "Vehicle CAB-1234 parked at A-01",
+        "spot": "A-01",
+        "session_type": "walk_in",
+        "is_registered": True,
+        "gate_action": "open",
+        "session_id": 99,
+    }
+
+    resp = client.post(
+        "/api/sessions/entry",
+        data=json.dumps({"plate_number": "CAB-1234", "facility_id": 1}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    data = json.loads(resp.data)
+    assert data["spot"] == "A-01"
+    assert "status" not in data
+    mock_supabase.rpc.assert_called_once_with(
+        "process_vehicle_entry",
+        {"p_plate": "CAB-1234", "p_facility_id": 1, "p_entry_method": "lpr"},
+    )
+    mock_supabase.table.assert_not_called()
+
+
+def test_entry_rpc_status_passed_through(client, mock_supabase):
+    """A full facility reported by the RPC becomes a 404."""
+    mock_supabase.rpc.return_value.execute.return_value.data = {
+        "status": 404,
+        "message": "Parking is full!",
+        "gate_action": "deny",
+    }
+
+    resp = client.post(
+        "/api/sessions/entry",
+        data=json.dumps({"plate_number": "CAB-1234", "facility_id": 1}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 404
+    assert json.loads(resp.data)["gate_action"] == "deny"
+
+
+def test_entry_walk_in_assigns_free_spot(client, mock_supabase):
+    """Without the RPC, a walk-in gets the pre-fetched free spot."""
+    mock_supabase.rpc.side_effect = NO_ENTRY_RPC
+    mocks = _tables(
+        mock_supabase,
+        {
+            "parking_sessions": [],
+            "vehicles": [{"id": 7, "user_id": 3}],
+            "parking_spots": [{"id": 11, "spot_name": "A-01"}],
+            "reservations": [],
+            "subscriptions": [],
+        },
+    )
+    mocks["parking_sessions"].insert.return_value = make_chainable_mock([{"id": 99}])
+
+    resp = client.post(
+        "/api/sessions/entry",
+        data=json.dumps({"plate_number": "CAB-1234", "facility_id": 1}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    data = json.loads(resp.data)
+    assert data["spot"] == "A-01"
+    assert data["session_type"] == "walk_in"
+    assert data["gate_action"] == "open"
+    mocks["parking_spots"].update.assert_called_once_with(
+        {"is_occupied": True, "is_reserved": False}
+    )
+
+
+def test_entry_unregistered_vehicle_denied(client, mock_supabase):
+    """An unknown plate is denied and asked to register."""
+    mock_supabase.rpc.side_effect = NO_ENTRY_RPC
+    _tables(mock_supabase, {"parking_sessions": [], "vehicles": []})
+
+    resp = client.post(
+        "/api/sessions/entry",
+        data=json.dumps({"plate_number": "XYZ-0000", "facility_id": 1}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 403
+    assert json.loads(resp.data)["requires_registration"] is True
+
+
+def _rpcs(mock_supabase, **data_by_name):
+    """Answer the named RPCs with `data`; any other function is not deployed."""
+
+    def rpc(name, params):
+        call = MagicMock()
+        if name in data_by_name:
+            call.execute.return_value = MagicMock(data=data_by_name[name])
+        else:
+            call.execute.side_effect = NO_ENTRY_RPC
+        return call
+
+    mock_supabase.rpc.side_effect = rpc
+
+
+def test_exit_uses_rpc(client, mock_supabase):
+    """Exit is one process_vehicle_exit() call when the function exists."""
+    mock_supabase.rpc.return_value.execute.return_value.data = {
+        "status": 200,
+        "user_id": 3,
+        "message": "Spot A-01 is now free!",
+        "duration_minutes": 90,
+        "amount": 200,
+        "payment_status": "paid",
+        "gate_action": "open",
+    }
+
+    resp = client.post(
+        "/api/sessions/exit",
+        data=json.dumps({"plate_number": "cab-1234", "payment_method": "cash"}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    data = json.loads(resp.data)
+    assert data["amount"] == 200
+    assert "status" not in data and "user_id" not in data
+    mock_supabase.rpc.assert_called_once_with(
+        "process_vehicle_exit", {"p_plate": "CAB-1234", "p_payment_method": "cash"}
+    )
+    mock_supabase.table.assert_not_called()
+
+
+def test_exit_rpc_no_session(client, mock_supabase):
+    """An unknown plate reported by the RPC becomes a 404."""
+    mock_supabase.rpc.return_value.execute.return_value.data = {
+        "status": 404,
+        "message": "No active session for CAB-1234",
+    }
+
+    resp = client.post(
+        "/api/sessions/exit",
+        data=json.dumps({"plate_number": "CAB-1234"}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 404
+
+
+def _exit_session():
+    entry = datetime.now(timezone.utc) - timedelta(minutes=90)
+    return {
+        "id": 5,
+        "spot_id": 11,
+        "spot_name": "A-01",
+        "reservation_id": None,
+        "session_type": "walk_in",
+        "entry_time": entry.isoformat(),
+        "facilities": {"hourly_rate": 100},
+        "vehicles": {
+            "user_id": 3,
+            "users": {"user_wallets": {"id": 8, "balance": 1000}},
+        },
+    }
+
+
+def test_exit_pays_from_embedded_wallet(client, mock_supabase):
+    """Exit uses the embedded rate and wallet and records a wallet payment."""
+    session = _exit_session()
+    mocks = _tables(mock_supabase, {"parking_sessions": [session]})
+    _rpcs(mock_supabase, charge_wallet=800)
+
+    resp = client.post(
+        "/api/sessions/exit",
+        data=json.dumps({"plate_number": "CAB-1234"}),
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    data = json.loads(resp.data)
+    assert data["amount"] == 200
+    assert data["payment_status"] == "paid"
+    update = mocks["parking_sessions"].update.call_args.args[0]
+    assert update["payment_status"] == "paid"
+    called = [c.args[0] for c in mock_supabase.table.call_args_list]
+    assert "facilities" not in called and "vehicles" not in called
+    assert "user_wallets" not in called and "payments" not in called
+    name, params = mock_supabase.rpc.call_args.args
+    assert name == "charge_wallet"
+    assert params["p_user_id"] == 3 and params["p_amount"] == 200
+
+
+def test_exit_wallet_charge_declined(client, mock_supabase):
+    """If the atomic charge finds too little balance, the fee stays pending."""
+    mocks = _tables(mock_supabase, {"parking_sessions": [_exit_session()]})
+    _rpcs(mock_supabase, charge_wallet=None)
+
+    resp = client.post(
+        "/api/sessions/exit",
+        data=json.dumps({"plate_number": "CAB-1234"}),
+        content_type="application/json",
+    )
+    assert json.loads(resp.data)["payment_status"] == "pending"
+    update = mocks["parking_sessions"].update.call_args.args[0]
+    assert update["payment_status"] == "pending"
+
+
+def test_exit_wallet_fallback_compare_and_set(client, mock_supabase):
+    """Without charge_wallet(), the debit only applies to the balance read."""
+    mocks = _tables(
+        mock_supabase,
+        {
+            "parking_sessions": [_exit_session()],
+            "user_wallets": [{"id": 8, "balance": 1000}],
+        },
+    )
+    mock_supabase.rpc.return_value.execute.side_effect = NO_ENTRY_RPC
+
+    resp = client.post(
+        "/api/sessions/exit",
+        data=json.dumps({"plate_number": "CAB-1234"}),
+        content_type="application/json",
+    )
+    assert json.loads(resp.data)["payment_status"] == "paid"
+    wallets = mocks["user_wallets"]
+    wallets.update.assert_called_once_with({"balance": 800})
+    wallets.eq.assert_any_call("balance", 1000)
+
+
+def test_get_sessions_user_single_query_with_cursor(client, mock_supabase, as_role):
+    """A user's history is one joined query, paged by entry_time."""
+    query = make_chainable_mock(
+        [
+            {"id": 2, "entry_time": "2026-01-02T09:00:00"},
+            {"id": 1, "entry_time": "2026-01-02T09:00:00"},
+        ]
+    )
+    auth = as_role("user", parking_sessions=query)
+
+    cursor = encode_cursor("2026-01-02T09:00:00", 3)
+    resp = client.get(f"/api/sessions?limit=2&cursor={cursor}", headers=auth)
+    assert resp.status_code == 200
+    data = json.loads(resp.data)
+    # Same entry_time on both rows: the id carries the page boundary
+    assert data["next_cursor"] == encode_cursor("2026-01-02T09:00:00", 1)
+    query.eq.assert_any_call("vehicles.user_id", 5)
+    query.or_.assert_called_once_with(
+        "entry_time.lt.2026-01-02T09:00:00,"
+        "and(entry_time.eq.2026-01-02T09:00:00,id.lt.3)"
+    )
+    assert "vehicles" not in [c.args[0] for c in mock_supabase.table.call_args_list]
+
+
+def test_entry_rejects_bad_input_before_rpc(client, mock_supabase):
+    """Malformed entry bodies get a 400 without any Supabase call."""
+    for body in (
+        {"plate_number": "CAB-1234", "facility_id": "abc"},
+        {"plate_number": 123, "facility_id": 1},
+        {"plate_number": "CAB-1234", "facility_id": 1, "entry_method": "teleport"},
+        ["not", "an", "object"],
+    ):
+        resp = client.post(
+            "/api/sessions/entry",
+            data=json.dumps(body),
+            content_type="application/json",
+        )
+        assert resp.status_code == 400
+    mock_supabase.rpc.assert_not_called()
+    mock_supabase.table.assert_not_called()
+
+
+def test_entry_accepts_numeric_string_facility_id(client, mock_supabase):
+    """A facility id sent as "1" is coerced to an integer."""
+    mock_supabase.rpc.return_value.execute.return_value.data = {"status": 200}
+
+    client.post(
+        "/api/sessions/entry",
+        data=json.dumps({"plate_number": "CAB-1234", "facility_id": "1"}),
+        content_type="application/json",
+    )
+    assert mock_supabase.rpc.call_args.args[1]["p_facility_id"] == 1
+
+
+def test_entry_normalises_plate(client, mock_supabase):
+    """Case and spacing variants of a plate reach the database identically."""
+    mock_supabase.rpc.return_value.execute.return_value.data = {"status": 200}
+
+    client.post(
+        "/api/sessions/entry",
+        data=json.dumps({"plate_number": " wp  cab - 1234", "facility_id": 1}),
+        content_type="application/json",
+    )
+    assert mock_supabase.rpc.call_args.args[1]["p_plate"] == "WP CAB-1234"
+
+
+def test_entry_fallback_lost_spot_race_takes_next(client, mock_supabase):
+    """If a concurrent entry claims the pre-fetched spot, the next one is used."""
+    from unittest.mock import MagicMock
+
+    mock_supabase.rpc.side_effect = NO_ENTRY_RPC
+    mocks = _tables(
+        mock_supabase,
+        {
+            "parking_sessions": [],
+            "vehicles": [{"id": 7, "user_id": 3}],
+            "parking_spots": [{"id": 11, "spot_name": "A-01"}],
+            "reservations": [],
+            "subscriptions": [],
+        },
+    )
+    spots = mocks["parking_spots"]
+    spots.execute.side_effect = [
+        MagicMock(data=[{"id": 11, "spot_name": "A-01"}]),  # pre-fetch
+        MagicMock(data=[]),  # claim of A-01 lost
+        MagicMock(data=[{"id": 12, "spot_name": "A-02"}]),  # next free
+        MagicMock(data=[{"id": 12, "spot_name": "A-02"}]),  # claimed
+    ]
+    mocks["parking_sessions"].insert.return_value = make_chainable_mock([{"id": 99}])
+
+    resp = client.post(
+        "/api/sessions/entry", json={"plate_number": "CAB-1234", "facility_id": 1}
+    )
+    assert json.loads(resp.data)["spot"] == "A-02"
+    spots.eq.assert_any_call("is_occupied", False)
@@ -0,0 +1,34 @@
+"""Tests for subscription endpoints."""
+
+import json
+
+from tests.conftest import make_chainable_mock
+
+
+def test_create_subscription_records_payment(client, mock_supabase, as_role):
+    """Buying a pass debits the wallet, creates the pass and records the payment."""
+    tables = {
+        "pricing_plans": make_chainable_mock(
+            [{"plan_type": "monthly", "rate": 100, "name": "Gold"}]
+        ),
+        "subscriptions": make_chainable_mock([{"id": 12}]),
+        "payments": make_chainable_mock([{"id": 1}]),
+    }
+    auth = as_role("user", **tables)
+    mock_supabase.rpc.return_value.execute.return_value.data = 900
+
+    resp = client.post(
+        "/api/subscriptions",
+        json={"facility_id": 1, "vehicle_id": 7, "plan_id": 3},
+        headers=auth,
+    )
+    assert resp.status_code == 201
+    assert json.loads(resp.data)["subscription"] == {"id": 12}
+    mock_supabase.rpc.assert_called_once_with(
+        "wallet_adjust", {"p_user_id": 5, "p_delta": -100, "p_require_min": 100}
+    )
+    columns = tables["pricing_plans"].select.call_args.args[0]
+    assert {"plan_type", "rate", "name"} <= set(columns.split(", "))
+    payment = tables["payments"].insert.call_args.args[0]
+    assert payment["description"] == "Monthly pass: Gold"
+    assert payment["subscription_id"] == 12
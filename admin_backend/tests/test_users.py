@@ -0,0 +1,99 @@
+"""Tests for admin user management endpoints."""
+
+import json
+
+from tests.conftest import make_chainable_mock
+
+
+def test_list_users_paginates(client, as_role):
+    """GET /api/admin/users should request one page and report next_page."""
+    query = make_chainable_mock([{"id": i} for i in range(10)])
+    auth = as_role("admin", query)
+
+    resp = client.get("/api/admin/users?page=2&page_size=10", headers=auth)
+    assert resp.status_code == 200
+    data = json.loads(resp.data)
+    assert len(data["users"]) == 10
+    assert data["next_page"] == 3
+    query.range.assert_called_once_with(10, 19)
+    assert [c.args[0] for c in query.order.call_args_list] == ["created_at", "id"]
+    assert "*" not in query.select.call_args.args[0]
+
+
+def test_list_users_last_page(client, as_role):
+    """A short page means there is nothing further to fetch."""
+    auth = as_role("admin", make_chainable_mock([{"id": 1}]))
+
+    resp = client.get("/api/admin/users", headers=auth)
+    assert json.loads(resp.data)["next_page"] is None
+
+
+def test_list_users_caps_page_size(client, as_role):
+    """page_size above the maximum should be clamped."""
+    query = make_chainable_mock([])
+    auth = as_role("admin", query)
+
+    client.get("/api/admin/users?page_size=5000", headers=auth)
+    query.range.assert_called_once_with(0, 199)
+
+
+def test_list_users_rejects_non_admin(client, as_role):
+    """A plain user should get 403 from an admin-only route."""
+    auth = as_role("user")
+
+    resp = client.get("/api/admin/users", headers=auth)
+    assert resp.status_code == 403
+
+
+def test_list_users_etag_revalidation(client, as_role):
+    """A matching If-None-Match should get an empty 304."""
+    auth = as_role("admin", make_chainable_mock([{"id": 1}]))
+    first = client.get("/api/admin/users", headers=auth)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, max-age=5"
+
+    as_role("admin", make_chainable_mock([{"id": 1}]))
+    resp = client.get("/api/admin/users", headers={**auth, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+
+def test_list_users_streams_all_pages(client, as_role):
+    """?all=1 should stream every page as one JSON document."""
+    from unittest.mock import patch
+
+    same_time = "2026-01-01T00:00:00"
+    pages = [
+        make_chainable_mock(
+            [{"id": 3, "created_at": same_time}, {"id": 2, "created_at": same_time}]
+        ),
+        make_chainable_mock([{"id": 1, "created_at": same_time}]),
+    ]
+    auth = as_role("admin", *pages)
+
+    with patch("routes_users.STREAM_PAGE_SIZE", 2):
+        resp = client.get("/api/admin/users?all=1", headers=auth)
+        data = json.loads(resp.get_data())
+
+    assert resp.mimetype == "application/json"
+    assert [u["id"] for u in data["users"]] == [3, 2, 1]
+    assert data["next_page"] is None
+    # The second page seeks past (created_at, id) of the last row, so a
+    # tie on created_at cannot repeat or skip a user
+    pages[1].or_.assert_called_once_with(
+        f"created_at.lt.{same_time},and(created_at.eq.{same_time},id.lt.2)"
+    )
+    assert [c.args[0] for c in pages[1].order.call_args_list] == ["created_at", "id"]
+    pages[1].range.assert_not_called()
+
+
+def test_list_users_response_compressed(client, as_role):
+    """Large JSON responses should be compressed when the client allows it."""
+    import gzip
+
+    page = [{"id": i, "email": f"user{i}@test.com"} for i in range(50)]
+    auth = as_role("admin", make_chainable_mock(page))
+
+    resp = client.get("/api/admin/users", headers={**auth, "Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(resp.data))["users"]) == 50
@@ -50,7 +50,7 @@ def test_register_vehicle_missing_plate(client, mock_supabase):
             "/api/vehicles",
             data=json.dumps({}),
             content_type="application/json",
-            headers={"Authorization": "Bearer test-token"},
+            headers={"Authorization": "Bearer h.test-token.sig"},
         )
     assert resp.status_code == 400
     assert b"plate_number is required" in resp.data
@@ -100,3 +100,57 @@ def test_lookup_vehicle_registered(client, mock_supabase):
     data = json.loads(resp.data)
     assert data["registered"] is True
     assert data["has_subscription"] is False
+
+
+def test_lookup_vehicle_cached_per_plate(client, mock_supabase, fake_redis):
+    """Repeat lookups for a plate should be served without touching Supabase."""
+    table_mock = MagicMock()
+    table_mock.select.return_value = table_mock
+    table_mock.eq.return_value = table_mock
+    table_mock.limit.return_value = table_mock
+    table_mock.execute.return_value = MagicMock(data=[])
+    mock_supabase.table.return_value = table_mock
+
+    first = client.get("/api/vehicles/lookup/WP-CACHED")
+    second = client.get("/api/vehicles/lookup/WP-CACHED")
+    assert first.data == second.data
+    assert mock_supabase.table.call_count == 1
+
+
+def test_deactivate_vehicle_invalidates_lookup(client, mock_supabase, fake_redis):
+    """Writing a vehicle should drop its cached plate lookup."""
+    import routes_common
+
+    routes_common._cache_set("vehicle:plate:WP CAB-1234", b"{}", 300)
+    _setup_auth(mock_supabase)
+    mock_supabase.table.return_value.update.return_value = MagicMock(
+        **{
+            "eq.return_value.execute.return_value": MagicMock(
+                data=[{"id": 1, "plate_number": "WP CAB-1234"}]
+            )
+        }
+    )
+
+    resp = client.delete(
+        "/api/vehicles/1", headers={"Authorization": "Bearer h.test-token.sig"}
+    )
+    assert resp.status_code == 200
+    assert routes_common._cache_get("vehicle:plate:WP CAB-1234") is None
+
+
+def test_lookup_sees_deactivation_on_every_worker(client, mock_supabase, as_role):
+    """Without Redis nothing is cached per worker, so a deactivated vehicle
+    stops resolving at once wherever the LPR request lands."""
+    from tests.conftest import make_chainable_mock
+
+    vehicle = {"id": 1, "plate_number": "WP CAB-1234", "users": None}
+    vehicles = make_chainable_mock([vehicle])
+    as_role("user", vehicles=vehicles)
+
+    resp = client.get("/api/vehicles/lookup/WP%20CAB-1234")
+    assert json.loads(resp.data)["registered"] is True
+
+    # Deactivated through another worker
+    vehicles.execute.return_value = MagicMock(data=[])
+    resp = client.get("/api/vehicles/lookup/WP%20CAB-1234")
+    assert json.loads(resp.data)["registered"] is False
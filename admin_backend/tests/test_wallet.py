@@ -0,0 +1,72 @@
+"""Tests for wallet and subscription payment endpoints."""
+
+import json
+from unittest.mock import MagicMock
+
+from tests.conftest import make_chainable_mock
+
+
+def test_topup_is_one_atomic_adjustment(client, mock_supabase, as_role):
+    """Top-up should credit via wallet_adjust() instead of read-then-write."""
+    auth = as_role("user")
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=1500)
+
+    resp = client.post(
+        "/api/wallet/topup",
+        data=json.dumps({"amount": 500}),
+        content_type="application/json",
+        headers=auth,
+    )
+    assert resp.status_code == 200
+    assert json.loads(resp.data)["new_balance"] == 1500
+    mock_supabase.rpc.assert_called_once_with(
+        "wallet_adjust", {"p_user_id": 5, "p_delta": 500, "p_require_min": 0}
+    )
+    tables = [c.args[0] for c in mock_supabase.table.call_args_list]
+    assert "user_wallets" not in tables
+
+
+def test_subscription_rejected_when_debit_fails(client, mock_supabase, as_role):
+    """A declined wallet debit means no subscription is created."""
+    plan = make_chainable_mock([{"id": 2, "plan_type": "monthly", "rate": 3000}])
+    auth = as_role("user", plan)
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=None)
+
+    resp = client.post(
+        "/api/subscriptions",
+        data=json.dumps({"facility_id": 1, "vehicle_id": 3, "plan_id": 2}),
+        content_type="application/json",
+        headers=auth,
+    )
+    assert resp.status_code == 400
+    mock_supabase.rpc.assert_called_once_with(
+        "wallet_adjust", {"p_user_id": 5, "p_delta": -3000, "p_require_min": 3000}
+    )
+
+
+def test_get_wallet_cached_until_topup(client, mock_supabase, as_role, fake_redis):
+    """The balance is served from cache until a top-up changes it."""
+    wallets = make_chainable_mock([{"user_id": 5, "balance": 1000}])
+    auth = as_role("user", user_wallets=wallets)
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=1500)
+
+    for _ in range(2):
+        assert (
+            json.loads(client.get("/api/wallet", headers=auth).data)["balance"] == 1000
+        )
+    assert wallets.execute.call_count == 1
+
+    client.post("/api/wallet/topup", json={"amount": 500}, headers=auth)
+    client.get("/api/wallet", headers=auth)
+    assert wallets.execute.call_count == 2
+
+
+def test_get_wallet_not_cached_per_worker(client, as_role):
+    """Without Redis the balance is read every time: another worker may
+    have just charged it."""
+    wallets = make_chainable_mock([{"user_id": 5, "balance": 1000}])
+    auth = as_role("user", user_wallets=wallets)
+
+    for _ in range(2):
+        client.get("/api/wallet", headers=auth)
+    assert wallets.execute.call_count == 2
@@ -0,0 +1,23 @@
+"""
+wsgi.py - Production WSGI Entry Point
+=====================================
+Exposes the Flask app to gunicorn. Every route handler spends most of its
+time waiting on Supabase HTTP round-trips, so production runs gevent
+workers: while one request waits on the network, the worker serves others.
+
+The gevent monkey-patch must run before anything else imports `socket`,
+`ssl`, or `httpx`, which is why it sits at the very top of this module.
+
+Usage:
+  gunicorn -c gunicorn.conf.py wsgi:application
+
+For local development keep using `python app.py` (Flask dev server).
+"""
+
+from gevent import monkey
+
+monkey.patch_all()
+
+from app import app  # noqa: E402
+
+application = app
@@ -324,9 +324,9 @@ const lprService = {
   // Users (Admin)
   // ==========================================
 
-  /** List all users (admin only). */
+  /** List all users (admin only). The backend streams every page in one response. */
   async getUsers(role) {
-    const params = role ? { role } : {};
+    const params = role ? { role, all: 1 } : { all: 1 };
     const r = await api.get("/admin/users", { params });
     return r.data.users || [];
   },